@@ -0,0 +1,58 @@
+# テーブルのチェックポイント: 全テーブルを書く時間と、起動時に戻す時間
+#   python -m benchmarks.checkpoint [tables]
+import asyncio
+import logging
+import sys
+import tempfile
+import time
+
+from texasholdem.states import TableManager
+from texasholdem.states.checkpoint import TableCheckpointer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+# テーブルの作成・復元ごとの debug ログは測定に含めない
+logging.getLogger("texasholdem").setLevel(logging.INFO)
+
+
+async def fill(table_manager: TableManager, tables: int):
+    # 6人が座ってプリフロップの途中のテーブル
+    client_id = 0
+    for i in range(tables):
+        table_context = table_manager.create("bench-{}".format(i))
+        for seat in range(6):
+            await table_context.handle(
+                {"action": "seat", "client_id": client_id, "name": "p", "amount": seat}
+            )
+            client_id += 1
+        await table_context.handle({"action": "start", "client_id": client_id - 1, "name": "p"})
+
+
+async def run(tables: int):
+    table_manager = TableManager()
+    await fill(table_manager, tables)
+    with tempfile.TemporaryDirectory() as d:
+        checkpointer = TableCheckpointer(d)
+        start = time.perf_counter()
+        await checkpointer.checkpoint_all(table_manager)
+        elapsed = time.perf_counter() - start
+        logger.info("{:>10}: {:.3f} s for {} tables".format("checkpoint", elapsed, tables))
+
+        start = time.perf_counter()
+        written = await checkpointer.checkpoint_all(table_manager)
+        elapsed = time.perf_counter() - start
+        logger.info("{:>10}: {:.3f} s ({} changed)".format("unchanged", elapsed, written))
+        checkpointer.close()
+
+        start = time.perf_counter()
+        restored = await TableCheckpointer(d).restore_all(TableManager())
+        elapsed = time.perf_counter() - start
+        logger.info("{:>10}: {:.3f} s for {} tables".format("restore", elapsed, len(restored)))
+
+
+def main(tables: int = 2000):
+    asyncio.get_event_loop().run_until_complete(run(tables))
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:2]])
@@ -0,0 +1,66 @@
+# スナップショット1回分 (6席、フロップ) のエンコード時間を比べる
+#   python -m benchmarks.encode_snapshot [rounds]
+import json
+import logging
+import sys
+import time
+
+from texasholdem import Player, SasakiJSONEncoder, Table
+from websock import join_list
+from websock.serializer import encode, encode_private
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def make_table() -> Table:
+    table = Table(players_limit=6, seed=0)
+    for i in range(6):
+        table.seat_player(Player(i, "player{}".format(i), 1000), i)
+    table.deck.shuffle()
+    for i, p in enumerate(table.player_seating_chart):
+        p.hand = table.deck.draw(2)
+        p.betting = 10 * i
+        p.is_showdown = i % 3 == 0
+    table.board.extend(table.deck.draw(3))
+    table.update_hand_rank()
+    return table
+
+
+def before(table: Table):
+    json.dumps(
+        {
+            "state": table.status,
+            "seating_chart": table.player_seating_chart,
+            "board": table.board,
+            "pot_size": table.current_pot_size,
+        },
+        cls=SasakiJSONEncoder,
+    )
+    for p in table.player_seating_chart:
+        json.dumps({"hand": p.hand, "hand_rank": p.hand_rank}, cls=SasakiJSONEncoder)
+
+
+def after(table: Table):
+    # notify_current_status と同じ関数で (JSON とバイナリの両方を作る)
+    join_list([encode(p) for p in table.player_seating_chart])
+    encode(table.status)
+    encode(table.board)
+    encode(table.current_pot_size)
+    for p in table.player_seating_chart:
+        encode_private(p)
+
+
+def main(rounds: int = 2000):
+    table = make_table()
+    for name, f in (("SasakiJSONEncoder", before), ("serializer", after)):
+        f(table)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            f(table)
+        elapsed = time.perf_counter() - start
+        logger.info("{:>18}: {:.1f} us / snapshot".format(name, elapsed / rounds * 1e6))
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:2]])
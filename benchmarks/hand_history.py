@@ -0,0 +1,65 @@
+# ハンド履歴: ゲームのループ側のコスト (記録 + append) と、書き込み・読み出しの速さ
+#   python -m benchmarks.hand_history [hands]
+import asyncio
+import logging
+import sys
+import tempfile
+import time
+
+from texasholdem import Player, Table
+from texasholdem.hand_history import HandHistoryReader, HandHistoryWriter, HandRecorder
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def make_table() -> Table:
+    table = Table(players_limit=6, seed=0)
+    for i in range(6):
+        table.seat_player(Player(i, "player{}".format(i), 1000), i)
+    return table
+
+
+def record_hand(table: Table) -> HandRecorder:
+    # 6人、フロップまで進んで1人が取る程度のハンド
+    recorder = HandRecorder(table)
+    recorder.post(1, 1)
+    recorder.post(2, 2)
+    table.deck.reset()
+    table.deck.shuffle()
+    for i in range(6):
+        recorder.hole(i, table.deck.draw(2))
+    for i in range(6):
+        recorder.action(i, "call", 2)
+    recorder.board(table.deck.draw(3))
+    for i in range(6):
+        recorder.action(i, "fold" if i else "bet", 4)
+    recorder.award(0, 16)
+    return recorder
+
+
+def main(hands: int = 100000):
+    table = make_table()
+    with tempfile.TemporaryDirectory() as d:
+        writer = HandHistoryWriter(d)
+        start = time.perf_counter()
+        for _ in range(hands):
+            writer.append(record_hand(table))
+        elapsed = time.perf_counter() - start
+        logger.info("{:>10}: {:.1f} us / hand".format("record", elapsed / hands * 1e6))
+
+        start = time.perf_counter()
+        asyncio.get_event_loop().run_until_complete(writer.flush())
+        writer.close()
+        elapsed = time.perf_counter() - start
+        logger.info("{:>10}: {:>9.0f} hands / s".format("flush", hands / elapsed))
+
+        reader = HandHistoryReader(d)
+        start = time.perf_counter()
+        n = sum(1 for _ in reader)
+        elapsed = time.perf_counter() - start
+        logger.info("{:>10}: {:>9.0f} hands / s ({})".format("read", n / elapsed, n))
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:2]])
@@ -0,0 +1,58 @@
+# バンクロールの更新を1回ずつコミットする場合と、write-behind でまとめて書く場合を比べる
+#   python -m benchmarks.player_store [updates]
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from texasholdem.player import Player
+from texasholdem.player_repository import PlayerRepository, SQLitePlayerStore
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PLAYERS = 100
+
+
+def per_update(path: str, updates: int) -> float:
+    store = SQLitePlayerStore(path)
+    players = [Player(i, "player{}".format(i), 1000) for i in range(PLAYERS)]
+    start = time.perf_counter()
+    for n in range(updates):
+        p = players[n % PLAYERS]
+        p.bankroll += 1
+        store.save_many([(p.name, p.bankroll, 1)])
+    elapsed = time.perf_counter() - start
+    store.close()
+    return elapsed
+
+
+def write_behind(path: str, updates: int, flush_every: int = 1000) -> float:
+    repository = PlayerRepository(SQLitePlayerStore(path))
+    players = [repository.get(i, "player{}".format(i)) for i in range(PLAYERS)]
+
+    async def run():
+        for n in range(updates):
+            players[n % PLAYERS].receive(1)
+            if n % flush_every == flush_every - 1:
+                await repository.flush()
+        await repository.flush()
+
+    start = time.perf_counter()
+    asyncio.get_event_loop().run_until_complete(run())
+    elapsed = time.perf_counter() - start
+    repository.close()
+    return elapsed
+
+
+def main(updates: int = 5000):
+    for name, f in (("per-update commit", per_update), ("write-behind", write_behind)):
+        with tempfile.TemporaryDirectory() as d:
+            elapsed = f(os.path.join(d, "players.db"), updates)
+        logger.info("{:>18}: {:>9.0f} updates / s".format(name, updates / elapsed))
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:2]])
@@ -0,0 +1,297 @@
+# websocket なしで TableContext の状態遷移をボット同士で回し、処理能力を測る
+#   python -m benchmarks.selfplay --tables 8 --hands 200 --processes 4
+# 通知は REGISTRY に登録した SinkConnection が受ける (none なら購読者なしで送らない)
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from texasholdem.states import TableManager
+from texasholdem.states.street_state import (
+    BeforeGameState,
+    GameEndState,
+    ShowdownState,
+)
+from websock import REGISTRY, table_topic
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SINKS = ["none", "count", "record"]
+PLAYERS = 6
+REBUY_BELOW = 100
+BANKROLL = 1000
+MAX_STEPS = 1000
+
+
+class SinkConnection:
+    # websocket の代わりに REGISTRY に入れる。送られたフレームを数える (record なら残す)
+    def __init__(self, record: bool = False):
+        self.frames = 0
+        self.bytes = 0
+        self.log = [] if record else None  # type: Optional[List[str]]
+
+    async def send(self, msg):
+        self.frames += 1
+        self.bytes += len(msg)
+        if self.log is not None:
+            self.log.append(msg)
+
+
+class Bot:
+    # script があればその順に繰り返し、なければ重み付きのランダム
+    def __init__(self, rng: random.Random, script: List[str] = None):
+        self.rng = rng
+        self.script = script
+        self.turn = 0
+
+    def choose(self, table_context) -> dict:
+        table = table_context.get_table()
+        if isinstance(table_context.state, ShowdownState):
+            return {"action": self.rng.choice(["showdown", "showdown", "muck"])}
+        if isinstance(table_context.state, GameEndState):
+            return {"action": "check"}
+        if self.script:
+            action = self.script[self.turn % len(self.script)]
+            self.turn += 1
+        else:
+            action = self.rng.choices(["call", "raise", "fold"], [6, 2, 1])[0]
+        if action in ("raise", "bet"):
+            return {"action": action, "amount": table.current_betting_amount + table.stakes["BB"]}
+        return {"action": action}
+
+
+class Stats:
+    def __init__(self):
+        self.hands = 0
+        self.actions = 0
+        self.stuck = 0
+        # 状態クラス名 -> [呼び出し回数, 秒]
+        self.states = {}  # type: Dict[str, list]
+
+    def merge(self, other: dict):
+        self.hands += other["hands"]
+        self.actions += other["actions"]
+        self.stuck += other["stuck"]
+        for name, (calls, seconds) in other["states"].items():
+            entry = self.states.setdefault(name, [0, 0.0])
+            entry[0] += calls
+            entry[1] += seconds
+
+    def to_dict(self) -> dict:
+        return {
+            "hands": self.hands,
+            "actions": self.actions,
+            "stuck": self.stuck,
+            "states": self.states,
+        }
+
+
+async def handle(table_context, msg: dict, stats: Stats):
+    name = type(table_context.state).__name__
+    start = time.perf_counter()
+    await table_context.handle(msg)
+    elapsed = time.perf_counter() - start
+    entry = stats.states.get(name)
+    if entry is None:
+        entry = stats.states[name] = [0, 0.0]
+    entry[0] += 1
+    entry[1] += elapsed
+    stats.actions += 1
+
+
+async def play_table(
+    table_manager: TableManager,
+    index: int,
+    hands: int,
+    sink: str,
+    script: List[str],
+    stats: Stats,
+    sinks: List[SinkConnection],
+):
+    table_id = "sim-{}".format(index)
+    table_context = table_manager.create(table_id)
+    table_context.table.rng.seed(index)
+    bot = Bot(random.Random(index), script)
+    base = index * PLAYERS
+    for seat in range(PLAYERS):
+        client_id = base + seat
+        if sink != "none":
+            # 座っているプレイヤーがそれぞれテーブルを見ている
+            connection = SinkConnection(record=sink == "record")
+            sinks.append(connection)
+            REGISTRY.register(client_id, connection)
+            REGISTRY.subscribe(client_id, table_topic(table_id))
+        msg = {"action": "seat", "client_id": client_id, "name": "bot{}".format(client_id)}
+        msg["amount"] = seat
+        await handle(table_context, msg, stats)
+
+    table = table_context.get_table()
+    for _ in range(hands):
+        for p in table.player_seating_chart:
+            if p is not None and p.player.bankroll < REBUY_BELOW:
+                p.player.bankroll = BANKROLL
+        await handle(table_context, {"action": "start", "client_id": base, "name": ""}, stats)
+        steps = 0
+        while not isinstance(table_context.state, BeforeGameState):
+            steps += 1
+            if steps > MAX_STEPS:
+                raise RuntimeError("table {} made no progress".format(table_id))
+            msg = bot.choose(table_context)
+            msg["client_id"] = table.player_seating_chart[table.current_player].player.id
+            msg["name"] = ""
+            before = (table_context.state, table.current_player, table.current_betting_amount)
+            await handle(table_context, msg, stats)
+            if before == (table_context.state, table.current_player, table.current_betting_amount):
+                # バンクロールが足りないなどで通らなかったアクションは降りる
+                stats.stuck += 1
+                msg["action"] = "fold"
+                await handle(table_context, msg, stats)
+        stats.hands += 1
+
+
+def run_tables(indices: List[int], hands: int, sink: str, script: List[str], trace: bool) -> dict:
+    # 1プロセス分。プロセスプールからも直接も呼ぶ
+    logging.disable(logging.DEBUG)
+    if trace:
+        tracemalloc.start()
+    stats = Stats()
+    sinks = []  # type: List[SinkConnection]
+    table_manager = TableManager(players_limit=PLAYERS)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    start = time.perf_counter()
+    # テーブルは順番に回す (交互に回すと状態ごとの時間に他のテーブルの分が混ざる)
+    for i in indices:
+        loop.run_until_complete(play_table(table_manager, i, hands, sink, script, stats, sinks))
+    elapsed = time.perf_counter() - start
+    loop.close()
+    result = stats.to_dict()
+    result["elapsed"] = elapsed
+    result["frames"] = sum(s.frames for s in sinks)
+    result["bytes"] = sum(s.bytes for s in sinks)
+    if trace:
+        current, peak = tracemalloc.get_traced_memory()
+        top = tracemalloc.take_snapshot().statistics("lineno")[:5]
+        tracemalloc.stop()
+        result["memory"] = {
+            "current": current,
+            "peak": peak,
+            "top": [
+                {"site": str(s.traceback), "size": s.size, "count": s.count} for s in top
+            ],
+        }
+    return result
+
+
+def simulate(
+    tables: int = 4,
+    hands: int = 100,
+    processes: int = 1,
+    sink: str = "none",
+    script: List[str] = None,
+    trace: bool = False,
+) -> dict:
+    chunks = [list(range(i, tables, processes)) for i in range(min(processes, tables))]
+    start = time.perf_counter()
+    if processes <= 1:
+        results = [run_tables(chunks[0], hands, sink, script, trace)]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [
+                pool.submit(run_tables, chunk, hands, sink, script, trace) for chunk in chunks
+            ]
+            results = [f.result() for f in futures]
+    wall = time.perf_counter() - start
+    total = Stats()
+    for result in results:
+        total.merge(result)
+    summary = total.to_dict()
+    summary.update(
+        {
+            "tables": tables,
+            "processes": len(chunks),
+            "wall": wall,
+            "hands_per_sec": total.hands / wall,
+            "actions_per_sec": total.actions / wall,
+            "frames": sum(r["frames"] for r in results),
+            "bytes": sum(r["bytes"] for r in results),
+            # プロセスの起動を除いた、プロセスごとの速さ
+            "process_hands_per_sec": [r["hands"] / r["elapsed"] for r in results],
+        }
+    )
+    if trace:
+        summary["memory"] = [r["memory"] for r in results]
+    return summary
+
+
+def report(summary: dict):
+    logger.info(
+        "{hands} hands on {tables} tables in {wall:.2f} s with {processes} process(es): "
+        "{hands_per_sec:.0f} hands/s, {actions_per_sec:.0f} actions/s".format(**summary)
+    )
+    if summary["processes"] > 1:
+        logger.info(
+            "per process: {}".format(
+                ", ".join("{:.0f} hands/s".format(h) for h in summary["process_hands_per_sec"])
+            )
+        )
+    if summary["frames"]:
+        logger.info("sink: {frames} frames, {bytes} bytes".format(**summary))
+    if summary["stuck"]:
+        logger.info("{} actions did not go through and were folded".format(summary["stuck"]))
+    states = sorted(summary["states"].items(), key=lambda kv: -kv[1][1])
+    for name, (calls, seconds) in states:
+        logger.info(
+            "{:>20}: {:>8} calls, {:>8.1f} us/call, {:>6.2f} s total".format(
+                name, calls, seconds / calls * 1e6, seconds
+            )
+        )
+    for i, memory in enumerate(summary.get("memory", [])):
+        logger.info(
+            "process {}: peak {:.1f} KiB traced, {:.1f} KiB still held".format(
+                i, memory["peak"] / 1024, memory["current"] / 1024
+            )
+        )
+        for site in memory["top"]:
+            logger.info("  {site}: {size} B in {count} blocks".format(**site))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tables", type=int, default=4)
+    parser.add_argument("--hands", type=int, default=100, help="hands per table")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument(
+        "--sink",
+        choices=SINKS,
+        default="count",
+        help="none: nobody watches the tables; count/record: every seated bot does",
+    )
+    parser.add_argument(
+        "--script",
+        default=None,
+        help="comma separated actions the bots repeat (default: random bots)",
+    )
+    parser.add_argument(
+        "--trace-malloc", action="store_true", help="report allocations (slow)"
+    )
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+    summary = simulate(
+        args.tables,
+        args.hands,
+        args.processes,
+        args.sink,
+        args.script.split(",") if args.script else None,
+        args.trace_malloc,
+    )
+    if args.json:
+        print(json.dumps(summary))
+    else:
+        report(summary)
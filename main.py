@@ -2,15 +2,26 @@
 
 # WS server example
 
+import argparse
 import asyncio
 import json
 import logging
+import os
+import pickle
+import signal
+import uuid
 import websockets
 
-import websock
-from texasholdem import Deck, Table
-from texasholdem.states import TableContext
-from texasholdem.states.street_state import BeforeGameState
+from texasholdem import Deck
+from texasholdem.hand_history import HandHistoryWriter, set_writer
+from texasholdem.player import set_repository
+from texasholdem.player_repository import PlayerRepository, SQLitePlayerStore
+from texasholdem.states import TableManager, DEFAULT_TABLE_ID
+from texasholdem.states.checkpoint import TableCheckpointer, write_atomic
+from texasholdem.states.checkpoint import DEFAULT_INTERVAL as DEFAULT_CHECKPOINT_INTERVAL
+from websock import REGISTRY, LOBBY, binary, notify, outbox
+from websock.session import SessionStore, DEFAULT_GRACE
+from websock.shard import ShardRouter, serve_worker, shard_of
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -30,7 +41,7 @@ async def action_req_card(websocket, msg):
     deck = Deck()
     deck.shuffle()
 
-    send_msg = json.dumps({"hand": deck.peek(2).to_dict_list()})
+    send_msg = json.dumps({"hand": [c.to_dict() for c in deck.peek(2)]})
 
     logger.debug("send message: {}".format(send_msg))
     await websocket.send(send_msg)
@@ -48,14 +59,175 @@ async def random_hand(websocket, path):
             await websocket.send(json.dumps({"message": "action: {}".format("")}))
 
 
+async def action_lobby(websocket, msg):
+    # 以後テーブルの作成・削除のたびにロビーが送られてくる
+    REGISTRY.subscribe(msg["client_id"], LOBBY)
+    await websocket.send(json.dumps({"lobby": tableManager.lobby()}))
+
+
+async def action_leave_lobby(websocket, msg):
+    REGISTRY.unsubscribe(msg["client_id"], LOBBY)
+
+
+async def publish_lobby(*args):
+    subscribers = REGISTRY.subscribers(LOBBY)
+    if subscribers:
+        await notify({}, {"lobby": tableManager.lobby()}, subscribers)
+
+
+async def send_busy(websocket, table_id):
+    # テーブルの受信箱が一杯なので、送り直してもらう
+    await websocket.send(json.dumps({"error": "busy", "table_id": table_id}))
+
+
+async def action_create_table(websocket, msg):
+    # シャード構成ではフロントが table_id を決めて渡してくる
+    table_id = msg.get("table_id")
+    if table_id is not None and table_id in tableManager:
+        await websocket.send(json.dumps({"error": "table already exists"}))
+        return
+    table_context = tableManager.create(table_id)
+    table_id = table_context.table.id
+    tableManager.join(table_id, msg["client_id"])
+    if not tableManager.get_actor(table_id).submit_call(table_context.notify_current_status):
+        await send_busy(websocket, table_id)
+    await publish_lobby()
+
+
+async def action_join_table(websocket, msg):
+    table_id = msg.get("table_id")
+    table_context = tableManager.get(table_id)
+    if table_context is None:
+        await websocket.send(json.dumps({"error": "no such table"}))
+        return
+    tableManager.join(table_id, msg["client_id"])
+    if not tableManager.get_actor(table_id).submit_call(table_context.notify_current_status):
+        await send_busy(websocket, table_id)
+
+
+async def action_leave_table(websocket, msg):
+    tableManager.leave(msg.get("table_id"), msg["client_id"])
+
+
+async def action_stats(websocket, msg):
+    await websocket.send(json.dumps({"stats": outbox.stats(REGISTRY.connections)}))
+
+
+def resync_client(client_id):
+    # 送信が追いつかなかったクライアントに、参加中のテーブルのスナップショットを送り直す
+    for table_id in tableManager.tables_of(client_id):
+        actor = tableManager.get_actor(table_id)
+        if actor is not None:
+            actor.submit({"action": "resync", "client_id": client_id, "table_id": table_id})
+
+
+def open_connection(websocket, client_id, on_lag):
+    return outbox.ClientConnection(
+        binary.wrap(websocket), client_id, sendQueueSize, slowClientPolicy, on_lag
+    )
+
+
+LOBBY_ACTIONS = {
+    "lobby": action_lobby,
+    "leave_lobby": action_leave_lobby,
+    "create_table": action_create_table,
+    "join_table": action_join_table,
+    "leave_table": action_leave_table,
+    "stats": action_stats,
+}
+
+
+async def route_message(websocket, msg):
+    # ロビー操作以外は table_id のテーブルへ振り分ける
+    action = msg.get("action")
+    if action in LOBBY_ACTIONS:
+        await LOBBY_ACTIONS[action](websocket, msg)
+        return
+    table_id = msg.get("table_id", DEFAULT_TABLE_ID)
+    table_context = tableManager.get(table_id)
+    if table_context is None:
+        await websocket.send(json.dumps({"error": "no such table"}))
+        return
+    if msg["client_id"] not in table_context.clients:
+        tableManager.join(table_id, msg["client_id"])
+    tableManager.touch(table_id)
+    if not tableManager.get_actor(table_id).submit(msg):
+        await send_busy(websocket, table_id)
+
+
+async def start_session(websocket, client_id):
+    token = sessionStore.open(client_id)
+    await websocket.send(json.dumps({"session": token, "client_id": client_id}))
+
+
+def end_session(websocket, client_id, on_expire):
+    # 切断しても grace の間は client_id と購読を残す (別の接続に引き継がれていなければ)
+    websocket.close()
+    if REGISTRY.get(client_id) is websocket:
+        REGISTRY.detach(client_id)
+        sessionStore.detach(client_id, on_expire)
+
+
+async def resume_session(websocket, client_id, msg, on_resumed):
+    # {"action": "resume", "session": token, "tables": {table_id: 最後に受け取った seq}}
+    # 以後この接続は元の client_id (= 同じプレイヤー) として扱う
+    old_id = sessionStore.resume(msg.get("session"))
+    if old_id is None:
+        await websocket.send(json.dumps({"error": "invalid session"}))
+        return client_id
+    if old_id == client_id:
+        return client_id
+    previous = REGISTRY.get(old_id)
+    if previous is not None:
+        # 古い接続がまだ切れていなければ、こちらに引き継ぐ
+        previous.disconnect(4000, "session resumed")
+    sessionStore.close(client_id)
+    REGISTRY.unregister(client_id)
+    await websocket.send(json.dumps({"session": msg["session"], "client_id": old_id}))
+    # 登録してから on_resumed が元の client_id 宛ての通知を止めるまで await を挟まない
+    # (replay より先にライブの差分が届くと、クライアントの seq が前後する)
+    REGISTRY.register(old_id, websocket)
+    websocket.client_id = old_id
+    await on_resumed(client_id, old_id, msg.get("tables") or {})
+    return old_id
+
+
+async def replay_tables(temp_id, client_id, seqs: dict):
+    # 再起動で購読が消えていても、クライアントが送ってきたテーブルには入り直す
+    for table_id in seqs:
+        if table_id in tableManager and table_id not in tableManager.tables_of(client_id):
+            tableManager.join(table_id, client_id)
+    for table_id in tableManager.tables_of(client_id):
+        table_context = tableManager.get(table_id)
+        # replay が送られるまで、このクライアントへの通知はテーブル側で止めておく
+        table_context.hold(client_id)
+        submitted = tableManager.get_actor(table_id).submit(
+            {
+                "action": "replay",
+                "client_id": client_id,
+                "table_id": table_id,
+                "seq": seqs.get(table_id),
+            }
+        )
+        if not submitted:
+            # 次の通知でスナップショットを送る
+            table_context.release(client_id)
+
+
+async def on_connect(websocket, client_id):
+    table_context = tableManager.join(DEFAULT_TABLE_ID, client_id)
+    tableManager.get_actor(DEFAULT_TABLE_ID).submit_call(table_context.notify_current_status)
+
+
 async def websocket_queue_handler(
     websocket: websockets.server.WebSocketServerProtocol, path
 ):
     logger.debug("-" * 40)
-    client_id = websock.client_id_count
-    websock.CLIENTS[client_id] = websocket
-    websock.client_id_count += 1
-    await tableContext.notify_current_status()
+    client_id = REGISTRY.new_client_id()
+    websocket = open_connection(websocket, client_id, resync_client)
+    REGISTRY.register(client_id, websocket)
+    await start_session(websocket, client_id)
+    await on_connect(websocket, client_id)
     try:
         async for message in websocket:
             logger.debug("websocket: {}".format(websocket))
@@ -63,21 +235,334 @@ async def websocket_queue_handler(
             logger.debug(
                 "websocket remote_address: {}".format(websocket.remote_address)
             )
-            logger.debug("message: {}".format(message))
+            logger.debug("message: {!r}".format(message))
 
-            msg = json.loads(message)
+            msg = binary.decode_message(message)
+            if msg.get("action") == "resume":
+                client_id = await resume_session(websocket, client_id, msg, replay_tables)
+                continue
             msg["client_id"] = client_id
-            await tableContext.handle(msg)
+            await route_message(websocket, msg)
     except websockets.ConnectionClosedError:
         pass
     finally:
-        websock.CLIENTS.pop(client_id)
+        end_session(websocket, client_id, REGISTRY.unregister)
+
 
+def shard_worker(index: int, shards: int, sock, args: argparse.Namespace):
+    # ワーカープロセス: table_id のハッシュがこのシャードになるテーブルだけを持つ
+    # 設定は引数で受け取る (spawn ではフロントのモジュール変数を引き継がない)
+    configure(args)
+    logger.debug("shard worker {}/{} started".format(index, shards))
+    # テーブルの受信箱 (asyncio.Queue) はこのループで作る
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    # SQLite の接続は fork 後にワーカーごとに開く
+    repository = open_player_repository(loop)
+    # セグメントファイルはプロセスごとに分ける
+    hand_log = open_hand_log(loop, "shard-{}".format(index))
+    # チェックポイントのディレクトリは共有し、このシャードのテーブルだけを戻す
+    checkpointer = open_checkpointer(loop, lambda table_id: shard_of(table_id, shards) == index)
+    if shard_of(DEFAULT_TABLE_ID, shards) == index and DEFAULT_TABLE_ID not in tableManager:
+        tableManager.create(DEFAULT_TABLE_ID)
+    serving = loop.create_task(
+        serve_worker(
+            sock,
+            route_message,
+            on_connect,
+            tableManager.lobby,
+            resync_client,
+            replay_tables,
+            tableManager.run_eviction,
+        )
+    )
+    # SIGTERM (フロントと一緒に送られてくる) でも最後のチェックポイントを取って終わる
+    loop.add_signal_handler(signal.SIGTERM, serving.cancel)
+    try:
+        loop.run_until_complete(serving)
+    except asyncio.CancelledError:
+        pass
+    finally:
+        if checkpointer is not None:
+            close_checkpointer(loop, checkpointer)
+        if repository is not None:
+            repository.close()
+        if hand_log is not None:
+            hand_log.close()
 
-tableContext = TableContext(BeforeGameState(), Table(players_limit=6))
+
+async def sharded_queue_handler(
+    websocket: websockets.server.WebSocketServerProtocol, path
+):
+    # フロントプロセス: websocket を終端して table_id のシャードへ転送する
+    logger.debug("-" * 40)
+    client_id = REGISTRY.new_client_id()
+    websocket = open_connection(
+        websocket, client_id, lambda c: asyncio.ensure_future(shardRouter.resync(c))
+    )
+    REGISTRY.register(client_id, websocket)
+    await start_session(websocket, client_id)
+    await shardRouter.client_connected(client_id, DEFAULT_TABLE_ID)
+    try:
+        async for message in websocket:
+            logger.debug("message: {!r}".format(message))
+            msg = binary.decode_message(message)
+            if msg.get("action") == "resume":
+                client_id = await resume_session(
+                    websocket, client_id, msg, replay_sharded_tables
+                )
+                continue
+            msg["client_id"] = client_id
+            action = msg.get("action")
+            if action == "lobby":
+                REGISTRY.subscribe(client_id, LOBBY)
+                await websocket.send(json.dumps({"lobby": await shardRouter.lobby()}))
+                continue
+            if action == "leave_lobby":
+                REGISTRY.unsubscribe(client_id, LOBBY)
+                continue
+            if action == "stats":
+                await action_stats(websocket, msg)
+                continue
+            if action == "create_table":
+                msg["table_id"] = uuid.uuid4().hex[:12]
+            await shardRouter.route(client_id, msg.get("table_id", DEFAULT_TABLE_ID), msg)
+            if action == "create_table":
+                await publish_sharded_lobby()
+    except websockets.ConnectionClosedError:
+        pass
+    finally:
+        end_session(websocket, client_id, expire_sharded_client)
+
+
+async def publish_sharded_lobby(*args):
+    if REGISTRY.subscribers(LOBBY):
+        lobby = await shardRouter.lobby()
+        await notify({}, {"lobby": lobby}, REGISTRY.subscribers(LOBBY))
+
+
+async def replay_sharded_tables(temp_id, client_id, seqs: dict):
+    # 各ワーカーが replay_tables で通知を止めて replay を積む
+    # (フロントはそれまでに届いた通知を捨てる)
+    await shardRouter.resume(client_id, seqs)
+    await shardRouter.client_disconnected(temp_id)
+
+
+def client_active(client_id) -> bool:
+    # 接続中か、切断後もセッションの再開を待っている (購読が残っている) か
+    return client_id in REGISTRY or bool(REGISTRY.topics_of(client_id))
+
+
+def open_player_repository(loop):
+    if playerDbPath is None:
+        return None
+    repository = PlayerRepository(SQLitePlayerStore(playerDbPath), active=client_active)
+    set_repository(repository)
+    loop.create_task(repository.run_flusher())
+    return repository
+
+
+def open_hand_log(loop, subdirectory: str = None):
+    if handLogDir is None:
+        return None
+    directory = handLogDir
+    if subdirectory is not None:
+        directory = os.path.join(directory, subdirectory)
+    writer = HandHistoryWriter(directory)
+    set_writer(writer)
+    loop.create_task(writer.run_flusher())
+    return writer
+
+
+def open_checkpointer(loop, owns=None):
+    # 前回のチェックポイントからテーブルを戻し、以後 checkpointInterval ごとに取る
+    # SIGUSR1 でその場で取る
+    if checkpointDir is None:
+        return None
+    checkpointer = TableCheckpointer(checkpointDir, checkpointInterval, owns)
+    loop.run_until_complete(checkpointer.restore_all(tableManager))
+    loop.create_task(checkpointer.run(tableManager))
+    loop.add_signal_handler(
+        signal.SIGUSR1,
+        lambda: asyncio.ensure_future(checkpointer.checkpoint_all(tableManager)),
+    )
+    return checkpointer
+
+
+def close_checkpointer(loop, checkpointer):
+    # 終了時のチェックポイント (再起動後はここから続ける)
+    try:
+        loop.run_until_complete(checkpointer.checkpoint_all(tableManager))
+    finally:
+        checkpointer.close()
+
+
+def save_sessions():
+    # セッションは接続を受けるプロセス (フロント) が持つ
+    data = {"sessions": sessionStore.dump(), "next_id": REGISTRY.next_id}
+    write_atomic(os.path.join(checkpointDir, SESSIONS_FILE), pickle.dumps(data))
+
+
+def load_sessions(on_expire):
+    path = os.path.join(checkpointDir, SESSIONS_FILE)
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        data = pickle.load(f)
+    sessionStore.load(data["sessions"], on_expire)
+    REGISTRY.reserve_ids(data["next_id"])
+    # 座っているプレイヤーの id も新しい接続に払い出さない
+    player_ids = [
+        p.player.id
+        for table_context in tableManager.tables.values()
+        for p in table_context.table.player_seating_chart
+        if p is not None and isinstance(p.player.id, int)
+    ]
+    if player_ids:
+        REGISTRY.reserve_ids(max(player_ids) + 1)
+    logger.debug("restored {} sessions".format(len(data["sessions"])))
+
+
+async def run_session_checkpoints():
+    loop = asyncio.get_event_loop()
+    while True:
+        await asyncio.sleep(checkpointInterval)
+        try:
+            await loop.run_in_executor(None, save_sessions)
+        except Exception:
+            logger.exception("failed to save sessions")
+
+
+def expire_sharded_client(client_id):
+    REGISTRY.unregister(client_id)
+    asyncio.ensure_future(shardRouter.client_disconnected(client_id))
+
+
+def configure(args: argparse.Namespace):
+    global playerDbPath, handLogDir, checkpointDir, checkpointInterval
+    global sendQueueSize, slowClientPolicy
+    sessionStore.grace = args.session_grace
+    playerDbPath = args.player_db
+    handLogDir = args.hand_log
+    checkpointDir = args.checkpoint_dir
+    checkpointInterval = args.checkpoint_interval
+    tableManager.notify_interval = args.notify_interval
+    sendQueueSize = args.send_queue
+    slowClientPolicy = args.slow_client_policy
+
+
+tableManager = TableManager(players_limit=6)
+shardRouter = None  # type: ShardRouter
+sendQueueSize = outbox.DEFAULT_QUEUE_SIZE
+slowClientPolicy = outbox.RESYNC
+sessionStore = SessionStore()
+playerDbPath = None
+handLogDir = None
+checkpointDir = None
+checkpointInterval = DEFAULT_CHECKPOINT_INTERVAL
+SESSIONS_FILE = "sessions.ckpt"
 
 if __name__ == "__main__":
-    start_server = websockets.serve(websocket_queue_handler, "0.0.0.0", 8765)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="number of table worker processes (0: run tables in this process)",
+    )
+    parser.add_argument(
+        "--notify-interval",
+        type=float,
+        default=0.0,
+        help="coalesce table notifications over this many seconds (0: after each message)",
+    )
+    parser.add_argument(
+        "--send-queue",
+        type=int,
+        default=outbox.DEFAULT_QUEUE_SIZE,
+        help="max frames queued per client before the slow client policy applies",
+    )
+    parser.add_argument(
+        "--slow-client-policy", choices=outbox.POLICIES, default=outbox.RESYNC
+    )
+    parser.add_argument(
+        "--session-grace",
+        type=float,
+        default=DEFAULT_GRACE,
+        help="seconds a disconnected client can resume its session",
+    )
+    parser.add_argument(
+        "--player-db",
+        default=None,
+        help="SQLite file to keep player bankrolls in (default: memory only)",
+    )
+    parser.add_argument(
+        "--hand-log",
+        default=None,
+        help="directory to append the binary hand history to (default: off)",
+    )
+    parser.add_argument(
+        "--checkpoint-dir",
+        default=None,
+        help="directory for table checkpoints; tables are restored from it on start",
+    )
+    parser.add_argument(
+        "--checkpoint-interval",
+        type=float,
+        default=DEFAULT_CHECKPOINT_INTERVAL,
+        help="seconds between table checkpoints",
+    )
+    args = parser.parse_args()
+    configure(args)
+
+    repository = None
+    hand_log = None
+    checkpointer = None
+    if args.workers > 0:
+        shardRouter = ShardRouter(args.workers, publish_sharded_lobby)
+        shardRouter.start(shard_worker, args)
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(shardRouter.connect())
+        if checkpointDir is not None:
+            # ディレクトリはワーカーも作るが、フロントが先にセッションを書くことがある
+            os.makedirs(checkpointDir, exist_ok=True)
+            load_sessions(expire_sharded_client)
+        start_server = websockets.serve(
+            sharded_queue_handler, args.host, args.port, subprotocols=[binary.SUBPROTOCOL]
+        )
+    else:
+        loop = asyncio.get_event_loop()
+        repository = open_player_repository(loop)
+        hand_log = open_hand_log(loop)
+        checkpointer = open_checkpointer(loop)
+        if DEFAULT_TABLE_ID not in tableManager:
+            tableManager.create(DEFAULT_TABLE_ID)
+        if checkpointDir is not None:
+            load_sessions(REGISTRY.unregister)
+        start_server = websockets.serve(
+            websocket_queue_handler, args.host, args.port, subprotocols=[binary.SUBPROTOCOL]
+        )
+        loop.create_task(tableManager.run_eviction(on_evict=publish_lobby))
+    if checkpointDir is not None:
+        loop.create_task(run_session_checkpoints())
+    # SIGTERM でも最後のチェックポイントを取ってから終わる
+    loop.add_signal_handler(signal.SIGTERM, loop.stop)
 
-    asyncio.get_event_loop().run_until_complete(start_server)
-    asyncio.get_event_loop().run_forever()
+    loop.run_until_complete(start_server)
+    try:
+        loop.run_forever()
+    finally:
+        # 書き戻していないバンクロールとハンド履歴、チェックポイントを保存する
+        if checkpointDir is not None:
+            save_sessions()
+        if checkpointer is not None:
+            close_checkpointer(loop, checkpointer)
+        if shardRouter is not None:
+            # ワーカーは接続が切れたらチェックポイントを取って終わる
+            shardRouter.stop()
+        if repository is not None:
+            repository.close()
+        if hand_log is not None:
+            hand_log.close()
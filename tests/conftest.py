@@ -0,0 +1,103 @@
+import asyncio
+import json
+import random
+
+import pytest
+
+from texasholdem.player import set_repository
+from texasholdem.player_repository import PlayerRepository
+from texasholdem.states import street_state
+from websock import REGISTRY, table_topic
+
+
+@pytest.fixture
+def run():
+    # テストごとに新しいイベントループで回す (テーブルの受信箱もこのループで作る)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop.run_until_complete
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+@pytest.fixture
+def repository():
+    # メモリだけのリポジトリ。他のテストのプレイヤーを引き継がない
+    repository = PlayerRepository()
+    set_repository(repository)
+    yield repository
+    set_repository(None)
+
+
+async def step(table_context, rng: random.Random):
+    # 手番のプレイヤーにランダムなアクションをさせる
+    table = table_context.get_table()
+    state = table_context.state
+    if isinstance(state, street_state.BeforeGameState):
+        client_id = next(p.player.id for p in table.player_seating_chart if p is not None)
+        msg = {"action": "start"}
+    else:
+        client_id = table.player_seating_chart[table.current_player].player.id
+        if isinstance(state, street_state.ShowdownState):
+            msg = {"action": rng.choice(["showdown", "muck"])}
+        elif isinstance(state, street_state.GameEndState):
+            msg = {"action": "check"}
+        else:
+            msg = rng.choice(
+                [
+                    {"action": "call"},
+                    {"action": "call"},
+                    {"action": "fold"},
+                    {"action": "raise", "amount": table.current_betting_amount + 2},
+                ]
+            )
+    msg.update(client_id=client_id, name="p{}".format(client_id))
+    await table_context.handle(msg)
+
+
+async def seat_players(table_context, players: int = 3):
+    for client_id in range(players):
+        await table_context.handle(
+            {"action": "seat", "client_id": client_id, "name": "p{}".format(client_id), "amount": client_id}
+        )
+
+
+@pytest.fixture
+def play():
+    async def play(table_context, steps: int, seed: int = 0):
+        rng = random.Random(seed)
+        for _ in range(steps):
+            await step(table_context, rng)
+
+    return play
+
+
+@pytest.fixture
+def seat():
+    return seat_players
+
+
+class Sink:
+    # websocket の代わりに REGISTRY に入れて、送られたメッセージを残す
+    def __init__(self):
+        self.messages = []
+
+    async def send(self, msg):
+        self.messages.append(json.loads(msg))
+
+
+@pytest.fixture
+def watch():
+    # watch(table_id, client_id): テーブルを購読するクライアント
+    client_ids = []
+
+    def watch(table_id, client_id) -> Sink:
+        sink = Sink()
+        REGISTRY.register(client_id, sink)
+        REGISTRY.subscribe(client_id, table_topic(table_id))
+        client_ids.append(client_id)
+        return sink
+
+    yield watch
+    for client_id in client_ids:
+        REGISTRY.unregister(client_id)
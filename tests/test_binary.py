@@ -0,0 +1,150 @@
+import json
+import pickle
+
+import pytest
+
+from texasholdem.card import CARDS, HIDDEN_CARD
+from texasholdem.states import TableManager
+from websock import REGISTRY, join_fields, table_topic
+from websock.binary import (
+    ACTIONS,
+    BinaryProtocolError,
+    Encoded,
+    Frame,
+    decode_action,
+    decode_message,
+    decode_value,
+    encode_action,
+    encode_value,
+    from_json,
+)
+from websock.serializer import encode
+from websock.websock import splice
+
+
+class Sink:
+    # websocket の代わりに REGISTRY に入れて、送られたものを残す
+    def __init__(self):
+        self.frames = []
+
+    async def send(self, msg):
+        self.frames.append(msg)
+
+
+def rounded(obj):
+    # バイナリの浮動小数点は f32 なので、比べるときは丸める
+    if isinstance(obj, float):
+        return round(obj, 5)
+    if isinstance(obj, list):
+        return [rounded(v) for v in obj]
+    if isinstance(obj, dict):
+        return {k: rounded(v) for k, v in obj.items()}
+    return obj
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        None,
+        True,
+        False,
+        0,
+        127,
+        128,
+        2 ** 40,
+        -1,
+        -300,
+        1.5,
+        "",
+        "テーブル",
+        [1, [2, "x"], []],
+        {"type": "delta", "seats": {"0": None, "3": {"betting": 10}}, "unknown key": [True]},
+    ],
+)
+def test_value_round_trip(value):
+    assert decode_value(encode_value(value)) == value
+
+
+def test_cards_are_one_byte():
+    for card in CARDS + [HIDDEN_CARD]:
+        data = encode_value(card)
+        assert len(data) == 2
+        assert decode_value(data) == card.toJSON()
+        # JSON から変換しても同じ
+        assert from_json(json.dumps(card.toJSON())) == data
+
+
+@pytest.mark.parametrize("action", ACTIONS)
+def test_action_round_trip(action):
+    msg = {"action": action, "table_id": "t", "amount": 20, "seq": 3}
+    assert decode_action(encode_action(msg)) == msg
+    assert decode_message(encode_action(msg)) == msg
+    assert decode_message(json.dumps(msg)) == msg
+
+
+def test_actions_keep_their_codes():
+    # 古いクライアントのために番号は変えない (追加は末尾だけ)
+    assert ACTIONS[:16] == [
+        "seat", "leave", "start", "check", "call", "bet", "raise", "fold",
+        "showdown", "muck", "reset", "resync", "lobby", "create_table", "join_table", "leave_table",
+    ]
+    assert {"resume", "replay", "stats", "leave_lobby"} <= set(ACTIONS)
+
+
+@pytest.mark.parametrize(
+    "data",
+    [b"", bytes([len(ACTIONS)]), bytes([0, 8, 1]), bytes([0, 6, 5, 0x61]), bytes([0, 8, 1, 200, 0])],
+)
+def test_broken_frames_are_rejected(data):
+    with pytest.raises(BinaryProtocolError):
+        decode_action(data)
+
+
+def test_encoded_values_match_json():
+    values = [None, 3, "preflop", CARDS[:3], CARDS[5], [None, None]]
+    for value in values:
+        encoded = encode(value)
+        assert isinstance(encoded, Encoded)
+        assert encoded.binary == from_json(encoded)
+
+
+def test_joined_and_spliced_frames():
+    shared = join_fields({"type": encode("delta"), "seq": encode(4), "board": encode(CARDS[:3])})
+    private = encode({"hand": CARDS[10:12], "hand_rank": None})
+    assert isinstance(shared, Frame) and isinstance(private, Frame)
+    message = splice(private, shared)
+    assert isinstance(message, Frame)
+    assert decode_value(message.binary) == json.loads(message)
+    assert list(json.loads(message)) == ["type", "seq", "board", "hand", "hand_rank"]
+    # シャード間は pickle で送る
+    for value in (shared, message, encode("x")):
+        copy = pickle.loads(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        assert type(copy) is type(value) and copy == value and copy.binary == value.binary
+
+
+def test_table_frames_round_trip(run, repository, seat, play):
+    sinks = {}
+
+    async def scenario():
+        table_manager = TableManager()
+        table_context = table_manager.create("t")
+        for client_id in range(3):
+            sinks[client_id] = Sink()
+            REGISTRY.register(client_id, sinks[client_id])
+            REGISTRY.subscribe(client_id, table_topic("t"))
+        await seat(table_context, 3)
+        await play(table_context, 80, seed=3)
+
+    try:
+        run(scenario())
+    finally:
+        for client_id in sinks:
+            REGISTRY.unregister(client_id)
+    frames = [m for sink in sinks.values() for m in sink.frames]
+    assert any(json.loads(m)["type"] == "snapshot" for m in frames)
+    assert any("hand" in json.loads(m) for m in frames)
+    for message in frames:
+        assert isinstance(message, Frame)
+        # JSON を経由したものとバイト列まで同じ
+        assert message.binary == from_json(message)
+        assert rounded(decode_value(message.binary)) == rounded(json.loads(message))
@@ -0,0 +1,132 @@
+import pickle
+
+import pytest
+
+from texasholdem import Table
+from texasholdem.player import set_repository
+from texasholdem.player_repository import PlayerRepository, SQLitePlayerStore
+from texasholdem.states import TableContext, TableManager
+from texasholdem.states.checkpoint import TableCheckpointer, dump_table, load_table
+from texasholdem.states.street_state import BeforeGameState
+
+
+def view(table_context: TableContext):
+    # 続きを遊ぶのに要る状態をまとめて比べる
+    table = table_context.get_table()
+    seats = [
+        None
+        if p is None
+        else (
+            p.player.id,
+            p.player.name,
+            p.player.bankroll,
+            [c.code for c in p.hand],
+            p.hand_rank and p.hand_rank.strength,
+            p.betting,
+            p.ongoing,
+            p.played,
+            p.is_showdown,
+        )
+        for p in table.player_seating_chart
+    ]
+    return (
+        type(table_context.state).__name__,
+        table.status,
+        table.button_player,
+        table.current_player,
+        table.current_betting_amount,
+        table.current_pot_size,
+        [c.code for c in table.board],
+        [c.code for c in table.deck.cards],
+        table.deck.cursor,
+        seats,
+        table_context.seq,
+    )
+
+
+def new_table(table_id: str = "t") -> TableContext:
+    return TableContext(BeforeGameState(), Table(players_limit=6, table_id=table_id))
+
+
+@pytest.mark.parametrize("steps", [1, 4, 9, 15])
+def test_restored_table_plays_on_identically(run, repository, seat, play, steps):
+    table_context = new_table()
+    run(seat(table_context, 3))
+    run(play(table_context, steps, seed=steps))
+    data = dump_table(table_context)
+
+    # 再起動後のように、プレイヤーのいないリポジトリに戻す
+    set_repository(PlayerRepository())
+    restored = load_table(pickle.loads(data))
+    assert view(restored) == view(table_context)
+    assert dump_table(restored) == data
+
+    run(play(table_context, 60, seed=100))
+    run(play(restored, 60, seed=100))
+    assert view(restored) == view(table_context)
+
+
+def test_restore_matches_bankrolls_to_the_pot(tmp_path, run, seat, play):
+    path = str(tmp_path / "players.db")
+    repository = PlayerRepository(SQLitePlayerStore(path))
+    set_repository(repository)
+    try:
+        table_manager = TableManager()
+        table_context = table_manager.create("t")
+        run(seat(table_context, 3))
+        run(play(table_context, 5, seed=5))
+        checkpointer = TableCheckpointer(str(tmp_path / "tables"))
+        assert run(checkpointer.checkpoint_all(table_manager)) == 1
+        checkpointer.close()
+        expected = view(table_context)
+        players = [p.player for p in table_context.get_table().player_seating_chart if p is not None]
+        # チェックポイントと一緒にストアにも書かれている
+        assert [repository.store.load(p.key) for p in players] == [p.bankroll for p in players]
+        # チェックポイントの後にストアへ書かれた変更
+        players[0].receive(500)
+        repository.close()
+
+        repository = PlayerRepository(SQLitePlayerStore(path))
+        set_repository(repository)
+        restored = TableManager()
+        run(TableCheckpointer(str(tmp_path / "tables")).restore_all(restored))
+        # ポットと同じ時点のバンクロールに戻り、ストアもそれに揃う
+        assert view(restored.get("t")) == expected
+        run(repository.flush())
+        assert [repository.store.load(p.key) for p in players] == [s[2] for s in expected[9] if s]
+        repository.close()
+    finally:
+        set_repository(None)
+
+
+def test_checkpointer_round_trip(tmp_path, run, repository, seat, play):
+    async def fill():
+        table_manager = TableManager()
+        for i in range(3):
+            table_context = table_manager.create("table-{}".format(i))
+            await seat(table_context, 2 + i)
+            await play(table_context, 3 * i, seed=i)
+        return table_manager
+
+    table_manager = run(fill())
+    checkpointer = TableCheckpointer(str(tmp_path))
+    assert run(checkpointer.checkpoint_all(table_manager)) == 3
+    # 変わっていないテーブルは書かない
+    assert run(checkpointer.checkpoint_all(table_manager)) == 0
+    checkpointer.close()
+
+    set_repository(PlayerRepository())
+    restored = TableManager()
+    table_ids = run(TableCheckpointer(str(tmp_path)).restore_all(restored))
+    assert sorted(table_ids) == ["table-0", "table-1", "table-2"]
+    for table_id in table_ids:
+        assert view(restored.get(table_id)) == view(table_manager.get(table_id))
+
+
+def test_unknown_version_is_rejected(run, repository, seat):
+    table_context = new_table()
+    run(seat(table_context, 2))
+    data = pickle.loads(dump_table(table_context))
+    data["version"] = 0
+    with pytest.raises(ValueError):
+        load_table(data)
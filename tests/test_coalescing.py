@@ -0,0 +1,47 @@
+import asyncio
+
+from texasholdem.states import TableManager
+
+
+def test_one_message_per_handled_action(run, repository, seat, play, watch):
+    async def scenario():
+        table_manager = TableManager()
+        table_context = table_manager.create("t")
+        sink = watch("t", 9)
+        await seat(table_context, 3)
+        counts = []
+        for i in range(40):
+            before = len(sink.messages)
+            await play(table_context, 1, seed=i)
+            counts.append(len(sink.messages) - before)
+        table_manager.retire("t")
+        return counts
+
+    counts = run(scenario())
+    # start のように状態がいくつも進むアクションでも通知は1回
+    assert max(counts) == 1
+
+
+def test_notify_interval_coalesces_actions(run, repository, seat, play, watch):
+    async def scenario():
+        table_manager = TableManager(notify_interval=0.05)
+        table_context = table_manager.create("t")
+        sink = watch("t", 9)
+        await seat(table_context, 3)
+        await table_context.handle({"action": "start", "client_id": 0, "name": "p0"})
+        # まだ送らない
+        assert sink.messages == []
+        await asyncio.sleep(0.1)
+        assert len(sink.messages) == 1
+        first = sink.messages[0]
+        # 間隔内のアクションは1つの差分にまとめる
+        await play(table_context, 2, seed=1)
+        assert len(sink.messages) == 1
+        await asyncio.sleep(0.1)
+        table_manager.retire("t")
+        return table_context, first, sink.messages
+
+    table_context, first, messages = run(scenario())
+    assert first["type"] == "snapshot" and first["state"] != "beforeGame"
+    assert [m["type"] for m in messages] == ["snapshot", "delta"]
+    assert messages[-1]["seq"] == first["seq"] + 1 == table_context.seq
@@ -0,0 +1,52 @@
+import random
+
+from texasholdem import Deck, Table
+from texasholdem.card import CARDS
+
+
+def dealt(deck: Deck, seed=None):
+    deck.reset()
+    deck.shuffle(seed)
+    return [c.code for c in deck.draw(9)]
+
+
+def test_same_seed_same_order():
+    first = dealt(Deck(), seed=12345)
+    second = dealt(Deck(), seed=12345)
+    assert first == second
+    assert dealt(Deck(), seed=12346) != first
+    # 使い回したデッキでも、reset すれば同じ seed で同じ並び
+    deck = Deck()
+    dealt(deck, seed=1)
+    assert dealt(deck, seed=12345) == first
+
+
+def test_recorded_seed_replays_the_hand():
+    deck = Deck(rng=random.Random(7))
+    cards = dealt(deck)
+    assert deck.seed is not None
+    assert dealt(Deck(), seed=deck.seed) == cards
+
+
+def test_tables_with_the_same_seed_deal_the_same_hands():
+    first, second = Table(players_limit=6, seed=3), Table(players_limit=6, seed=3)
+    for _ in range(5):
+        assert dealt(first.deck) == dealt(second.deck)
+    # 別のテーブルの乱数には影響されない
+    other = Table(players_limit=6, seed=4)
+    assert dealt(other.deck) != dealt(Table(players_limit=6, seed=3).deck)
+
+
+def test_draw_moves_the_cursor():
+    deck = Deck()
+    deck.shuffle(0)
+    order = list(deck.cards)
+    assert deck.draw(2) == order[:2]
+    assert deck.peek(3) == order[2:5]
+    assert deck.draw(3) == order[2:5]
+    assert len(deck) == 47
+    assert deck[0] == order[5]
+    # 残りだけを混ぜ直す (配ったカードは動かない)
+    deck.shuffle(1)
+    assert deck.cards[:5] == order[:5]
+    assert sorted(c.code for c in deck.cards) == [c.code for c in CARDS]
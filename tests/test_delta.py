@@ -0,0 +1,93 @@
+from texasholdem.states import TableManager
+
+PRIVATE = ("hand", "hand_rank")
+
+
+def apply(state: dict, msg: dict) -> dict:
+    # クライアントと同じように、スナップショットに差分を当てる
+    if msg["type"] == "snapshot":
+        return dict(msg)
+    assert msg["seq"] == state["seq"] + 1
+    state = dict(state, seating_chart=list(state["seating_chart"]))
+    for key, value in msg.items():
+        if key == "seats":
+            for seat, v in value.items():
+                state["seating_chart"][int(seat)] = v
+        else:
+            state[key] = value
+    return state
+
+
+def new_table(table_manager: TableManager, watch, clients: int = 4):
+    table_context = table_manager.create("t")
+    # 0..2 が座るプレイヤー、3 は見ているだけ
+    sinks = {client_id: watch("t", client_id) for client_id in range(clients)}
+    return table_context, sinks
+
+
+def test_deltas_rebuild_the_table(run, repository, seat, play, watch):
+    async def scenario():
+        table_manager = TableManager()
+        table_context, sinks = new_table(table_manager, watch)
+        await seat(table_context, 3)
+        await play(table_context, 80, seed=1)
+        # 最後にスナップショットを取り直して、差分から組み立てた状態と比べる
+        for client_id in sinks:
+            await table_context.handle({"action": "resync", "client_id": client_id})
+        table_manager.retire("t")
+        return table_context, sinks
+
+    table_context, sinks = run(scenario())
+    for client_id, sink in sinks.items():
+        *stream, last = sink.messages
+        assert stream[0]["type"] == "snapshot"
+        assert sum(m["type"] == "delta" for m in stream) > 40
+        state = {}
+        for msg in stream:
+            state = apply(state, msg)
+        assert last["type"] == "snapshot" and last["seq"] == table_context.seq
+        assert dict(state, type="snapshot") == last
+        # 手札は本人にだけ
+        assert ("hand" in last) == (client_id < 3)
+
+
+def test_deltas_carry_only_what_changed(run, repository, seat, play, watch):
+    async def scenario():
+        table_manager = TableManager()
+        table_context, sinks = new_table(table_manager, watch)
+        await seat(table_context, 3)
+        await play(table_context, 20, seed=2)
+        seq = table_context.seq
+        # 何も変わっていなければ送らない
+        await table_context.notify_current_status()
+        assert table_context.seq == seq
+        table_manager.retire("t")
+        return sinks
+
+    sinks = run(scenario())
+    messages = sinks[3].messages
+    snapshot_keys = set(messages[0])
+    for msg in messages[1:]:
+        assert msg["type"] == "delta"
+        assert set(msg) - {"seats"} < snapshot_keys
+        assert not set(msg) & set(PRIVATE)
+        # 席の差分は変わった席だけ
+        assert len(msg.get("seats", {})) < 6
+    assert messages[-1]["seq"] == messages[0]["seq"] + len(messages) - 1
+
+
+def test_late_watcher_starts_from_a_snapshot(run, repository, seat, play, watch):
+    async def scenario():
+        table_manager = TableManager()
+        table_context, _ = new_table(table_manager, watch, clients=1)
+        await seat(table_context, 3)
+        await play(table_context, 10, seed=3)
+        late = watch("t", 9)
+        await play(table_context, 10, seed=4)
+        table_manager.retire("t")
+        return table_context, late
+
+    table_context, late = run(scenario())
+    assert late.messages[0]["type"] == "snapshot"
+    assert all(m["type"] == "delta" for m in late.messages[1:])
+    assert late.messages[-1]["seq"] == table_context.seq
@@ -0,0 +1,102 @@
+import pytest
+
+from texasholdem.card import CARDS
+from texasholdem.equity import (
+    _exact_equity_canonical,
+    exact_equity,
+    get_pool,
+    monte_carlo_equity,
+    shutdown_pool,
+)
+from texasholdem.hand_range import RANK_CHARS, SUIT_CHARS
+
+
+def cards(text: str):
+    # "AsKh" -> [A♠, K♥]
+    return [
+        CARDS[RANK_CHARS.index(text[i]) * 4 + SUIT_CHARS.index(text[i + 1])]
+        for i in range(0, len(text), 2)
+    ]
+
+
+@pytest.fixture(scope="module", autouse=True)
+def pool():
+    yield
+    shutdown_pool()
+
+
+SPOTS = [
+    (["AsAh", "KsKh"], "2c7d9s"),
+    (["AhKh", "QsQd", "8c7c"], "Qh9h2c"),
+    (["JsTs", "AdKc"], "9s8d2h3c"),
+]
+
+
+@pytest.mark.parametrize("hands, board", SPOTS)
+def test_monte_carlo_agrees_with_exact(hands, board):
+    hands = [cards(h) for h in hands]
+    board = cards(board)
+    exact = exact_equity(hands, board)
+    estimate = monte_carlo_equity(hands, board, trials=20000, workers=2, seed=1)
+    assert estimate[0].trials == 20000
+    for e, m in zip(exact, estimate):
+        # 20000 回なら標準誤差は 0.4% 未満
+        assert abs(e.equity - m.equity) < 0.02
+        assert abs(e.tie - m.tie) < 0.02
+    assert sum(m.equity for m in estimate) == pytest.approx(1.0)
+
+
+def test_same_seed_same_result():
+    hands = [cards("AsKs"), cards("7h7d")]
+    first = monte_carlo_equity(hands, trials=5000, workers=2, seed=7)
+    second = monte_carlo_equity(hands, trials=5000, workers=2, seed=7)
+    assert [(e.wins, e.ties, e.share) for e in first] == [(e.wins, e.ties, e.share) for e in second]
+
+
+def test_time_budget_runs_at_least_one_chunk():
+    hands = [cards("AsKs"), cards("7h7d")]
+    # 締め切りがワーカーの起動前に過ぎていても結果は出る
+    result = monte_carlo_equity(hands, time_budget=0.0, workers=2, seed=3)
+    assert result[0].trials > 0
+
+
+def test_the_pool_is_reused():
+    assert get_pool(2) is get_pool(2)
+    assert get_pool(1) is get_pool(2)
+
+
+def test_complete_board_is_evaluated_once():
+    result = monte_carlo_equity([cards("AsAh"), cards("KsKh")], cards("2c7d9s3h4d"))
+    assert [(e.trials, e.win) for e in result] == [(1, 1.0), (1, 0.0)]
+
+
+def test_duplicate_cards_are_rejected():
+    with pytest.raises(ValueError):
+        monte_carlo_equity([cards("AsAh"), [CARDS[51], cards("As")[0]]])
+
+
+def test_exact_equity_known_spots():
+    # AA 対 KK、フロップ 2c7d9s: KK が勝つのは K が出て A が出ないときだけ
+    aces, kings = exact_equity([cards("AsAh"), cards("KsKh")], cards("2c7d9s"))
+    assert aces.trials == kings.trials == 990  # 45C2
+    assert kings.wins == (990 - 903) - 2 * 2  # K を含む (45C2 - 43C2) から K と A の組を除く
+    assert aces.wins == 990 - kings.wins and aces.ties == 0
+    # ターン: 44 枚のリバー全部
+    result = exact_equity([cards("JsTs"), cards("AdKc")], cards("9s8d2h3c"))
+    assert result[0].trials == 44
+
+
+def test_exact_equity_is_the_same_for_suit_isomorphic_spots():
+    first = exact_equity([cards("AhKh"), cards("QsQd")], cards("Qh9h2c"))
+    # スートを入れ替えただけの同じ局面はメモ化された結果を使う
+    hits = _exact_equity_canonical.cache_info().hits
+    second = exact_equity([cards("AsKs"), cards("QhQc")], cards("Qs9s2d"))
+    assert _exact_equity_canonical.cache_info().hits == hits + 1
+    assert [(e.trials, e.wins, e.ties, e.share) for e in first] == [
+        (e.trials, e.wins, e.ties, e.share) for e in second
+    ]
+
+
+def test_exact_equity_needs_a_flop():
+    with pytest.raises(ValueError):
+        exact_equity([cards("AsAh"), cards("KsKh")], cards("2c7d"))
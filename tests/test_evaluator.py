@@ -0,0 +1,125 @@
+import random
+from collections import Counter
+from itertools import combinations, combinations_with_replacement
+
+import numpy as np
+import pytest
+
+from texasholdem.batch_evaluator import evaluate_batch
+from texasholdem.evaluator import HandState, evaluate, evaluate5
+
+# evaluator のテーブルを使わない、素直な (遅い) 役判定と比べる
+
+
+def packed(category: int, ranks) -> int:
+    strength = category
+    for i in range(5):
+        strength = strength << 4 | (ranks[i] if i < len(ranks) else 0)
+    return strength
+
+
+def reference5(codes) -> int:
+    ranks = [c >> 2 for c in codes]
+    flush = len({c & 3 for c in codes}) == 1
+    groups = sorted(Counter(ranks).items(), key=lambda rc: (rc[1], rc[0]), reverse=True)
+    shape = [n for _, n in groups]
+    order = [r for r, _ in groups]
+    top = None
+    if len(groups) == 5:
+        if order[0] - order[4] == 4:
+            top = order[0]
+        elif order == [12, 3, 2, 1, 0]:
+            # A-5 (wheel) のトップは 5
+            top = 3
+    if top is not None and flush:
+        return packed(9, [top])
+    if shape == [4, 1]:
+        return packed(8, order)
+    if shape == [3, 2]:
+        return packed(7, order)
+    if flush:
+        return packed(6, order)
+    if top is not None:
+        return packed(5, [top])
+    if shape == [3, 1, 1]:
+        return packed(4, order)
+    if shape == [2, 2, 1]:
+        return packed(3, order)
+    if shape == [2, 1, 1, 1]:
+        return packed(2, order)
+    return packed(1, order)
+
+
+def reference(codes) -> int:
+    return max(reference5(hand) for hand in combinations(codes, 5))
+
+
+def rank_patterns():
+    # 5枚のランクの組 (同じランクは4枚まで) ごとに、フラッシュにならないスートと
+    # (ランクが全部違えば) フラッシュになるスートのハンド
+    for ranks in combinations_with_replacement(range(13), 5):
+        counts = Counter(ranks)
+        if max(counts.values()) > 4:
+            continue
+        seen = Counter()
+        codes = []
+        for r in ranks:
+            codes.append(r * 4 + seen[r])
+            seen[r] += 1
+        if len(counts) == 5:
+            yield [r * 4 + (1 if i == 0 else 0) for i, r in enumerate(ranks)]
+            yield [r * 4 + 2 for r in ranks]
+        else:
+            yield codes
+
+
+def random_hands(n: int, size: int, seed: int):
+    rng = random.Random(seed)
+    return [rng.sample(range(52), size) for _ in range(n)]
+
+
+def test_every_five_card_pattern():
+    hands = list(rank_patterns())
+    assert len(hands) == 7462
+    strengths = set()
+    for codes in hands:
+        expected = reference5(codes)
+        assert evaluate5(codes) == expected, codes
+        assert evaluate(codes) == expected, codes
+        assert HandState(codes).strength() == expected, codes
+        strengths.add(expected)
+    # 役の強さは同じ強さのハンドの組 (7462 通り) ごとに違う
+    assert len(strengths) == 7462
+    batch = evaluate_batch(np.array(hands))
+    assert batch.tolist() == [reference5(codes) for codes in hands]
+
+
+@pytest.mark.parametrize("size", [6, 7])
+def test_random_hands(size):
+    hands = random_hands(2000, size, seed=size)
+    expected = [reference(codes) for codes in hands]
+    assert [evaluate(codes) for codes in hands] == expected
+    assert evaluate_batch(np.array(hands)).tolist() == expected
+
+
+def test_hand_state_grows_card_by_card():
+    for codes in random_hands(1000, 7, seed=1):
+        state = HandState(codes[:2])
+        for k in range(2, 7):
+            state.add(codes[k])
+            if k >= 4:
+                assert state.strength() == reference(codes[: k + 1]), codes[: k + 1]
+
+
+def test_evaluate_batch_in_chunks():
+    hands = np.array(random_hands(500, 7, seed=2))
+    assert evaluate_batch(hands, chunk_size=64).tolist() == evaluate_batch(hands).tolist()
+
+
+@pytest.mark.parametrize(
+    "codes",
+    [np.zeros((3, 4), dtype=int), np.zeros((3, 8), dtype=int), np.array([[0, 1, 2, 3, 52]])],
+)
+def test_evaluate_batch_rejects_bad_input(codes):
+    with pytest.raises(ValueError):
+        evaluate_batch(codes)
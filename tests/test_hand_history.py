@@ -0,0 +1,110 @@
+import os
+
+from texasholdem import Player, Table
+from texasholdem.card import CARDS
+from texasholdem.hand_history import (
+    HandHistoryReader,
+    HandHistoryWriter,
+    HandRecorder,
+    decode_hand,
+    list_segments,
+    segment_path,
+)
+
+LONG_NAME = "ポーカー" * 40  # utf-8 で 480 バイト
+
+
+def make_table() -> Table:
+    table = Table(players_limit=6, seed=0)
+    table.seat_player(Player(0, "alice", 1000), 0)
+    table.seat_player(Player(1, LONG_NAME, 500), 2)
+    table.seat_player(Player(2, "bob", 250), 5)
+    return table
+
+
+def record_hand(table: Table) -> HandRecorder:
+    recorder = HandRecorder(table)
+    recorder.post(2, 1)
+    recorder.post(5, 2)
+    recorder.hole(0, CARDS[0:2])
+    recorder.hole(2, CARDS[50:52])
+    recorder.action(0, "raise", 6)
+    recorder.action(2, "call", 6)
+    recorder.action(5, "fold")
+    recorder.board(CARDS[10:13])
+    recorder.action(0, "check")
+    recorder.action(2, "bet", 12)
+    recorder.action(0, "fold")
+    recorder.award(2, 26)
+    return recorder
+
+
+def test_record_round_trip():
+    table = make_table()
+    recorder = record_hand(table)
+    hand = decode_hand(recorder.encode(42))
+    assert hand["hand_id"] == 42
+    assert hand["time"] == recorder.started
+    assert hand["table_id"] == str(table.id)
+    assert hand["button"] == table.button_player
+    assert hand["stakes"] == {"SB": table.stakes["SB"], "BB": table.stakes["BB"]}
+    assert [(s["seat"], s["player_id"], s["bankroll"]) for s in hand["seats"]] == [
+        (0, "0", 1000),
+        (2, "1", 500),
+        (5, "2", 250),
+    ]
+    # 長すぎる名前は文字の途中で切らずに 255 バイトまで
+    name = hand["seats"][1]["name"]
+    assert LONG_NAME.startswith(name) and 252 <= len(name.encode("utf-8")) <= 255
+    assert hand["events"] == [
+        ("post", 2, 1),
+        ("post", 5, 2),
+        ("hole", 0, CARDS[0:2]),
+        ("hole", 2, CARDS[50:52]),
+        ("action", 0, "raise", 6),
+        ("action", 2, "call", 6),
+        ("action", 5, "fold", 0),
+        ("board", CARDS[10:13]),
+        ("action", 0, "check", 0),
+        ("action", 2, "bet", 12),
+        ("action", 0, "fold", 0),
+        ("award", 2, 26),
+    ]
+
+
+def test_writer_and_reader(tmp_path, run):
+    table = make_table()
+    writer = HandHistoryWriter(str(tmp_path), segment_size=1024)
+    recorders = [record_hand(table) for _ in range(30)]
+    hand_ids = [writer.append(r) for r in recorders]
+    assert hand_ids == list(range(1, 31))
+    run(writer.flush())
+    writer.close()
+    assert len(list_segments(str(tmp_path))) > 1
+
+    reader = HandHistoryReader(str(tmp_path))
+    hands = list(reader)
+    assert [h["hand_id"] for h in hands] == hand_ids
+    expected = decode_hand(recorders[17].encode(18))
+    assert reader.get(18) == expected
+    assert reader.get(31) is None
+
+    # 再起動後は新しいセグメントに続きの hand_id で書く
+    writer = HandHistoryWriter(str(tmp_path))
+    assert writer.append(record_hand(table)) == 31
+    writer.close()
+    assert [h["hand_id"] for h in HandHistoryReader(str(tmp_path))] == hand_ids + [31]
+
+
+def test_reader_skips_a_torn_record(tmp_path):
+    table = make_table()
+    writer = HandHistoryWriter(str(tmp_path))
+    for _ in range(3):
+        writer.append(record_hand(table))
+    writer.close()
+    path = segment_path(str(tmp_path), list_segments(str(tmp_path))[-1])
+    # 書き込みの途中で止まったレコード
+    with open(path, "ab") as f:
+        f.write(b"\xff\x00\x00\x00partial")
+    assert os.path.getsize(path) > 0
+    assert [h["hand_id"] for h in HandHistoryReader(str(tmp_path))] == [1, 2, 3]
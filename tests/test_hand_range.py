@@ -0,0 +1,110 @@
+import pytest
+
+from texasholdem.card import CARDS
+from texasholdem.equity import exact_equity, shutdown_pool
+from texasholdem.hand_range import (
+    RANK_CHARS,
+    SUIT_CHARS,
+    HandRange,
+    RangeParseError,
+    range_equity,
+)
+
+
+def cards(text: str):
+    return [
+        CARDS[RANK_CHARS.index(text[i]) * 4 + SUIT_CHARS.index(text[i + 1])]
+        for i in range(0, len(text), 2)
+    ]
+
+
+def classes(hand_range: HandRange):
+    # 組み合わせを "AKs" のようなクラスにまとめる
+    names = set()
+    for a, b in hand_range.weights:
+        high, low = max(a, b), min(a, b)
+        name = RANK_CHARS[high >> 2] + RANK_CHARS[low >> 2]
+        if high >> 2 != low >> 2:
+            name += "s" if high & 3 == low & 3 else "o"
+        names.add(name)
+    return names
+
+
+@pytest.fixture(scope="module", autouse=True)
+def pool():
+    yield
+    shutdown_pool()
+
+
+@pytest.mark.parametrize(
+    "text, combos, expected",
+    [
+        ("AA", 6, {"AA"}),
+        ("AKs", 4, {"AKs"}),
+        ("AKo", 12, {"AKo"}),
+        ("KA", 16, {"AKs", "AKo"}),
+        ("QQ+", 18, {"QQ", "KK", "AA"}),
+        ("A9s+", 20, {"A9s", "ATs", "AJs", "AQs", "AKs"}),
+        ("76s-54s", 12, {"76s", "65s", "54s"}),
+        ("A5o-A2o", 48, {"A5o", "A4o", "A3o", "A2o"}),
+        ("99-77", 18, {"99", "88", "77"}),
+        ("AsKh", 1, {"AKo"}),
+        ("AA, KK  AKs", 16, {"AA", "KK", "AKs"}),
+    ],
+)
+def test_parse_expands_tokens(text, combos, expected):
+    hand_range = HandRange.parse(text)
+    assert len(hand_range) == combos
+    assert classes(hand_range) == expected
+    assert all(a < b for a, b in hand_range.weights)
+
+
+def test_weights():
+    hand_range = HandRange.parse("AKs:0.5, AA, KK:0")
+    assert set(hand_range.weights.values()) == {0.5, 1.0}
+    # 重み 0 は入れない
+    assert classes(hand_range) == {"AKs", "AA"}
+    # 後に書いた方が優先
+    assert set(HandRange.parse("AA, AA:0.25").weights.values()) == {0.25}
+
+
+@pytest.mark.parametrize(
+    "text", ["AAs", "AKx", "AsAs", "AsKh+", "AKs-QJo", "AK-QT", "AKs:2", "ZZ"]
+)
+def test_bad_tokens_are_rejected(text):
+    with pytest.raises(RangeParseError):
+        HandRange.parse(text)
+
+
+def test_remove_blockers():
+    blockers = cards("AsKd")
+    hand_range = HandRange.parse("AA, AKs").remove_blockers(blockers)
+    # AA は As を含まない3通り、AKs は AsKs と AdKd が消えて2通り
+    assert len(hand_range) == 3 + 2
+    blocked = {c.code for c in blockers}
+    assert not any(c in blocked for combo in hand_range.weights for c in combo)
+
+
+def test_single_hands_match_exact_equity():
+    board = cards("Qh9h2c")
+    hands = [cards("AhKh"), cards("QsQd")]
+    exact = exact_equity(hands, board)
+    result = range_equity(
+        [HandRange.from_hand(h) for h in hands], board, trials=20000, workers=2, seed=5
+    )
+    for e, r in zip(exact, result):
+        assert abs(e.equity - r.equity) < 0.02
+
+
+def test_range_against_range():
+    result = range_equity(
+        [HandRange.parse("AA"), HandRange.parse("KK")], trials=20000, workers=2, seed=2
+    )
+    # AA 対 KK はおよそ 82%
+    assert result[0].equity == pytest.approx(0.82, abs=0.02)
+    assert result[0].equity + result[1].equity == pytest.approx(1.0)
+
+
+def test_empty_range_after_blockers():
+    with pytest.raises(ValueError):
+        range_equity([HandRange.parse("AsAh"), HandRange.parse("KK")], board=cards("As2c3d"))
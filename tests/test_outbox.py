@@ -0,0 +1,142 @@
+import asyncio
+import json
+
+from websock import outbox
+from websock.outbox import ClientConnection
+
+
+class SlowSocket:
+    # open が立つまで送れない websocket
+    def __init__(self):
+        self.open = asyncio.Event()
+        self.sent = []
+        self.closed = None
+
+    async def send(self, msg):
+        await self.open.wait()
+        self.sent.append(msg)
+
+    async def close(self, code=1000, reason=""):
+        self.closed = (code, reason)
+
+
+def state(kind: str, table_id: str, seq: int) -> str:
+    return json.dumps({"type": kind, "table_id": table_id, "seq": seq})
+
+
+def fill(connection: ClientConnection, table_id: str, n: int, first: int = 0):
+    for seq in range(first, first + n):
+        connection.put(state("delta", table_id, seq))
+
+
+async def close(connection: ClientConnection):
+    # 書き込みタスクの取り消しまで回す
+    task = connection.task
+    connection.close()
+    if task is not None:
+        await asyncio.gather(task, return_exceptions=True)
+
+
+async def drain(connection: ClientConnection):
+    connection.websocket.open.set()
+    while connection.queue:
+        await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+
+def test_resync_keeps_frames_without_a_table(run):
+    lagged = []
+
+    async def scenario():
+        websocket = SlowSocket()
+        connection = ClientConnection(
+            websocket, 1, queue_size=4, policy=outbox.RESYNC, on_lag=lagged.append
+        )
+        session = json.dumps({"session": "token", "client_id": 1})
+        connection.put(session)
+        await asyncio.sleep(0)  # 1つ目は送信中
+        connection.put(json.dumps({"lobby": []}))
+        fill(connection, "a", 2)
+        fill(connection, "b", 1)
+        # 溢れたらテーブルの通知だけ捨てて、スナップショットが来るまで差分も捨てる
+        connection.put(state("delta", "a", 2))
+        assert lagged == [1]
+        # テーブルは JSON のまま (文字列の id は引用符つき)
+        assert connection.awaiting_snapshot == {'"a"', '"b"'}
+        assert [t for t, _ in connection.queue] == [None]
+        connection.put(state("delta", "b", 1))
+        connection.put(state("snapshot", "a", 5))
+        connection.put(state("delta", "a", 6))
+        await drain(connection)
+        assert connection.awaiting_snapshot == {'"b"'}
+        await close(connection)
+        return websocket.sent
+
+    sent = [json.loads(m) for m in run(scenario())]
+    assert sent == [
+        {"session": "token", "client_id": 1},
+        {"lobby": []},
+        {"type": "snapshot", "table_id": "a", "seq": 5},
+        {"type": "delta", "table_id": "a", "seq": 6},
+    ]
+
+
+def test_resync_disconnects_when_nothing_can_be_dropped(run):
+    async def scenario():
+        websocket = SlowSocket()
+        connection = ClientConnection(websocket, 1, queue_size=2, policy=outbox.RESYNC)
+        for i in range(4):
+            connection.put(json.dumps({"error": i}))
+        await asyncio.sleep(0)
+        await close(connection)
+        return connection, websocket
+
+    connection, websocket = run(scenario())
+    assert connection.closed and websocket.closed == (1008, "too slow")
+
+
+def test_drop_discards_the_oldest_frames(run):
+    async def scenario():
+        websocket = SlowSocket()
+        connection = ClientConnection(websocket, 1, queue_size=3, policy=outbox.DROP)
+        fill(connection, "a", 1)
+        await asyncio.sleep(0)
+        fill(connection, "a", 5, first=1)
+        assert connection.dropped == 2
+        await drain(connection)
+        await close(connection)
+        return websocket.sent
+
+    assert [json.loads(m)["seq"] for m in run(scenario())] == [0, 3, 4, 5]
+
+
+def test_snapshot_supersedes_queued_frames_of_its_table(run):
+    async def scenario():
+        websocket = SlowSocket()
+        connection = ClientConnection(websocket, 1, queue_size=16)
+        fill(connection, "a", 1)
+        await asyncio.sleep(0)
+        fill(connection, "a", 3, first=1)
+        fill(connection, "b", 1)
+        connection.put(state("snapshot", "a", 9))
+        assert connection.superseded == 3
+        await drain(connection)
+        await close(connection)
+        return websocket.sent
+
+    sent = [json.loads(m) for m in run(scenario())]
+    assert [(m["table_id"], m["seq"]) for m in sent] == [("a", 0), ("b", 0), ("a", 9)]
+
+
+def test_disconnect_policy(run):
+    async def scenario():
+        websocket = SlowSocket()
+        connection = ClientConnection(websocket, 1, queue_size=2, policy=outbox.DISCONNECT)
+        fill(connection, "a", 4)
+        await asyncio.sleep(0)
+        connection.put(state("delta", "a", 4))
+        await close(connection)
+        return connection, websocket
+
+    connection, websocket = run(scenario())
+    assert connection.closed and websocket.closed == (1008, "too slow")
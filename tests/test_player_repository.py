@@ -0,0 +1,70 @@
+from texasholdem.player import DEFAULT_BANKROLL
+from texasholdem.player_repository import PlayerRepository, SQLitePlayerStore
+
+
+def test_deltas_from_two_processes_merge(tmp_path, run):
+    # 2つのワーカーが同じ名前のプレイヤーをそれぞれ読み込んで動かす
+    path = str(tmp_path / "players.db")
+    first = PlayerRepository(SQLitePlayerStore(path))
+    alice = first.get(1, "alice")
+    assert alice.bankroll == DEFAULT_BANKROLL
+    run(first.flush())
+
+    second = PlayerRepository(SQLitePlayerStore(path))
+    other = second.get(7, "alice")
+    assert other.bankroll == DEFAULT_BANKROLL
+    alice.receive(100)
+    other.pay(30)
+    run(first.flush())
+    run(second.flush())
+    alice.pay(20)
+    first.close()
+    second.close()
+
+    store = SQLitePlayerStore(path)
+    assert store.load("alice") == DEFAULT_BANKROLL + 100 - 30 - 20
+    store.close()
+
+
+def test_unchanged_players_are_not_written(tmp_path, run):
+    repository = PlayerRepository(SQLitePlayerStore(str(tmp_path / "players.db")))
+    repository.get(1, "alice")
+    repository.get(2, None)  # 名前がなければ保存しない
+    run(repository.flush())
+    assert repository.flushed == 1
+    run(repository.flush())
+    assert repository.flushed == 1
+    repository.close()
+
+
+def test_load_does_not_wait_for_the_writer(tmp_path, run):
+    store = SQLitePlayerStore(str(tmp_path / "players.db"))
+    store.save_many([("alice", 500, 0)])
+    # 書き込みのトランザクション中 (ロックを持っている間) でも読める
+    with store.lock:
+        assert store.load("alice") == 500
+        assert store.load("bob") is None
+    store.close()
+
+
+def test_a_name_in_use_is_not_shared(tmp_path, run):
+    connected = {1, 2}
+    repository = PlayerRepository(
+        SQLitePlayerStore(str(tmp_path / "players.db")), active=lambda c: c in connected
+    )
+    alice = repository.get(1, "alice")
+    alice.receive(500)
+    run(repository.flush())
+
+    # 同じ名前を名乗った別の接続は保存されない既定のバンクロールで遊ぶ
+    impostor = repository.get(2, "alice")
+    assert impostor.key is None and impostor.bankroll == DEFAULT_BANKROLL
+    impostor.pay(100)
+    run(repository.flush())
+    assert repository.store.load("alice") == DEFAULT_BANKROLL + 500
+
+    # 元の接続が切れたら、次に名乗った接続が引き継ぐ
+    connected.discard(1)
+    again = repository.get(3, "alice")
+    assert again.key == "alice" and again.bankroll == DEFAULT_BANKROLL + 500
+    repository.close()
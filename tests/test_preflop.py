@@ -0,0 +1,63 @@
+import pytest
+
+from texasholdem import Card
+from texasholdem import preflop
+from texasholdem.preflop import (
+    CLASSES,
+    HEADER,
+    preflop_equity,
+    preflop_equity_vs,
+)
+
+
+def hand(text: str):
+    # "AKs" -> A♠K♠, "AKo" -> A♠K♥, "QQ" -> Q♠Q♥
+    numbers = {c: n for n, c in enumerate("A23456789TJQK", 1)}
+    second_suit = "S" if text.endswith("s") else "H"
+    return [Card(numbers[text[0]], "S"), Card(numbers[text[1]], second_suit)]
+
+
+def test_shipped_table_header():
+    # 同梱のファイルはドキュメントに書いた試行回数で作ったもの
+    with open(preflop.PATH, "rb") as f:
+        magic, version, classes, opponents, _, heads_up, multiway = HEADER.unpack(
+            f.read(HEADER.size)
+        )
+    assert (magic, version, classes, opponents) == (
+        preflop.MAGIC,
+        preflop.VERSION,
+        CLASSES,
+        preflop.MAX_OPPONENTS,
+    )
+    assert (heads_up, multiway) == (preflop.HEADS_UP_TRIALS, preflop.MULTIWAY_TRIALS)
+
+
+@pytest.mark.parametrize(
+    "text, equity",
+    [("AA", 0.852), ("KK", 0.824), ("AKs", 0.670), ("22", 0.503), ("72o", 0.346)],
+)
+def test_equity_against_one_random_hand(text, equity):
+    assert preflop_equity(hand(text)) == pytest.approx(equity, abs=0.005)
+
+
+@pytest.mark.parametrize(
+    "hero, villain, equity",
+    [("AA", "KK", 0.820), ("AKs", "QQ", 0.460), ("AA", "72o", 0.882)],
+)
+def test_heads_up_equity(hero, villain, equity):
+    assert preflop_equity_vs(hand(hero), hand(villain)) == pytest.approx(equity, abs=0.006)
+    assert preflop_equity_vs(hand(villain), hand(hero)) == pytest.approx(1 - equity, abs=0.006)
+
+
+def test_more_opponents_less_equity():
+    for text in ("AA", "AKs", "T9s", "22"):
+        values = [preflop_equity(hand(text), k) for k in range(1, preflop.MAX_OPPONENTS + 1)]
+        assert values == sorted(values, reverse=True)
+    with pytest.raises(ValueError):
+        preflop_equity(hand("AA"), 0)
+
+
+def test_suits_do_not_matter():
+    assert preflop_equity([Card(1, "D"), Card(13, "D")]) == preflop_equity(hand("AKs"))
+    assert preflop_equity([Card(13, "C"), Card(1, "D")]) == preflop_equity(hand("AKo"))
+    assert preflop_equity_vs(hand("QQ"), hand("QQ")) == 0.5
@@ -0,0 +1,126 @@
+import asyncio
+
+from texasholdem.states import TableManager
+from websock import REGISTRY
+from websock.session import SessionStore
+
+
+def test_session_resumes_within_grace(run):
+    expired = []
+
+    async def scenario():
+        store = SessionStore(grace=0.05)
+        token = store.open(1)
+        other = store.open(2)
+        assert store.resume("unknown") is None
+        store.detach(1, expired.append)
+        store.detach(2, expired.append)
+        # 期限までに再接続すれば同じ client_id
+        assert store.resume(token) == 1
+        await asyncio.sleep(0.1)
+        assert store.resume(other) is None
+        return store
+
+    store = run(scenario())
+    assert expired == [2]
+    assert len(store) == 1
+
+
+def test_sessions_survive_a_restart(run):
+    expired = []
+
+    async def scenario():
+        store = SessionStore()
+        token = store.open(7)
+        restored = SessionStore(grace=0.05)
+        restored.load(store.dump(), expired.append)
+        assert restored.resume(token) == 7
+        await asyncio.sleep(0.1)
+
+    run(scenario())
+    assert expired == []
+
+
+async def replay(table_manager: TableManager, client_id, seq):
+    # main.replay_tables と同じ手順: 通知を止めてから replay を受信箱に積む
+    table_context = table_manager.get("t")
+    table_context.hold(client_id)
+    actor = table_manager.get_actor("t")
+    assert actor.submit({"action": "replay", "client_id": client_id, "table_id": "t", "seq": seq})
+    await actor.join()
+
+
+def test_replay_sends_only_missed_deltas(run, repository, seat, play, watch):
+    async def scenario():
+        table_manager = TableManager()
+        table_context = table_manager.create("t")
+        sink = watch("t", 0)
+        await seat(table_context, 3)
+        await play(table_context, 10, seed=1)
+        seen = sink.messages[-1]["seq"]
+        # 切断中 (接続は外れても購読は残る) の差分は届かない
+        REGISTRY.detach(0)
+        await play(table_context, 10, seed=2)
+        REGISTRY.register(0, sink)
+        before = len(sink.messages)
+        await replay(table_manager, 0, seen)
+        replayed = sink.messages[before:]
+        await play(table_context, 5, seed=3)
+        live = sink.messages[before + len(replayed) :]
+        table_manager.retire("t")
+        return table_context, seen, replayed, live
+
+    table_context, seen, replayed, live = run(scenario())
+    assert [m["type"] for m in replayed] == ["delta"] * len(replayed)
+    seqs = [m["seq"] for m in replayed + live]
+    assert seqs == list(range(seen + 1, table_context.seq + 1))
+    # 自分の手札の変化も replay に含まれる
+    assert any("hand" in m for m in replayed)
+
+
+def test_replay_falls_back_to_a_snapshot(run, repository, seat, play, watch):
+    async def scenario():
+        table_manager = TableManager()
+        table_context = table_manager.create("t")
+        table_context.history = type(table_context.history)(maxlen=3)
+        sink = watch("t", 0)
+        await seat(table_context, 3)
+        await play(table_context, 5, seed=1)
+        seen = sink.messages[-1]["seq"]
+        REGISTRY.detach(0)
+        await play(table_context, 10, seed=2)
+        REGISTRY.register(0, sink)
+        before = len(sink.messages)
+        # 履歴から消えた分は送り直せない
+        await replay(table_manager, 0, seen)
+        # seq を知らない (新しい端末など)
+        await replay(table_manager, 0, None)
+        table_manager.retire("t")
+        return table_context, sink.messages[before:]
+
+    table_context, messages = run(scenario())
+    assert [(m["type"], m["seq"]) for m in messages] == [("snapshot", table_context.seq)] * 2
+
+
+def test_held_client_gets_nothing_until_replay(run, repository, seat, play, watch):
+    async def scenario():
+        table_manager = TableManager()
+        table_context = table_manager.create("t")
+        sink = watch("t", 0)
+        await seat(table_context, 3)
+        await play(table_context, 5, seed=1)
+        seen = sink.messages[-1]["seq"]
+        table_context.hold(0)
+        before = len(sink.messages)
+        await play(table_context, 5, seed=2)
+        # hold の間はライブの差分もスナップショットも送らない
+        assert len(sink.messages) == before
+        actor = table_manager.get_actor("t")
+        actor.submit({"action": "replay", "client_id": 0, "table_id": "t", "seq": seen})
+        await actor.join()
+        assert table_context.resuming == {}
+        table_manager.retire("t")
+        return table_context, seen, sink.messages[before:]
+
+    table_context, seen, messages = run(scenario())
+    assert [m["seq"] for m in messages] == list(range(seen + 1, table_context.seq + 1))
@@ -0,0 +1,101 @@
+import asyncio
+
+from texasholdem.states import TableManager
+
+
+def test_calls_run_one_at_a_time_in_order(run):
+    log = []
+
+    async def scenario():
+        table_manager = TableManager()
+        actor = table_manager.get_actor(table_manager.create("t").table.id)
+
+        def call(name: str):
+            async def handle():
+                log.append((name, "start"))
+                # 処理の途中で await しても次のメッセージは割り込まない
+                await asyncio.sleep(0)
+                log.append((name, "end"))
+
+            return handle
+
+        assert all(actor.submit_call(call(name)) for name in "abc")
+        assert not actor.is_idle()
+        await actor.join()
+        assert actor.is_idle()
+        table_manager.retire("t")
+
+    run(scenario())
+    assert log == [(n, e) for n in "abc" for e in ("start", "end")]
+
+
+def test_tables_do_not_wait_for_each_other(run):
+    log = []
+
+    async def scenario():
+        table_manager = TableManager()
+        slow = table_manager.get_actor(table_manager.create("slow").table.id)
+        fast = table_manager.get_actor(table_manager.create("fast").table.id)
+        release = asyncio.Event()
+
+        async def stuck():
+            await release.wait()
+            log.append("slow")
+
+        async def quick():
+            log.append("fast")
+
+        slow.submit_call(stuck)
+        fast.submit_call(quick)
+        await fast.join()
+        assert log == ["fast"]
+        release.set()
+        await slow.join()
+        table_manager.retire("slow")
+        table_manager.retire("fast")
+
+    run(scenario())
+    assert log == ["fast", "slow"]
+
+
+def test_full_inbox_and_errors(run):
+    handled = []
+
+    async def scenario():
+        table_manager = TableManager(inbox_size=2)
+        actor = table_manager.get_actor(table_manager.create("t").table.id)
+
+        async def broken():
+            raise RuntimeError("boom")
+
+        async def ok():
+            handled.append(True)
+
+        assert actor.submit_call(broken)
+        assert actor.submit_call(ok)
+        # 受信箱がいっぱいなら断る (呼び出し側が busy を返す)
+        assert not actor.submit_call(ok)
+        await actor.join()
+        # 例外が出ても次のメッセージを処理し続ける
+        assert actor.submit_call(ok)
+        await actor.join()
+        table_manager.retire("t")
+
+    run(scenario())
+    assert handled == [True, True]
+
+
+def test_submit_handles_table_messages(run, repository):
+    async def scenario():
+        table_manager = TableManager()
+        table_context = table_manager.create("t")
+        actor = table_manager.get_actor("t")
+        for client_id in range(2):
+            msg = {"action": "seat", "client_id": client_id, "name": "p{}".format(client_id)}
+            assert actor.submit(dict(msg, amount=client_id))
+        await actor.join()
+        table_manager.retire("t")
+        return table_context
+
+    table_context = run(scenario())
+    assert table_context.table.player_num == 2
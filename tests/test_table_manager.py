@@ -0,0 +1,67 @@
+import pytest
+
+from texasholdem.states import TableManager
+from texasholdem.states.table_manager import DEFAULT_TABLE_ID
+from websock import REGISTRY, table_topic
+
+
+@pytest.fixture
+def table_manager(run):
+    table_manager = TableManager(max_idle=10.0)
+    yield table_manager
+    for table_id in list(table_manager.tables):
+        table_manager.retire(table_id)
+
+
+def test_create_and_lookup(table_manager):
+    first = table_manager.create()
+    second = table_manager.create()
+    named = table_manager.create("named", players_limit=2)
+    assert first.table.id != second.table.id
+    assert len(table_manager) == 3 and "named" in table_manager
+    assert table_manager.get("named") is named and named.table.players_limit == 2
+    assert table_manager.get_or_create("named") is named
+    assert table_manager.get("missing") is None
+    with pytest.raises(KeyError):
+        table_manager.create("named")
+
+
+def test_join_and_leave_subscribe_to_the_table(table_manager):
+    table_context = table_manager.create("t")
+    table_manager.join("t", 1)
+    table_manager.join("t", 2)
+    # TableContext.clients はトピックの購読者そのもの
+    assert table_context.clients == {1, 2}
+    assert table_manager.tables_of(1) == ["t"]
+    table_manager.leave("t", 1)
+    assert table_context.clients == {2}
+    lobby = {t["table_id"]: t for t in table_manager.lobby()}
+    assert lobby["t"]["clients"] == 1 and lobby["t"]["state"] == "beforeGame"
+    REGISTRY.unregister(2)
+
+
+def test_only_idle_tables_are_evicted(run, repository, seat, table_manager):
+    table_manager.create(DEFAULT_TABLE_ID)
+    table_manager.create("idle")
+    table_manager.create("watched")
+    playing = table_manager.create("playing")
+    table_manager.join("watched", 1)
+    run(seat(playing, 2))
+    run(playing.handle({"action": "start", "client_id": 0, "name": "p0"}))
+    now = max(table_manager.last_active.values())
+    # まだ max_idle が経っていない
+    assert table_manager.evict_idle(now + 1) == []
+    # 既定のテーブル、見ている人がいるテーブル、ハンドの途中のテーブルは残す
+    assert table_manager.evict_idle(now + 60) == ["idle"]
+    assert "idle" not in table_manager and table_manager.get_actor("idle") is None
+    assert sorted(table_manager.tables) == [DEFAULT_TABLE_ID, "playing", "watched"]
+    REGISTRY.unregister(1)
+
+
+def test_retire_drops_the_topic(table_manager):
+    table_manager.create("t")
+    table_manager.join("t", 5)
+    table_manager.retire("t")
+    assert "t" not in table_manager
+    assert table_topic("t") not in REGISTRY.topics_of(5)
+    REGISTRY.unregister(5)
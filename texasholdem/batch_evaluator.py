@@ -0,0 +1,120 @@
+import numpy as np
+
+from texasholdem import evaluator
+from texasholdem.evaluator import (
+    CATEGORY_SHIFT,
+    FOUR_OF_A_KIND,
+    FULL_HOUSE,
+    THREE_OF_A_KIND,
+    TWO_PAIR,
+    ONE_PAIR,
+    HIGH_CARD,
+    RANKS,
+    SUITS,
+)
+
+import logging
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# evaluator のテーブルを numpy 配列にしたもの
+TOP5 = np.asarray(evaluator.TOP5, dtype=np.int32)
+STRAIGHT_TABLE = np.asarray(evaluator.STRAIGHT_TABLE, dtype=np.int32)
+FLUSH7_TABLE = np.asarray(evaluator.FLUSH7_TABLE, dtype=np.int32)
+HIGH_BIT = np.asarray(
+    [max(mask.bit_length() - 1, 0) for mask in range(1 << RANKS)], dtype=np.int32
+)
+RANK_BITS = np.left_shift(1, np.arange(RANKS, dtype=np.int32))
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+
+def evaluate_batch(codes, chunk_size: int = DEFAULT_CHUNK_SIZE) -> np.ndarray:
+    """Score N hands of 5 to 7 card codes given as an (N, k) integer array.
+
+    Returns an int32 array of strengths identical to evaluator.evaluate.
+    """
+    codes = np.asarray(codes)
+    if codes.ndim != 2 or not 5 <= codes.shape[1] <= 7:
+        raise ValueError(
+            "codes must have shape (N, 5..7), got {}".format(codes.shape)
+        )
+    if codes.size and (codes.min() < 0 or codes.max() >= RANKS * SUITS):
+        raise ValueError("card codes must be in range 0..51")
+    codes = codes.astype(np.int32, copy=False)
+    result = np.empty(len(codes), dtype=np.int32)
+    for start in range(0, len(codes), chunk_size):
+        stop = start + chunk_size
+        result[start:stop] = _evaluate_chunk(codes[start:stop])
+    return result
+
+
+def _evaluate_chunk(codes: np.ndarray) -> np.ndarray:
+    ranks = codes >> 2
+    suits = codes & 3
+    bits = RANK_BITS[ranks]
+
+    flush = np.zeros(len(codes), dtype=np.int32)
+    for s in range(SUITS):
+        suit_mask = np.bitwise_or.reduce(np.where(suits == s, bits, 0), axis=1)
+        np.maximum(flush, FLUSH7_TABLE[suit_mask], out=flush)
+
+    counts = (ranks[:, :, None] == np.arange(RANKS)).sum(axis=1)
+    m1, m2, m3, m4 = [((counts >= n) * RANK_BITS).sum(axis=1) for n in (1, 2, 3, 4)]
+
+    quad = HIGH_BIT[m4]
+    four_of_a_kind = (
+        FOUR_OF_A_KIND << CATEGORY_SHIFT
+        | quad << 16
+        | (TOP5[m1 & ~(1 << quad)] >> 16) << 12
+    )
+
+    trip = HIGH_BIT[m3]
+    full_house_pairs = m2 & ~(1 << trip)
+    full_house = (
+        FULL_HOUSE << CATEGORY_SHIFT | trip << 16 | HIGH_BIT[full_house_pairs] << 12
+    )
+    three_of_a_kind = (
+        THREE_OF_A_KIND << CATEGORY_SHIFT
+        | trip << 16
+        | (TOP5[m1 & ~(1 << trip)] >> 12) << 8
+    )
+
+    straight = STRAIGHT_TABLE[m1]
+
+    high = HIGH_BIT[m2]
+    low_pairs = m2 & ~(1 << high)
+    low = HIGH_BIT[low_pairs]
+    two_pair = (
+        TWO_PAIR << CATEGORY_SHIFT
+        | high << 16
+        | low << 12
+        | (TOP5[m1 & ~(1 << high) & ~(1 << low)] >> 16) << 8
+    )
+    one_pair = (
+        ONE_PAIR << CATEGORY_SHIFT | high << 16 | (TOP5[m1 & ~(1 << high)] >> 8) << 4
+    )
+    high_card = HIGH_CARD << CATEGORY_SHIFT | TOP5[m1]
+
+    return np.select(
+        [
+            flush > 0,
+            m4 > 0,
+            (m3 > 0) & (full_house_pairs > 0),
+            straight > 0,
+            m3 > 0,
+            low_pairs > 0,
+            m2 > 0,
+        ],
+        [
+            flush,
+            four_of_a_kind,
+            full_house,
+            straight,
+            three_of_a_kind,
+            two_pair,
+            one_pair,
+        ],
+        default=high_card,
+    )
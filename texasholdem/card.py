@@ -1,3 +1,4 @@
+from __future__ import annotations
 from functools import total_ordering
 
 import logging
@@ -10,14 +11,43 @@ BASE_NUMBERS = list(range(1, 14))
 BASE_PIPS_COURTS = "A23456789TJQK"
 
 
+_INTERNED = {}  # type: dict[tuple, Card]
+
+
 @total_ordering
 class Card:
-    def __init__(self, number: int, suit: str):
+    # 同じカードは常に同じインスタンス (CARDS) を返す
+    # code = rank * 4 + suit_index (rank: 0..12 = 2..A)。裏向きのカードは -1
+    __slots__ = ("number", "suit", "code", "rank", "suit_index", "rank_bit", "suit_bit")
+
+    def __new__(cls, number: int, suit: str):
+        card = _INTERNED.get((number, suit))
+        if card is not None:
+            return card
         assert 0 <= number <= 13
         assert suit in BASE_SUIT or suit == "B"
 
-        self.number = number
-        self.suit = suit
+        card = object.__new__(cls)
+        card.number = number
+        card.suit = suit
+        if number == 0 or suit == "B":
+            card.rank = card.suit_index = card.code = -1
+            card.rank_bit = card.suit_bit = 0
+        else:
+            card.rank = (number + 11) % 13
+            card.suit_index = BASE_SUIT.index(suit)
+            card.code = card.rank * 4 + card.suit_index
+            card.rank_bit = 1 << card.rank
+            card.suit_bit = 1 << card.suit_index
+        _INTERNED[(number, suit)] = card
+        return card
+
+    @staticmethod
+    def from_code(code: int) -> Card:
+        return CARDS[code]
+
+    def __reduce__(self):
+        return Card, (self.number, self.suit)
 
     def __eq__(self, other) -> bool:
         if not isinstance(other, Card):
@@ -27,10 +57,7 @@ class Card:
     def __lt__(self, other) -> bool:
         if not isinstance(other, Card):
             return NotImplemented
-        self_number, other_number = [
-            14 if n == 1 else n for n in [self.number, other.number]
-        ]
-        return self_number < other_number
+        return self.rank < other.rank
 
     def __str__(self):
         return self.to_short_str()
@@ -49,3 +76,11 @@ class Card:
 
     def toJSON(self):
         return {"number": self.number, "suit": self.suit}
+
+
+CARDS = [
+    Card((rank + 1) % 13 + 1, BASE_SUIT[suit_index])
+    for rank in range(13)
+    for suit_index in range(4)
+]
+HIDDEN_CARD = Card(0, "B")
@@ -3,47 +3,70 @@ from typing import List, Union
 from texasholdem import Card
 
 import logging
+import random
 
-from texasholdem.card import BASE_SUIT, BASE_NUMBERS
+from texasholdem.card import BASE_SUIT, BASE_NUMBERS, CARDS
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 
 class Deck:
-    def __init__(self, cards=None):
-        from itertools import product
+    # 52枚の配列を使い回し、配った位置を cursor で管理する
+    def __init__(self, cards=None, rng: random.Random = None):
         if cards is None:
-            self.cards = [Card(n, s) for n, s in product(BASE_NUMBERS, BASE_SUIT)]
+            self.cards = list(CARDS)
         else:
             self.cards = cards
+        self.cursor = 0
+        # シャッフルの seed はこの RNG から払い出す (グローバルな random は触らない)
+        self.rng = rng if rng is not None else random.Random()
+        self.seed = None
+        self._shuffler = random.Random()
+
+    def reset(self):
+        # 同じ seed から同じ並びを再現できるよう、初期の並びに戻す
+        self.cards[:] = CARDS
+        self.cursor = 0
+        self.seed = None
 
     def shuffle(self, seed=None):
-        import random
-        random.seed(seed)
-        random.shuffle(self.cards)
+        if seed is None:
+            seed = self.rng.getrandbits(64)
+        self.seed = seed
+        self._shuffler.seed(seed)
+        if self.cursor == 0:
+            self._shuffler.shuffle(self.cards)
+        else:
+            rest = self.cards[self.cursor:]
+            self._shuffler.shuffle(rest)
+            self.cards[self.cursor:] = rest
 
-    def peek(self, num=1) -> __class__:
-        assert 1 <= num <= len(self.cards)
+    def peek(self, num=1) -> List[Card]:
+        assert 1 <= num <= len(self)
 
-        return Deck(self.cards[0:num])
+        return self.cards[self.cursor:self.cursor + num]
 
-    def draw(self, num=1) -> __class__:
-        assert 1 <= num <= len(self.cards)
-        drawn_cards, self.cards = Deck(self.cards[0:num]), self.cards[num:]
+    def draw(self, num=1) -> List[Card]:
+        assert 1 <= num <= len(self)
+        drawn_cards = self.cards[self.cursor:self.cursor + num]
+        self.cursor += num
         return drawn_cards
 
     def to_dict_list(self):
-        return [c.to_dict() for c in self.cards]
+        return [c.to_dict() for c in self.cards[self.cursor:]]
+
+    def __len__(self):
+        return len(self.cards) - self.cursor
 
     def __str__(self) -> str:
-        return str(self.cards)
+        return str(self.cards[self.cursor:])
 
     def __getitem__(self, item) -> Union[Card, List[Card]]:
         if isinstance(item, slice):
-            return self.cards[item]
+            return self.cards[self.cursor:][item]
         if isinstance(item, int):
-            return self.cards[item]
+            return self.cards[self.cursor:][item]
         raise NotImplemented
 
 
@@ -53,7 +76,7 @@ if __name__ == '__main__':
     deck = Deck()
     logger.debug("Original Cards: {}".format(deck))
     deck.shuffle()
-    logger.debug("Shuffled Cards: {}".format(deck))
+    logger.debug("Shuffled Cards (seed={}): {}".format(deck.seed, deck))
     draw = deck.draw(1)
     logger.debug("Drawn: {}, Deck:{}".format(draw, deck))
     draw = deck.draw(2)
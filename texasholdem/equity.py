@@ -0,0 +1,286 @@
+from __future__ import annotations
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import lru_cache
+from itertools import combinations, permutations
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from texasholdem import Card
+from texasholdem.batch_evaluator import evaluate_batch
+
+import logging
+import os
+import time
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+DEFAULT_TRIALS = 100000
+CHUNK_TRIALS = 4096
+EXACT_CACHE_SIZE = 4096
+MIN_PLAYERS = 2
+MAX_PLAYERS = 9
+
+# executor を渡されなかったときに使うプロセスプール (初めて使うときに作って使い回す)
+_pool = None  # type: Optional[ProcessPoolExecutor]
+_pool_workers = 0
+
+
+class Equity:
+    def __init__(self, trials: int, wins: float = 0, ties: float = 0, share: float = 0):
+        self.trials = trials
+        self.wins = wins
+        self.ties = ties
+        self.share = share
+
+    @property
+    def win(self) -> float:
+        return self.wins / self.trials if self.trials else 0.0
+
+    @property
+    def tie(self) -> float:
+        return self.ties / self.trials if self.trials else 0.0
+
+    @property
+    def equity(self) -> float:
+        return self.share / self.trials if self.trials else 0.0
+
+    def __repr__(self):
+        return "Equity(win={:.4f}, tie={:.4f}, equity={:.4f}, trials={})".format(
+            self.win, self.tie, self.equity, self.trials
+        )
+
+    def toJSON(self):
+        return {"win": self.win, "tie": self.tie, "equity": self.equity}
+
+
+def to_codes(cards: Sequence[Card]) -> List[int]:
+    return [c.code for c in cards]
+
+
+def validate(hands: Sequence[Sequence[int]], board: Sequence[int], dead: Sequence[int]):
+    if not MIN_PLAYERS <= len(hands) <= MAX_PLAYERS:
+        raise ValueError(
+            "equity needs {}-{} hands, got {}".format(MIN_PLAYERS, MAX_PLAYERS, len(hands))
+        )
+    if any(len(h) != 2 for h in hands):
+        raise ValueError("each hand must have exactly 2 cards")
+    if len(board) > 5:
+        raise ValueError("board cannot have more than 5 cards")
+    used = [c for h in hands for c in h] + list(board) + list(dead)
+    if len(set(used)) != len(used):
+        raise ValueError("duplicate cards in hands, board and dead cards")
+
+
+def tally(strengths: np.ndarray):
+    """strengths: (players, trials). Returns per-player (wins, ties, share)."""
+    best = strengths.max(axis=0)
+    winners = strengths == best
+    winner_count = winners.sum(axis=0)
+    sole = winner_count == 1
+    wins = (winners & sole).sum(axis=1)
+    ties = (winners & ~sole).sum(axis=1)
+    share = (winners / winner_count).sum(axis=1)
+    return wins, ties, share
+
+
+def score_boards(hands: np.ndarray, boards: np.ndarray) -> np.ndarray:
+    """Strengths of each hand against each full board, shape (players, boards)."""
+    return np.stack(
+        [
+            evaluate_batch(
+                np.concatenate([np.broadcast_to(hand, (len(boards), 2)), boards], axis=1)
+            )
+            for hand in hands
+        ]
+    )
+
+
+def _run_trials(hands, board, live, trials, deadline, seed):
+    # ワーカープロセスで実行される
+    rng = np.random.default_rng(seed)
+    hands = np.asarray(hands, dtype=np.int32)
+    board = np.asarray(board, dtype=np.int32)
+    live = np.asarray(live, dtype=np.int32)
+    need = 5 - len(board)
+    done = 0
+    wins = np.zeros(len(hands))
+    ties = np.zeros(len(hands))
+    share = np.zeros(len(hands))
+    while trials is None or done < trials:
+        # 締め切りを過ぎていても最低1チャンクは回す
+        if deadline is not None and done and time.time() >= deadline:
+            break
+        n = CHUNK_TRIALS if trials is None else min(CHUNK_TRIALS, trials - done)
+        picks = np.argsort(rng.random((n, len(live))), axis=1)[:, :need]
+        boards = np.concatenate([np.broadcast_to(board, (n, len(board))), live[picks]], axis=1)
+        w, t, s = tally(score_boards(hands, boards))
+        wins += w
+        ties += t
+        share += s
+        done += n
+    return done, wins, ties, share
+
+
+def monte_carlo_equity(
+    hands: Sequence[Sequence[Card]],
+    board: Sequence[Card] = (),
+    dead: Sequence[Card] = (),
+    trials: Optional[int] = None,
+    time_budget: Optional[float] = None,
+    workers: Optional[int] = None,
+    seed: Optional[int] = None,
+    executor: Optional[Executor] = None,
+) -> List[Equity]:
+    """Estimate win/tie probabilities by random runouts.
+
+    Trials are split across a process pool; each worker draws from its own
+    RNG spawned from ``seed``. With ``time_budget`` (seconds) workers stop at
+    the deadline, and ``trials`` then only acts as an upper bound.
+    """
+    hand_codes = [to_codes(h) for h in hands]
+    board_codes = to_codes(board)
+    dead_codes = to_codes(dead)
+    validate(hand_codes, board_codes, dead_codes)
+
+    used = set(c for h in hand_codes for c in h) | set(board_codes) | set(dead_codes)
+    live = [c for c in range(52) if c not in used]
+    if len(board_codes) == 5:
+        # ボードが確定していれば 1 回評価するだけ
+        strengths = np.stack(
+            [evaluate_batch([h + board_codes]) for h in hand_codes]
+        )
+        return [Equity(1, *r) for r in zip(*tally(strengths))]
+
+    done, wins, ties, share = run_parallel(
+        _run_trials,
+        (hand_codes, board_codes, live),
+        trials,
+        time_budget,
+        workers,
+        seed,
+        executor,
+    )
+    return [Equity(done, w, t, s) for w, t, s in zip(wins, ties, share)]
+
+
+def _ready(_):
+    return os.getpid()
+
+
+def get_pool(workers: int) -> ProcessPoolExecutor:
+    """Shared process pool with at least ``workers`` processes, started on first use."""
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers < workers:
+        shutdown_pool()
+        pool = ProcessPoolExecutor(max_workers=workers)
+        # ワーカーを起動しきってから返す (起動時間を time_budget に含めない)
+        list(pool.map(_ready, range(workers)))
+        _pool, _pool_workers = pool, workers
+    return _pool
+
+
+def shutdown_pool():
+    global _pool, _pool_workers
+    if _pool is not None:
+        _pool.shutdown(wait=True)
+    _pool = None
+    _pool_workers = 0
+
+
+def run_parallel(
+    worker,
+    args: tuple,
+    trials: Optional[int],
+    time_budget: Optional[float],
+    workers: Optional[int],
+    seed: Optional[int],
+    executor: Optional[Executor],
+):
+    """Run worker(*args, quota, deadline, seed) on a process pool and sum the results.
+
+    Without ``executor`` the shared pool from ``get_pool`` is used. The
+    deadline starts once the pool is up, and each worker runs at least one
+    chunk before checking it.
+    """
+    if trials is None and time_budget is None:
+        trials = DEFAULT_TRIALS
+    workers = workers or os.cpu_count() or 1
+    pool = executor if executor is not None else get_pool(workers)
+    deadline = time.time() + time_budget if time_budget is not None else None
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    quotas = [None] * workers
+    if trials is not None:
+        quotas = [trials // workers + (1 if i < trials % workers else 0) for i in range(workers)]
+
+    futures = [
+        pool.submit(worker, *args, quota, deadline, s)
+        for quota, s in zip(quotas, seeds)
+        if quota != 0
+    ]
+    results = [f.result() for f in futures]
+
+    done = sum(r[0] for r in results)
+    logger.debug("{}: {} trials on {} workers".format(worker.__name__, done, len(results)))
+    return (
+        done,
+        sum(r[1] for r in results),
+        sum(r[2] for r in results),
+        sum(r[3] for r in results),
+    )
+
+
+def canonicalize(
+    hands: Sequence[Sequence[int]], board: Sequence[int], dead: Sequence[int]
+) -> Tuple:
+    """Smallest representation of the spot over all 24 suit permutations.
+
+    Player order is kept, so results of the canonical spot map back directly.
+    """
+    best = None
+    for perm in permutations(range(4)):
+        def remap(cards):
+            return tuple(sorted((c & ~3) | perm[c & 3] for c in cards))
+
+        key = (tuple(remap(h) for h in hands), remap(board), remap(dead))
+        if best is None or key < best:
+            best = key
+    return best
+
+
+@lru_cache(maxsize=EXACT_CACHE_SIZE)
+def _exact_equity_canonical(key: Tuple):
+    hands, board, dead = key
+    used = set(c for h in hands for c in h) | set(board) | set(dead)
+    live = [c for c in range(52) if c not in used]
+    need = 5 - len(board)
+    runouts = np.array(list(combinations(live, need)), dtype=np.int32)
+    runouts = runouts.reshape(len(runouts), need)
+    boards = np.concatenate(
+        [np.broadcast_to(np.asarray(board, dtype=np.int32), (len(runouts), len(board))), runouts],
+        axis=1,
+    )
+    wins, ties, share = tally(score_boards(np.asarray(hands, dtype=np.int32), boards))
+    return len(runouts), tuple(zip(wins.tolist(), ties.tolist(), share.tolist()))
+
+
+def exact_equity(
+    hands: Sequence[Sequence[Card]],
+    board: Sequence[Card],
+    dead: Sequence[Card] = (),
+) -> List[Equity]:
+    """Exact equity by enumerating every runout of a flop or turn board.
+
+    Results are memoized by the suit-isomorphic form of the spot.
+    """
+    hand_codes = [to_codes(h) for h in hands]
+    board_codes = to_codes(board)
+    dead_codes = to_codes(dead)
+    validate(hand_codes, board_codes, dead_codes)
+    if len(board_codes) < 3:
+        raise ValueError("exact equity needs at least a flop on the board")
+    total, results = _exact_equity_canonical(
+        canonicalize(hand_codes, board_codes, dead_codes)
+    )
+    return [Equity(total, *r) for r in results]
@@ -0,0 +1,240 @@
+from itertools import combinations, combinations_with_replacement
+from typing import List, Sequence
+
+import logging
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Card code (Card.code): rank * 4 + suit
+#   rank: 0..12 (2, 3, ..., K, A)
+#   suit: index of BASE_SUIT
+RANKS = 13
+SUITS = 4
+PRIMES = [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41]
+
+# Strength: category << 20 | tiebreak ranks packed as nibbles (left aligned).
+# category is the value of RankName, so a larger strength is a stronger hand.
+CATEGORY_SHIFT = 20
+
+HIGH_CARD = 1
+ONE_PAIR = 2
+TWO_PAIR = 3
+THREE_OF_A_KIND = 4
+STRAIGHT = 5
+FLUSH = 6
+FULL_HOUSE = 7
+FOUR_OF_A_KIND = 8
+STRAIGHT_FLUSH = 9
+
+CARD_RANK = [code >> 2 for code in range(RANKS * SUITS)]
+CARD_SUIT = [code & 3 for code in range(RANKS * SUITS)]
+CARD_RANK_BIT = [1 << (code >> 2) for code in range(RANKS * SUITS)]
+CARD_PRIME = [PRIMES[code >> 2] for code in range(RANKS * SUITS)]
+
+WHEEL_MASK = 0b1000000001111  # A, 5, 4, 3, 2
+
+
+def pack(category: int, ranks: Sequence[int]) -> int:
+    strength = category
+    for i in range(5):
+        strength = (strength << 4) | (ranks[i] if i < len(ranks) else 0)
+    return strength
+
+
+def category_of(strength: int) -> int:
+    return strength >> CATEGORY_SHIFT
+
+
+def straight_top(mask: int) -> int:
+    # 最も高いストレートのトップランク。なければ -1
+    for top in range(12, 3, -1):
+        window = 0b11111 << (top - 4)
+        if mask & window == window:
+            return top
+    if mask & WHEEL_MASK == WHEEL_MASK:
+        return 3
+    return -1
+
+
+def _score_distinct(ranks: Sequence[int], flush: bool) -> int:
+    # ranks: 5 distinct ranks, descending
+    mask = 0
+    for r in ranks:
+        mask |= 1 << r
+    top = straight_top(mask)
+    if top >= 0:
+        return pack(STRAIGHT_FLUSH if flush else STRAIGHT, [top])
+    return pack(FLUSH if flush else HIGH_CARD, ranks)
+
+
+def _score_paired(ranks: Sequence[int]) -> int:
+    counts = {}
+    for r in ranks:
+        counts[r] = counts.get(r, 0) + 1
+    groups = sorted(counts.items(), key=lambda rc: (rc[1], rc[0]), reverse=True)
+    shape = [c for _, c in groups]
+    order = [r for r, _ in groups]
+    if shape[0] == 4:
+        category = FOUR_OF_A_KIND
+    elif shape == [3, 2]:
+        category = FULL_HOUSE
+    elif shape[0] == 3:
+        category = THREE_OF_A_KIND
+    elif shape[:2] == [2, 2]:
+        category = TWO_PAIR
+    else:
+        category = ONE_PAIR
+    return pack(category, order)
+
+
+def _build_tables():
+    flush_table = [0] * (1 << RANKS)
+    unique5_table = [0] * (1 << RANKS)
+    paired_table = {}
+    for combo in combinations(range(RANKS - 1, -1, -1), 5):
+        mask = 0
+        for r in combo:
+            mask |= 1 << r
+        flush_table[mask] = _score_distinct(combo, True)
+        unique5_table[mask] = _score_distinct(combo, False)
+    for combo in combinations_with_replacement(range(RANKS - 1, -1, -1), 5):
+        if len(set(combo)) == 5 or any(combo.count(r) > 4 for r in combo):
+            continue
+        product = 1
+        for r in combo:
+            product *= PRIMES[r]
+        paired_table[product] = _score_paired(combo)
+    return flush_table, unique5_table, paired_table
+
+
+FLUSH_TABLE, UNIQUE5_TABLE, PAIRED_TABLE = _build_tables()
+
+
+def evaluate5(codes: List[int]) -> int:
+    a, b, c, d, e = codes
+    mask = (
+        CARD_RANK_BIT[a]
+        | CARD_RANK_BIT[b]
+        | CARD_RANK_BIT[c]
+        | CARD_RANK_BIT[d]
+        | CARD_RANK_BIT[e]
+    )
+    if a & 3 == b & 3 == c & 3 == d & 3 == e & 3:
+        return FLUSH_TABLE[mask]
+    strength = UNIQUE5_TABLE[mask]
+    if strength:
+        return strength
+    return PAIRED_TABLE[
+        CARD_PRIME[a] * CARD_PRIME[b] * CARD_PRIME[c] * CARD_PRIME[d] * CARD_PRIME[e]
+    ]
+
+
+# Best-of-N (5 to 7 cards) evaluation from rank/suit bitmasks.
+#   m1..m4: ranks held at least 1..4 times
+#   suit_masks: ranks held in each suit
+POPCOUNT = [bin(mask).count("1") for mask in range(1 << RANKS)]
+# Top five ranks of a mask packed as nibbles, left aligned in 20 bits
+TOP5 = [0] * (1 << RANKS)
+STRAIGHT_TABLE = [0] * (1 << RANKS)
+FLUSH7_TABLE = [0] * (1 << RANKS)
+
+
+def _build_mask_tables():
+    for mask in range(1, 1 << RANKS):
+        ranks = [r for r in range(RANKS - 1, -1, -1) if mask >> r & 1][:5]
+        TOP5[mask] = pack(0, ranks)
+        top = straight_top(mask)
+        if top >= 0:
+            STRAIGHT_TABLE[mask] = pack(STRAIGHT, [top])
+        if POPCOUNT[mask] >= 5:
+            if top >= 0:
+                FLUSH7_TABLE[mask] = pack(STRAIGHT_FLUSH, [top])
+            else:
+                FLUSH7_TABLE[mask] = pack(FLUSH, ranks)
+
+
+_build_mask_tables()
+
+
+def evaluate_masks(m1: int, m2: int, m3: int, m4: int, suit_masks: Sequence[int]) -> int:
+    # 7枚以下でフラッシュがあればクアッズ・フルハウスは成立しない
+    for suit_mask in suit_masks:
+        strength = FLUSH7_TABLE[suit_mask]
+        if strength:
+            return strength
+    if m4:
+        quad = m4.bit_length() - 1
+        rest = m1 & ~(1 << quad)
+        return (
+            FOUR_OF_A_KIND << CATEGORY_SHIFT
+            | quad << 16
+            | (TOP5[rest] >> 16) << 12
+        )
+    if m3:
+        trip = m3.bit_length() - 1
+        pairs = m2 & ~(1 << trip)
+        if pairs:
+            return (
+                FULL_HOUSE << CATEGORY_SHIFT
+                | trip << 16
+                | (pairs.bit_length() - 1) << 12
+            )
+    strength = STRAIGHT_TABLE[m1]
+    if strength:
+        return strength
+    if m3:
+        trip = m3.bit_length() - 1
+        rest = m1 & ~(1 << trip)
+        return THREE_OF_A_KIND << CATEGORY_SHIFT | trip << 16 | (TOP5[rest] >> 12) << 8
+    if m2:
+        high = m2.bit_length() - 1
+        low_pairs = m2 & ~(1 << high)
+        if low_pairs:
+            low = low_pairs.bit_length() - 1
+            rest = m1 & ~(1 << high) & ~(1 << low)
+            return (
+                TWO_PAIR << CATEGORY_SHIFT
+                | high << 16
+                | low << 12
+                | (TOP5[rest] >> 16) << 8
+            )
+        rest = m1 & ~(1 << high)
+        return ONE_PAIR << CATEGORY_SHIFT | high << 16 | (TOP5[rest] >> 8) << 4
+    return HIGH_CARD << CATEGORY_SHIFT | TOP5[m1]
+
+
+def evaluate(codes: Sequence[int]) -> int:
+    m1 = m2 = m3 = m4 = 0
+    suit_masks = [0, 0, 0, 0]
+    for code in codes:
+        bit = CARD_RANK_BIT[code]
+        m4 |= m3 & bit
+        m3 |= m2 & bit
+        m2 |= m1 & bit
+        m1 |= bit
+        suit_masks[code & 3] |= bit
+    return evaluate_masks(m1, m2, m3, m4, suit_masks)
+
+
+class HandState:
+    """Rank/suit masks of a hand that grows card by card (hole cards, then board)."""
+
+    __slots__ = ("m1", "m2", "m3", "m4", "suit_masks")
+
+    def __init__(self, codes: Sequence[int] = ()):
+        self.m1 = self.m2 = self.m3 = self.m4 = 0
+        self.suit_masks = [0, 0, 0, 0]
+        for code in codes:
+            self.add(code)
+
+    def add(self, code: int):
+        bit = CARD_RANK_BIT[code]
+        self.m4 |= self.m3 & bit
+        self.m3 |= self.m2 & bit
+        self.m2 |= self.m1 & bit
+        self.m1 |= bit
+        self.suit_masks[code & 3] |= bit
+
+    def strength(self) -> int:
+        return evaluate_masks(self.m1, self.m2, self.m3, self.m4, self.suit_masks)
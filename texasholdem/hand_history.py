@@ -0,0 +1,329 @@
+import asyncio
+import logging
+import mmap
+import os
+import re
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# ハンド履歴: 1ハンド = 1レコード (長さ 4byte + 本体) をセグメントファイルに追記する
+#   hands-000001.log  レコードの列
+#   hands-000001.idx  (hand_id, オフセット) の列 (16byte ずつ)
+# 本体: hand_id (8byte), 時刻 (double), table_id (文字列), イベントの列
+# 文字列は長さ 1byte + utf-8、カードはコード 1byte、額は 4byte
+DEFAULT_SEGMENT_SIZE = 64 * 1024 * 1024
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+START, POST, HOLE, ACTION, BOARD, AWARD = range(1, 7)
+EVENTS = {START: "start", POST: "post", HOLE: "hole", ACTION: "action", BOARD: "board", AWARD: "award"}
+ACTIONS = ["check", "call", "bet", "raise", "fold", "showdown", "muck"]
+ACTION_INDEX = {a: i for i, a in enumerate(ACTIONS)}
+
+LENGTH = struct.Struct("<I")
+HEADER = struct.Struct("<Qd")
+INDEX_ENTRY = struct.Struct("<QQ")
+START_HEAD = struct.Struct("<BBIIB")  # kind, button, SB, BB, 席の数
+SEAT = struct.Struct("<BI")  # 席番号, バンクロール (ブラインド前)
+SEAT_AMOUNT = struct.Struct("<BBI")  # kind, 席番号, 額 (POST / AWARD)
+HOLE_CARDS = struct.Struct("<BBBB")
+SEAT_ACTION = struct.Struct("<BBBI")
+
+SEGMENT_NAME = re.compile(r"hands-(\d{6})\.log$")
+
+
+def _pack_str(s) -> bytes:
+    b = str(s).encode("utf-8")
+    if len(b) > 255:
+        # 文字の途中で切らない
+        b = b[:255].decode("utf-8", "ignore").encode("utf-8")
+    return bytes((len(b),)) + b
+
+
+def _unpack_str(buf, pos: int) -> Tuple[str, int]:
+    n = buf[pos]
+    return bytes(buf[pos + 1 : pos + 1 + n]).decode("utf-8"), pos + 1 + n
+
+
+class HandRecorder:
+    # 1ハンド分のイベントを溜める。ゲームの処理中は bytearray に足すだけ
+    __slots__ = ("table_id", "started", "events")
+
+    def __init__(self, table):
+        self.table_id = table.id
+        self.started = time.time()
+        self.events = bytearray()
+        seats = [(i, p.player) for i, p in enumerate(table.player_seating_chart) if p is not None]
+        self.events += START_HEAD.pack(
+            START, table.button_player, table.stakes["SB"], table.stakes["BB"], len(seats)
+        )
+        for i, player in seats:
+            self.events += SEAT.pack(i, player.bankroll)
+            self.events += _pack_str(player.id)
+            self.events += _pack_str(player.name)
+
+    @staticmethod
+    def restore(table_id, started: float, events: bytes) -> "HandRecorder":
+        # チェックポイントから途中のハンドを戻す
+        recorder = HandRecorder.__new__(HandRecorder)
+        recorder.table_id = table_id
+        recorder.started = started
+        recorder.events = bytearray(events)
+        return recorder
+
+    def post(self, seat: int, amount: int):
+        self.events += SEAT_AMOUNT.pack(POST, seat, amount)
+
+    def hole(self, seat: int, cards):
+        self.events += HOLE_CARDS.pack(HOLE, seat, cards[0].code, cards[1].code)
+
+    def action(self, seat: int, action: str, amount: int = 0):
+        self.events += SEAT_ACTION.pack(ACTION, seat, ACTION_INDEX[action], amount)
+
+    def board(self, cards):
+        self.events += bytes((BOARD, len(cards))) + bytes(c.code for c in cards)
+
+    def award(self, seat: int, amount: int):
+        self.events += SEAT_AMOUNT.pack(AWARD, seat, amount)
+
+    def encode(self, hand_id: int) -> bytes:
+        return HEADER.pack(hand_id, self.started) + _pack_str(self.table_id) + self.events
+
+
+def decode_hand(buf) -> dict:
+    # レコード本体 (長さを除いた部分) を dict に戻す
+    from texasholdem.card import Card
+
+    hand_id, started = HEADER.unpack_from(buf, 0)
+    table_id, pos = _unpack_str(buf, HEADER.size)
+    hand = {"hand_id": hand_id, "time": started, "table_id": table_id, "events": []}
+    events = hand["events"]
+    end = len(buf)
+    while pos < end:
+        kind = buf[pos]
+        if kind == START:
+            _, button, sb, bb, n = START_HEAD.unpack_from(buf, pos)
+            pos += START_HEAD.size
+            seats = []
+            for _ in range(n):
+                seat, bankroll = SEAT.unpack_from(buf, pos)
+                player_id, pos = _unpack_str(buf, pos + SEAT.size)
+                name, pos = _unpack_str(buf, pos)
+                seats.append({"seat": seat, "player_id": player_id, "name": name, "bankroll": bankroll})
+            hand.update({"button": button, "stakes": {"SB": sb, "BB": bb}, "seats": seats})
+        elif kind == POST or kind == AWARD:
+            _, seat, amount = SEAT_AMOUNT.unpack_from(buf, pos)
+            pos += SEAT_AMOUNT.size
+            events.append((EVENTS[kind], seat, amount))
+        elif kind == HOLE:
+            _, seat, a, b = HOLE_CARDS.unpack_from(buf, pos)
+            pos += HOLE_CARDS.size
+            events.append(("hole", seat, [Card.from_code(a), Card.from_code(b)]))
+        elif kind == ACTION:
+            _, seat, action, amount = SEAT_ACTION.unpack_from(buf, pos)
+            pos += SEAT_ACTION.size
+            events.append(("action", seat, ACTIONS[action], amount))
+        elif kind == BOARD:
+            n = buf[pos + 1]
+            events.append(("board", [Card.from_code(c) for c in buf[pos + 2 : pos + 2 + n]]))
+            pos += 2 + n
+        else:
+            raise ValueError("unknown hand history event {} at {}".format(kind, pos))
+    return hand
+
+
+def segment_path(directory: str, number: int, ext: str = "log") -> str:
+    return os.path.join(directory, "hands-{:06d}.{}".format(number, ext))
+
+
+def list_segments(directory: str) -> List[int]:
+    if not os.path.isdir(directory):
+        return []
+    numbers = []
+    for name in os.listdir(directory):
+        m = SEGMENT_NAME.match(name)
+        if m:
+            numbers.append(int(m.group(1)))
+    return sorted(numbers)
+
+
+def read_index(directory: str, number: int) -> List[Tuple[int, int]]:
+    # 途中で切れたエントリは捨てる
+    try:
+        with open(segment_path(directory, number, "idx"), "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return []
+    n = len(data) // INDEX_ENTRY.size
+    return [INDEX_ENTRY.unpack_from(data, i * INDEX_ENTRY.size) for i in range(n)]
+
+
+class HandHistoryWriter:
+    # append はメモリに積むだけ。run_flusher が flush_interval ごとに
+    # 専用スレッドでまとめて write + fsync する (ゲームのループは待たない)
+    def __init__(
+        self,
+        directory: str,
+        segment_size: int = DEFAULT_SEGMENT_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+    ):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+        # 再起動時は新しいセグメントから書く (前回の末尾が途中で切れていても触らない)
+        segments = list_segments(directory)
+        self.next_hand_id = 1
+        for number in reversed(segments):
+            index = read_index(directory, number)
+            if index:
+                self.next_hand_id = index[-1][0] + 1
+                break
+        self.segment = (segments[-1] if segments else 0) + 1
+        self.position = 0
+        # セグメント番号 -> (まだ書いていないレコード, インデックス)
+        self.pending = {}  # type: Dict[int, Tuple[bytearray, bytearray]]
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.written = 0
+        self._flushing = None
+
+    def append(self, recorder: HandRecorder) -> int:
+        hand_id = self.next_hand_id
+        self.next_hand_id += 1
+        body = recorder.encode(hand_id)
+        size = LENGTH.size + len(body)
+        if self.position > 0 and self.position + size > self.segment_size:
+            self.segment += 1
+            self.position = 0
+        records, index = self.pending.setdefault(self.segment, (bytearray(), bytearray()))
+        index += INDEX_ENTRY.pack(hand_id, self.position)
+        records += LENGTH.pack(len(body))
+        records += body
+        self.position += size
+        return hand_id
+
+    def take_pending(self):
+        pending, self.pending = self.pending, {}
+        return pending
+
+    def write(self, pending: Dict[int, Tuple[bytearray, bytearray]]):
+        # レコードを先に fsync してからインデックスを書く
+        # (インデックスにあるハンドは必ずセグメントにある)
+        for number in sorted(pending):
+            records, index = pending[number]
+            for ext, data in (("log", records), ("idx", index)):
+                with open(segment_path(self.directory, number, ext), "ab") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+            self.written += len(index) // INDEX_ENTRY.size
+
+    async def flush(self):
+        if self._flushing is not None:
+            await self._flushing
+        pending = self.take_pending()
+        if not pending:
+            return
+        loop = asyncio.get_event_loop()
+        self._flushing = loop.run_in_executor(self.executor, self.write, pending)
+        try:
+            await self._flushing
+        finally:
+            self._flushing = None
+
+    async def run_flusher(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("HandHistoryWriter: flush failed")
+
+    def close(self):
+        pending = self.take_pending()
+        if pending:
+            self.write(pending)
+        self.executor.shutdown(wait=True)
+
+
+class HandHistoryReader:
+    # セグメントを mmap して1ハンドずつ読む (ファイル全体は読み込まない)
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._index = None  # type: Optional[Dict[int, Tuple[int, int]]]
+
+    def segments(self) -> List[int]:
+        return list_segments(self.directory)
+
+    def _open(self, number: int):
+        path = segment_path(self.directory, number)
+        if os.path.getsize(path) == 0:
+            return None
+        with open(path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def records(self, number: int) -> Iterator[memoryview]:
+        # 渡す memoryview は次のレコードに進むまでしか使えない
+        m = self._open(number)
+        if m is None:
+            return
+        view = memoryview(m)
+        try:
+            pos, end = 0, len(m)
+            while pos + LENGTH.size <= end:
+                (n,) = LENGTH.unpack_from(view, pos)
+                if pos + LENGTH.size + n > end:
+                    # 書き込み途中で止まったレコード
+                    break
+                record = view[pos + LENGTH.size : pos + LENGTH.size + n]
+                try:
+                    yield record
+                finally:
+                    record.release()
+                pos += LENGTH.size + n
+        finally:
+            view.release()
+            m.close()
+
+    def __iter__(self) -> Iterator[dict]:
+        for number in self.segments():
+            for record in self.records(number):
+                yield decode_hand(record)
+
+    def index(self) -> Dict[int, Tuple[int, int]]:
+        # hand_id -> (セグメント番号, オフセット)
+        if self._index is None:
+            self._index = {}
+            for number in self.segments():
+                for hand_id, offset in read_index(self.directory, number):
+                    self._index[hand_id] = (number, offset)
+        return self._index
+
+    def get(self, hand_id: int) -> Optional[dict]:
+        location = self.index().get(hand_id)
+        if location is None:
+            return None
+        number, offset = location
+        m = self._open(number)
+        try:
+            (n,) = LENGTH.unpack_from(m, offset)
+            return decode_hand(m[offset + LENGTH.size : offset + LENGTH.size + n])
+        finally:
+            m.close()
+
+
+_writer = None  # type: Optional[HandHistoryWriter]
+
+
+def get_writer() -> Optional[HandHistoryWriter]:
+    return _writer
+
+
+def set_writer(writer: Optional[HandHistoryWriter]):
+    # main.py の --hand-log で設定する。None なら記録しない
+    global _writer
+    _writer = writer
@@ -0,0 +1,243 @@
+from __future__ import annotations
+from concurrent.futures import Executor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from texasholdem import Card, Deck
+from texasholdem.card import CARDS
+from texasholdem.batch_evaluator import evaluate_batch
+from texasholdem.equity import (
+    Equity,
+    CHUNK_TRIALS,
+    MIN_PLAYERS,
+    MAX_PLAYERS,
+    run_parallel,
+    tally,
+    to_codes,
+)
+
+import logging
+import re
+import time
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+RANK_CHARS = "23456789TJQKA"
+SUIT_CHARS = "shdc"  # BASE_SUIT と同じ並び
+
+# "AKs", "QQ+", "76s-54s", "A5o-A2o", "AsKh", 重み付きは "AKs:0.5"
+TOKEN = re.compile(
+    r"^(?P<hand>[2-9TJQKA]{2}[so]?|(?:[2-9TJQKA][shdc]){2})"
+    r"(?:(?P<plus>\+)|-(?P<end>[2-9TJQKA]{2}[so]?))?"
+    r"(?::(?P<weight>\d*\.?\d+))?$"
+)
+
+Combo = Tuple[int, int]
+
+
+class RangeParseError(ValueError):
+    pass
+
+
+def _rank(c: str) -> int:
+    return RANK_CHARS.index(c)
+
+
+def _class_combos(high: int, low: int, kind: str) -> List[Combo]:
+    # kind: "s" suited, "o" offsuit, "" both (ペアは "" のみ)
+    cards = [c.code for c in Deck().cards]
+    highs = [c for c in cards if c >> 2 == high]
+    lows = [c for c in cards if c >> 2 == low]
+    combos = set()
+    for a in highs:
+        for b in lows:
+            if a == b:
+                continue
+            suited = a & 3 == b & 3
+            if (kind == "s" and not suited) or (kind == "o" and suited):
+                continue
+            combos.add((min(a, b), max(a, b)))
+    return sorted(combos)
+
+
+def _expand(token: str) -> List[Combo]:
+    m = TOKEN.match(token)
+    if m is None:
+        raise RangeParseError("cannot parse range token: {!r}".format(token))
+    hand = m.group("hand")
+    if len(hand) == 4 and hand[1] in SUIT_CHARS:
+        if m.group("plus") or m.group("end"):
+            raise RangeParseError("specific combos cannot be extended: {!r}".format(token))
+        a = _rank(hand[0]) * 4 + SUIT_CHARS.index(hand[1])
+        b = _rank(hand[2]) * 4 + SUIT_CHARS.index(hand[3])
+        if a == b:
+            raise RangeParseError("duplicate card in {!r}".format(token))
+        return [(min(a, b), max(a, b))]
+
+    high, low, kind = _rank(hand[0]), _rank(hand[1]), hand[2:]
+    if high < low:
+        high, low = low, high
+    if high == low and kind:
+        raise RangeParseError("pairs cannot be suited or offsuit: {!r}".format(token))
+
+    classes = [(high, low)]
+    if m.group("plus"):
+        if high == low:
+            classes = [(r, r) for r in range(high, 13)]
+        else:
+            classes = [(high, r) for r in range(low, high)]
+    elif m.group("end"):
+        end = m.group("end")
+        end_high, end_low, end_kind = _rank(end[0]), _rank(end[1]), end[2:]
+        if end_high < end_low:
+            end_high, end_low = end_low, end_high
+        if end_kind != kind:
+            raise RangeParseError("mismatched suitedness in {!r}".format(token))
+        if high == low and end_high == end_low:
+            # "QQ-99"
+            classes = [(r, r) for r in range(min(high, end_high), max(high, end_high) + 1)]
+        elif high == end_high:
+            # "A5s-A2s"
+            classes = [(high, r) for r in range(min(low, end_low), max(low, end_low) + 1)]
+        elif high - low == end_high - end_low:
+            # "76s-54s"
+            gap = high - low
+            classes = [
+                (r, r - gap) for r in range(min(high, end_high), max(high, end_high) + 1)
+            ]
+        else:
+            raise RangeParseError("unsupported span: {!r}".format(token))
+    combos = []
+    for h, l in classes:
+        combos.extend(_class_combos(h, l, kind))
+    return combos
+
+
+class HandRange:
+    def __init__(self, weights: Dict[Combo, float] = None):
+        self.weights = dict(weights or {})  # type: Dict[Combo, float]
+
+    @classmethod
+    def parse(cls, text: str) -> HandRange:
+        weights = {}
+        for token in re.split(r"[,\s]+", text.strip()):
+            if not token:
+                continue
+            m = TOKEN.match(token)
+            weight = float(m.group("weight")) if m and m.group("weight") else 1.0
+            if not 0 <= weight <= 1:
+                raise RangeParseError("weight must be within 0..1: {!r}".format(token))
+            for combo in _expand(token):
+                weights[combo] = weight
+        return cls({c: w for c, w in weights.items() if w > 0})
+
+    @classmethod
+    def from_hand(cls, hand: Sequence[Card]) -> HandRange:
+        a, b = to_codes(hand)
+        return cls({(min(a, b), max(a, b)): 1.0})
+
+    def __len__(self):
+        return len(self.weights)
+
+    def remove_blockers(self, cards: Sequence[Card]) -> HandRange:
+        blocked = set(to_codes(cards))
+        return HandRange(
+            {c: w for c, w in self.weights.items() if c[0] not in blocked and c[1] not in blocked}
+        )
+
+    def combos(self) -> List[Tuple[Card, Card]]:
+        return [(CARDS[a], CARDS[b]) for a, b in self.weights]
+
+
+def _run_range_trials(ranges, board, dead, trials, deadline, seed):
+    # ワーカープロセスで実行される。ranges: [(combos (k, 2), probabilities (k,))]
+    # trials は試行回数 (棄却分を含む)、戻り値の done は採用された試行数
+    rng = np.random.default_rng(seed)
+    board = np.asarray(board, dtype=np.int32)
+    fixed = np.zeros(52, dtype=bool)
+    fixed[list(board) + list(dead)] = True
+    need = 5 - len(board)
+    attempts = done = 0
+    wins = np.zeros(len(ranges))
+    ties = np.zeros(len(ranges))
+    share = np.zeros(len(ranges))
+    while trials is None or attempts < trials:
+        # 締め切りを過ぎていても最低1チャンクは回す
+        if deadline is not None and attempts and time.time() >= deadline:
+            break
+        n = CHUNK_TRIALS if trials is None else min(CHUNK_TRIALS, trials - attempts)
+        attempts += n
+        hands = [np.asarray(combos)[rng.choice(len(combos), size=n, p=p)] for combos, p in ranges]
+        cards = np.concatenate(hands, axis=1)
+        # 同じカードを持つ組み合わせは棄却する
+        ordered = np.sort(cards, axis=1)
+        ok = (ordered[:, 1:] != ordered[:, :-1]).all(axis=1)
+        if not ok.any():
+            continue
+        hands = [h[ok] for h in hands]
+        cards = cards[ok]
+        keys = rng.random((len(cards), 52))
+        keys[:, fixed] = 2
+        np.put_along_axis(keys, cards, 2, axis=1)
+        runouts = np.argpartition(keys, need, axis=1)[:, :need].astype(np.int32)
+        boards = np.concatenate(
+            [np.broadcast_to(board, (len(runouts), len(board))), runouts], axis=1
+        )
+        strengths = np.stack(
+            [evaluate_batch(np.concatenate([hand, boards], axis=1)) for hand in hands]
+        )
+        w, t, s = tally(strengths)
+        wins += w
+        ties += t
+        share += s
+        done += len(cards)
+    return done, wins, ties, share
+
+
+def range_equity(
+    ranges: Sequence[HandRange],
+    board: Sequence[Card] = (),
+    dead: Sequence[Card] = (),
+    trials: Optional[int] = None,
+    time_budget: Optional[float] = None,
+    workers: Optional[int] = None,
+    seed: Optional[int] = None,
+    executor: Optional[Executor] = None,
+) -> List[Equity]:
+    """Equity of each range against the others by weighted random deals.
+
+    Combos blocked by the board or dead cards are removed first; deals where
+    two players hold the same card are rejected. For a hand against a range
+    pass ``HandRange.from_hand(hand)``.
+    """
+    if not MIN_PLAYERS <= len(ranges) <= MAX_PLAYERS:
+        raise ValueError(
+            "equity needs {}-{} ranges, got {}".format(MIN_PLAYERS, MAX_PLAYERS, len(ranges))
+        )
+    board_codes = to_codes(board)
+    dead_codes = to_codes(dead)
+    if len(board_codes) > 5:
+        raise ValueError("board cannot have more than 5 cards")
+    if len(set(board_codes + dead_codes)) != len(board_codes) + len(dead_codes):
+        raise ValueError("duplicate cards in board and dead cards")
+    args = []
+    for r in ranges:
+        r = r.remove_blockers(list(board) + list(dead))
+        if len(r) == 0:
+            raise ValueError("a range is empty after removing blocked combos")
+        combos = np.array(list(r.weights.keys()), dtype=np.int32)
+        weights = np.array(list(r.weights.values()))
+        args.append((combos, weights / weights.sum()))
+
+    done, wins, ties, share = run_parallel(
+        _run_range_trials,
+        (args, board_codes, dead_codes),
+        trials,
+        time_budget,
+        workers,
+        seed,
+        executor,
+    )
+    return [Equity(done, w, t, s) for w, t, s in zip(wins, ties, share)]
@@ -1,6 +1,8 @@
 from __future__ import annotations
 from typing import List
 from texasholdem import Card
+from texasholdem.evaluator import category_of, evaluate, evaluate5
+from functools import total_ordering
 
 import enum
 import logging
@@ -39,149 +41,64 @@ class RankName(enum.IntEnum):
         return self.name
 
 
+@total_ordering
 class HandRank:
     def __init__(self, cards: List[Card] = None):
         if len(cards) < 5:
             logger.error("not enough cards to decide handrank")
             return
         else:
-            rank = None
-            n = len(cards)
-            for i in range(2 ** n):
-                picked_cards = []
-                for j in range(n):
-                    if (i >> j) & 1:
-                        picked_cards.append(cards[j])
-                if len(picked_cards) != 5:
-                    continue
-                if rank is None:
-                    rank = HandRank5(picked_cards)
-                else:
-                    rank = (
-                        HandRank5(picked_cards)
-                        if HandRank5(picked_cards) > rank
-                        else rank
-                    )
-                self.rank = rank
+            self.strength = evaluate([c.code for c in cards])
+
+    @classmethod
+    def from_strength(cls, strength: int) -> HandRank:
+        hand_rank = cls.__new__(cls)
+        hand_rank.strength = strength
+        return hand_rank
+
+    @property
+    def rank_name(self) -> RankName:
+        return RankName(category_of(self.strength))
 
     def __eq__(self, other: HandRank):
         if not isinstance(other, HandRank):
             return NotImplemented
-        return self.rank == other.rank
+        return self.strength == other.strength
 
     def __lt__(self, other: HandRank):
         if not isinstance(other, HandRank):
             return NotImplemented
-        return self.rank < other.rank
+        return self.strength < other.strength
 
     def __str__(self) -> str:
-        return str(self.rank)
+        return str(self.rank_name)
 
     def toJSON(self):
-        return str(self.rank)
+        return str(self.rank_name)
 
 
+@total_ordering
 class HandRank5:
     def __init__(self, cards: List[Card] = None):
         if len(cards) != 5:
             logger.error("cannot initialize HandRank5 with other than 5 cards")
             return
         else:
-            self.rank_name, self.rank_number, self.kicker = self.get_rank(cards)
+            self.strength = evaluate5([c.code for c in cards])
 
-    def get_rank(self, cards: List[Card]):
-        if len(cards) != 5:
-            logger.error("cannot call get_rank with other than 5 cards")
-            raise Exception
-        number_count = [0 for c in range(15)]
-        suit_count = {}
-        isStraight = False
-        isFlush = False
-        rank_name = RankName.high_card
-        rank_number = []
-        kicker = []
-        for c in cards:
-            number_count[c.number] += 1
-            if c.number == 1:
-                number_count[14] += 1
-            if c.suit in suit_count:
-                suit_count[c.suit] += 1
-            else:
-                suit_count[c.suit] = 1
-        rank_name = RankName.high_card
-        # pair系hand判定
-        for i in range(2, 15):
-            if number_count[i] == 1:
-                kicker.insert(0, i)
-            elif number_count[i] == 2:
-                if rank_name == RankName.high_card:
-                    rank_name = RankName.one_pair
-                    rank_number.insert(0, i)
-                elif rank_name == RankName.one_pair:
-                    rank_name = RankName.two_pair
-                    rank_number.insert(0, i)
-                elif rank_name == RankName.three_of_a_kind:
-                    rank_name = RankName.full_house
-                    rank_number.append(i)
-            elif number_count[i] == 3:
-                if rank_name == RankName.high_card:
-                    rank_name = RankName.three_of_a_kind
-                    rank_number.insert(0, i)
-                elif rank_name == RankName.one_pair:
-                    rank_name = RankName.full_house
-                    rank_number.insert(0, i)
-            elif number_count[i] == 4:
-                rank_name = RankName.four_of_a_kind
-                rank_number.insert(0, i)
-        # Straight判定
-        for i in range(1, 11):
-            flag = True
-            for j in range(5):
-                if number_count[i + j] != 1:
-                    flag = False
-            if flag:
-                isStraight = True
-        # Flush判定
-        for i, v in suit_count.items():
-            if v == 5:
-                isFlush = True
-        # 役判定
-        if isStraight and isFlush:
-            rank_name = RankName.straight_flush
-        if isStraight and rank_name < RankName.straight:
-            rank_name = RankName.straight
-        if isFlush and rank_name < RankName.flush:
-            rank_name = RankName.flush
-        return (rank_name, rank_number, kicker)
+    @property
+    def rank_name(self) -> RankName:
+        return RankName(category_of(self.strength))
 
     def __eq__(self, other: HandRank5):
         if not isinstance(other, HandRank5):
             return NotImplemented
-        return (
-            self.rank_name == other.rank_name
-            and self.rank_number == other.rank_number
-            and self.kicker == other.kicker
-        )
+        return self.strength == other.strength
 
     def __lt__(self, other):
         if not isinstance(other, HandRank5):
             return NotImplemented
-        if self.rank_name < other.rank_name:
-            return True
-        elif self.rank_name > other.rank_name:
-            return False
-        else:
-            for i in range(len(self.rank_number)):
-                if self.rank_number[i] > other.rank_number[i]:
-                    return False
-                elif self.rank_number[i] < other.rank_number[i]:
-                    return True
-            for i in range(len(self.kicker)):
-                if self.kicker[i] > other.kicker[i]:
-                    return False
-                elif self.kicker[i] < other.kicker[i]:
-                    return True
-            return False
+        return self.strength < other.strength
 
     def __str__(self) -> str:
         return str(self.rank_name)
@@ -3,7 +3,24 @@ import logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-PLAYERS = {}  # type: dict[str, Player]
+DEFAULT_BANKROLL = 1000
+
+_repository = None
+
+
+def get_repository():
+    # 既定はメモリだけのリポジトリ (main.py の --player-db で SQLite に差し替える)
+    global _repository
+    if _repository is None:
+        from texasholdem.player_repository import PlayerRepository
+
+        _repository = PlayerRepository()
+    return _repository
+
+
+def set_repository(repository):
+    global _repository
+    _repository = repository
 
 
 class Player:
@@ -11,6 +28,12 @@ class Player:
         self.id = player_id
         self.name = name
         self.bankroll = bankroll
+        # 変更を書き戻す先 (リポジトリが読み込んだときに設定する)
+        self.repository = None
+        # ストアの行のキー (クライアントが名乗った名前。None なら保存しない) と、
+        # 最後に保存した (読み込んだ) バンクロール。ストアには差分だけを足す
+        self.key = None
+        self.saved = bankroll
 
     def __eq__(self, other):
         if not isinstance(other, Player):
@@ -32,20 +55,28 @@ class Player:
     def pay(self, amount: int):
         if self.bankroll >= amount:
             self.bankroll -= amount
+            self.changed()
             return True
         else:
             return False
 
+    def receive(self, amount: int):
+        self.bankroll += amount
+        self.changed()
+
+    def changed(self):
+        if self.repository is not None:
+            self.repository.mark_dirty(self)
+
     # 本当はnameはいらないけど生成しなきゃいけないので…。
+    # bankroll はリポジトリにもストアにもいなかったときの初期値
     @staticmethod
-    def get_player_by_id(player_id: str, player_name: str):
-        if player_id in PLAYERS:
-            return PLAYERS[player_id]
-        else:
-            return Player.generate_player(player_id, player_name)
+    def get_player_by_id(player_id: str, player_name: str, bankroll: int = None):
+        return get_repository().get(player_id, player_name, bankroll)
 
-    # 開発用メソッド。実際はDBに問い合わせたりする。
+    # リポジトリにもストアにもいないプレイヤーを作る
     @staticmethod
-    def generate_player(player_id: str, player_name: str):
-        PLAYERS[player_id] = Player(player_id, player_name, 1000)
-        return PLAYERS[player_id]
+    def generate_player(player_id: str, player_name: str, bankroll: int = None):
+        return Player(
+            player_id, player_name, DEFAULT_BANKROLL if bankroll is None else bankroll
+        )
@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from texasholdem.player import Player
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPACITY = 10000
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+# ストアの行はプレイヤーが名乗った名前をキーにする (client_id は接続ごとに振り直される)
+# 同じ名前のプレイヤーが別のシャードや別の接続にいても上書きし合わないよう、
+# 書くのはバンクロールの差分 (行がなければ今のバンクロールで作る)
+Row = Tuple[str, int, int]  # (key, bankroll, 前回の保存からの差分)
+
+
+class PlayerStore:
+    # 永続化先。load は1人分のバンクロール、save_many はまとめて1トランザクションで書く
+    def load(self, key: str) -> Optional[int]:
+        raise NotImplementedError
+
+    def save_many(self, rows: Iterable[Row]):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLitePlayerStore(PlayerStore):
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        # 書き込みは専用スレッドから来るのでロックで守る
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS bankrolls ("
+                "name TEXT PRIMARY KEY, bankroll INTEGER NOT NULL)"
+            )
+            self.conn.commit()
+        # 読み込みはイベントループのスレッドから別の接続で (WAL なので書き込みの
+        # トランザクション中でも待たない)。:memory: は接続ごとに別のデータベースに
+        # なるので、書き込み用の接続をロックして使う
+        self.reader = None
+        if path != ":memory:":
+            self.reader = sqlite3.connect(path)
+            self.reader.execute("PRAGMA query_only=ON")
+
+    def load(self, key: str) -> Optional[int]:
+        query = "SELECT bankroll FROM bankrolls WHERE name = ?"
+        if self.reader is not None:
+            row = self.reader.execute(query, (key,)).fetchone()
+        else:
+            with self.lock:
+                row = self.conn.execute(query, (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def save_many(self, rows: Iterable[Row]):
+        with self.lock:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT INTO bankrolls (name, bankroll) VALUES (?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET bankroll = bankroll + ?",
+                    list(rows),
+                )
+
+    def close(self):
+        if self.reader is not None:
+            self.reader.close()
+        with self.lock:
+            self.conn.close()
+
+
+class PlayerRepository:
+    # LRU で最近のプレイヤーだけを保持し、変更はまとめて裏で書き戻す (write-behind)
+    # LRU から外れてもテーブルに座っている間は weakref で同じインスタンスを返す
+    # インスタンスは client_id で引き、ストアの行は名前で引く (名前がなければ保存しない)
+    # store が None ならメモリだけ (全員を保持し続ける)
+    # 名前に認証はないので、同じ名前の行を使えるのは1つの client_id だけにする
+    # active(client_id): その client_id がまだ接続中 (セッションを再開できる) か
+    def __init__(
+        self,
+        store: Optional[PlayerStore] = None,
+        capacity: int = DEFAULT_CAPACITY,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        active: Callable[[object], bool] = None,
+    ):
+        self.store = store
+        self.capacity = capacity if store is not None else None
+        self.flush_interval = flush_interval
+        self.cache = OrderedDict()  # type: OrderedDict[object, Player]
+        self.live = weakref.WeakValueDictionary()  # type: weakref.WeakValueDictionary
+        self.dirty = {}  # type: Dict[object, Player]
+        self.active = active
+        # 名前 -> その行を使っているプレイヤー (いなくなれば消える)
+        self.owners = weakref.WeakValueDictionary()  # type: weakref.WeakValueDictionary
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.flushed = 0
+        self._flushing = None
+
+    def __len__(self):
+        return len(self.cache)
+
+    def get(self, player_id, player_name: str = None, bankroll: int = None) -> Player:
+        player = self.cache.get(player_id)
+        if player is not None:
+            self.cache.move_to_end(player_id)
+            return player
+        player = self.live.get(player_id)
+        if player is None:
+            key = player_name if self.store is not None and player_name else None
+            if key is not None and not self._available(key, player_id):
+                logger.warning(
+                    "PlayerRepository: {!r} is in use, {} plays unsaved".format(key, player_id)
+                )
+                key = None
+            stored = self.store.load(key) if key is not None else None
+            if stored is not None:
+                player = Player(player_id, player_name, stored)
+            else:
+                player = Player.generate_player(player_id, player_name, bankroll)
+            player.key = key
+            if key is not None:
+                self.owners[key] = player
+            player.repository = self
+            if stored is None:
+                self.mark_dirty(player)
+            self.live[player_id] = player
+        self._remember(player)
+        return player
+
+    def _available(self, key: str, player_id) -> bool:
+        owner = self.owners.get(key)
+        return (
+            owner is None
+            or owner.id == player_id
+            or (self.active is not None and not self.active(owner.id))
+        )
+
+    def _remember(self, player: Player):
+        self.cache[player.id] = player
+        self.cache.move_to_end(player.id)
+        while self.capacity is not None and len(self.cache) > self.capacity:
+            self.cache.popitem(last=False)
+
+    def mark_dirty(self, player: Player):
+        if self.store is not None and player.key is not None:
+            self.dirty[player.id] = player
+
+    def take_dirty(self):
+        # 書き込む内容はここで固定する (書き込み中の変更は次の回に回る)
+        players, self.dirty = self.dirty, {}
+        rows = [(p.key, p.bankroll, p.bankroll - p.saved) for p in players.values()]
+        return players, rows
+
+    def mark_saved(self, players: Dict[object, Player], rows):
+        for player, (_, bankroll, _) in zip(players.values(), rows):
+            player.saved = bankroll
+
+    async def flush(self):
+        if self._flushing is not None:
+            await self._flushing
+        players, rows = self.take_dirty()
+        if not rows:
+            return
+        loop = asyncio.get_event_loop()
+        self._flushing = loop.run_in_executor(self.executor, self.store.save_many, rows)
+        try:
+            await self._flushing
+            self.mark_saved(players, rows)
+            self.flushed += len(rows)
+        except Exception:
+            # 書けなかった分は次の回にもう一度
+            for player_id, player in players.items():
+                self.dirty.setdefault(player_id, player)
+            raise
+        finally:
+            self._flushing = None
+
+    async def run_flusher(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("PlayerRepository: flush failed")
+
+    def close(self):
+        # 終了時に残りを同期で書く
+        players, rows = self.take_dirty()
+        if rows:
+            self.store.save_many(rows)
+            self.mark_saved(players, rows)
+        self.executor.shutdown(wait=True)
+        if self.store is not None:
+            self.store.close()
@@ -0,0 +1,221 @@
+"""Precomputed preflop equities for the 169 starting-hand classes.
+
+The table lives in data/preflop_equity.bin and is memory-mapped on first
+access. Layout (little-endian):
+
+    header    magic "HPEQ", version u16, classes u16, max opponents u16,
+              reserved u16, heads-up trials u32, multiway trials u32
+                                                                 (20 bytes)
+    multiway  f32[169][8]   equity against 1..8 random hands
+    heads-up  f32[169][169] equity of class a against class b
+
+Class index is row * 13 + col on the usual 13x13 grid (row/col 0 = ace):
+pairs on the diagonal, suited hands above it, offsuit hands below it.
+Equity against random hands does not depend on the suits, so every one of
+the 1326 combos maps to its class through COMBO_CLASS.
+
+Each entry is sampled with the trial counts in the header; the shipped table
+uses 100000 heads-up and 200000 multiway trials (standard error about 0.16%
+and 0.11%, no worse than the Monte Carlo default it stands in for).
+
+Regenerate with ``python -m texasholdem.preflop [heads-up trials] [multiway trials]``.
+"""
+from __future__ import annotations
+from itertools import combinations
+from typing import List, Sequence
+
+from texasholdem import Card
+from texasholdem.evaluator import RANKS
+
+import logging
+import mmap
+import os
+import struct
+import sys
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+PATH = os.path.join(os.path.dirname(__file__), "data", "preflop_equity.bin")
+MAGIC = b"HPEQ"
+VERSION = 2
+CLASSES = RANKS * RANKS
+MAX_OPPONENTS = 8
+HEADER = struct.Struct("<4sHHHHII")
+HEADS_UP_TRIALS = 100000
+MULTIWAY_TRIALS = 200000
+MULTIWAY_OFFSET = HEADER.size
+HEADS_UP_OFFSET = MULTIWAY_OFFSET + CLASSES * MAX_OPPONENTS * 4
+FILE_SIZE = HEADS_UP_OFFSET + CLASSES * CLASSES * 4
+FLOAT = struct.Struct("<f")
+
+RANK_CHARS = "23456789TJQKA"
+
+_mm = None
+
+
+def code_class(a: int, b: int) -> int:
+    row, col = 12 - (a >> 2), 12 - (b >> 2)
+    if row > col:
+        row, col = col, row
+    if a & 3 != b & 3:
+        row, col = col, row
+    return row * RANKS + col
+
+
+COMBOS = list(combinations(range(52), 2))
+COMBO_CLASS = [code_class(a, b) for a, b in COMBOS]
+
+
+def hand_class(hand: Sequence[Card]) -> int:
+    a, b = hand
+    return code_class(a.code, b.code)
+
+
+def class_name(index: int) -> str:
+    row, col = divmod(index, RANKS)
+    high, low = RANK_CHARS[12 - min(row, col)], RANK_CHARS[12 - max(row, col)]
+    if row == col:
+        return high + low
+    return high + low + ("s" if row < col else "o")
+
+
+def class_combos(index: int) -> List[tuple]:
+    return [combo for combo, c in zip(COMBOS, COMBO_CLASS) if c == index]
+
+
+def _table() -> mmap.mmap:
+    global _mm
+    if _mm is None:
+        with open(PATH, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, classes, max_opponents, _, heads_up, multiway = HEADER.unpack_from(mm)
+        if (magic, version, classes, max_opponents) != (MAGIC, VERSION, CLASSES, MAX_OPPONENTS):
+            mm.close()
+            raise ValueError("unexpected preflop equity table format: {}".format(PATH))
+        if len(mm) != FILE_SIZE:
+            mm.close()
+            raise ValueError("truncated preflop equity table: {}".format(PATH))
+        logger.debug(
+            "preflop equity table mapped ({} heads-up / {} multiway trials per entry)".format(
+                heads_up, multiway
+            )
+        )
+        _mm = mm
+    return _mm
+
+
+def preflop_equity(hand: Sequence[Card], opponents: int = 1) -> float:
+    """Equity of a starting hand against ``opponents`` random hands."""
+    if not 1 <= opponents <= MAX_OPPONENTS:
+        raise ValueError("opponents must be 1..{}".format(MAX_OPPONENTS))
+    offset = MULTIWAY_OFFSET + (hand_class(hand) * MAX_OPPONENTS + opponents - 1) * 4
+    return FLOAT.unpack_from(_table(), offset)[0]
+
+
+def preflop_equity_vs(hand: Sequence[Card], villain: Sequence[Card]) -> float:
+    """Heads-up equity of one starting-hand class against another."""
+    offset = HEADS_UP_OFFSET + (hand_class(hand) * CLASSES + hand_class(villain)) * 4
+    return FLOAT.unpack_from(_table(), offset)[0]
+
+
+# 以下、テーブル生成用 (numpy が必要)
+
+
+def _sample_equity(hero: int, villain, opponents: int, trials: int, rng) -> float:
+    import numpy as np
+    from texasholdem.batch_evaluator import evaluate_batch
+    from texasholdem.equity import tally
+
+    hero_combos = np.array(class_combos(hero), dtype=np.int32)
+    hands = [hero_combos[rng.integers(len(hero_combos), size=trials)]]
+    if villain is not None:
+        villain_combos = np.array(class_combos(villain), dtype=np.int32)
+        picks = villain_combos[rng.integers(len(villain_combos), size=trials)]
+        # カードが被った組み合わせは捨てる
+        ok = ~(picks[:, :, None] == hands[0][:, None, :]).any(axis=(1, 2))
+        hands = [hands[0][ok], picks[ok]]
+    n = len(hands[0])
+    keys = rng.random((n, 52))
+    rows = np.arange(n)
+    for hand in hands:
+        keys[rows, hand[:, 0]] = 2
+        keys[rows, hand[:, 1]] = 2
+    need = 5 + 2 * (opponents if villain is None else 0)
+    picked = np.argpartition(keys, need, axis=1)[:, :need]
+    # 選ばれたカードをキー順に並べ、ボードと各プレイヤーへの割り当てを一様にする
+    picked = np.take_along_axis(
+        picked, np.argsort(np.take_along_axis(keys, picked, axis=1), axis=1), axis=1
+    )
+    boards = picked[:, :5]
+    for k in range(need // 2 - 2):
+        hands.append(picked[:, 5 + 2 * k:7 + 2 * k])
+    strengths = np.stack(
+        [evaluate_batch(np.concatenate([hand, boards], axis=1)) for hand in hands]
+    )
+    return float(tally(strengths)[2][0]) / n
+
+
+def _generate_row(hero: int, heads_up_trials: int, multiway_trials: int, seed):
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    multiway = [
+        _sample_equity(hero, None, k, multiway_trials, rng)
+        for k in range(1, MAX_OPPONENTS + 1)
+    ]
+    heads_up = {
+        villain: _sample_equity(hero, villain, 1, heads_up_trials, rng)
+        for villain in range(hero + 1, CLASSES)
+    }
+    return multiway, heads_up
+
+
+def generate(
+    heads_up_trials: int = HEADS_UP_TRIALS,
+    multiway_trials: int = MULTIWAY_TRIALS,
+    path: str = PATH,
+    seed: int = 0,
+    workers: int = None,
+):
+    import numpy as np
+    from concurrent.futures import ProcessPoolExecutor
+
+    seeds = np.random.SeedSequence(seed).spawn(CLASSES)
+    multiway = [[0.0] * MAX_OPPONENTS for _ in range(CLASSES)]
+    heads_up = [[0.5] * CLASSES for _ in range(CLASSES)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        rows = pool.map(
+            _generate_row,
+            range(CLASSES),
+            [heads_up_trials] * CLASSES,
+            [multiway_trials] * CLASSES,
+            seeds,
+        )
+        for hero, (mw, hu) in enumerate(rows):
+            logger.debug("generated preflop equity for {}".format(class_name(hero)))
+            multiway[hero] = mw
+            for villain, equity in hu.items():
+                heads_up[hero][villain] = equity
+                heads_up[villain][hero] = 1 - equity
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(
+            HEADER.pack(
+                MAGIC, VERSION, CLASSES, MAX_OPPONENTS, 0, heads_up_trials, multiway_trials
+            )
+        )
+        for row in multiway:
+            f.write(struct.pack("<{}f".format(MAX_OPPONENTS), *row))
+        for row in heads_up:
+            f.write(struct.pack("<{}f".format(CLASSES), *row))
+    os.replace(tmp_path, path)
+
+
+if __name__ == "__main__":
+    logging.getLogger().setLevel(logging.INFO)
+    args = [int(a) for a in sys.argv[1:3]]
+    generate(*args)
+    logger.info("AA vs 1: {}".format(preflop_equity([Card(1, "S"), Card(1, "H")])))
@@ -3,5 +3,7 @@ from texasholdem.states.concrete_state import ConcreteState
 
 from texasholdem.states.context import Context
 from texasholdem.states.table_context import TableContext
+from texasholdem.states.table_actor import TableActor
+from texasholdem.states.table_manager import TableManager, DEFAULT_TABLE_ID
 
 from texasholdem.states.street_state import StreetState
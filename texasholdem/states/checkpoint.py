@@ -0,0 +1,276 @@
+import asyncio
+import binascii
+import logging
+import os
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from texasholdem import Player, Table
+from texasholdem.card import CARDS
+from texasholdem.equity import Equity
+from texasholdem.hand_history import HandRecorder, get_writer
+from texasholdem.hand_rank import HandRank
+from texasholdem.player import get_repository
+from texasholdem.states import TableContext
+from texasholdem.table import GamingPlayer
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# テーブルのチェックポイント: 1テーブル = 1ファイル (table-<table_id の hex>.ckpt)
+# 中身はクラスを含まない値だけの dict を pickle したもの (カードはコードの bytes)
+VERSION = 1
+DEFAULT_INTERVAL = 30.0
+PREFIX = "table-"
+SUFFIX = ".ckpt"
+CAPTURE_TIMEOUT = 5.0
+RESTORE_THREADS = 8
+
+
+def write_atomic(path: str, data: bytes):
+    # 書きかけのファイルが残らないよう、一時ファイルに書いて fsync してから置き換える
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def table_file(directory: str, table_id) -> str:
+    return os.path.join(
+        directory, PREFIX + binascii.hexlify(str(table_id).encode("utf-8")).decode() + SUFFIX
+    )
+
+
+def table_id_of(filename: str) -> Optional[str]:
+    if not (filename.startswith(PREFIX) and filename.endswith(SUFFIX)):
+        return None
+    try:
+        return binascii.unhexlify(filename[len(PREFIX) : -len(SUFFIX)]).decode("utf-8")
+    except (binascii.Error, UnicodeDecodeError):
+        return None
+
+
+def _codes(cards) -> bytes:
+    return bytes(c.code for c in cards)
+
+
+def _cards(codes: bytes) -> list:
+    return [CARDS[c] for c in codes]
+
+
+def dump_table(table_context: TableContext) -> bytes:
+    # メッセージの処理の合間 (handling == 0) に呼ぶ
+    table = table_context.get_table()
+    seats = []
+    for p in table.player_seating_chart:
+        if p is None:
+            seats.append(None)
+            continue
+        seats.append(
+            (
+                p.player.id,
+                p.player.name,
+                p.player.bankroll,
+                _codes(p.hand),
+                p.hand_rank.strength if p.hand_rank is not None else None,
+                p.betting,
+                p.ongoing,
+                p.played,
+                p.is_showdown,
+            )
+        )
+    recorder = table.recorder
+    return pickle.dumps(
+        {
+            "version": VERSION,
+            "table_id": table.id,
+            "players_limit": table.players_limit,
+            "stakes": dict(table.stakes),
+            "status": table.status,
+            "button_player": table.button_player,
+            "current_player": table.current_player,
+            "current_betting_amount": table.current_betting_amount,
+            "current_pot_size": table.current_pot_size,
+            "board": _codes(table.board),
+            "deck": (_codes(table.deck.cards), table.deck.cursor, table.deck.seed),
+            "rng": table.rng.getstate(),
+            "equity": None
+            if table.equity is None
+            else [None if e is None else (e.trials, e.wins, e.ties, e.share) for e in table.equity],
+            "seats": seats,
+            "state": type(table_context.state).__name__,
+            "seq": table_context.seq,
+            "recorder": None if recorder is None else (recorder.started, bytes(recorder.events)),
+        },
+        protocol=pickle.HIGHEST_PROTOCOL,
+    )
+
+
+def load_table(data: dict) -> TableContext:
+    # プレイヤーはリポジトリから引くので、イベントループのスレッドで呼ぶ
+    from texasholdem.states import street_state
+
+    if data.get("version") != VERSION:
+        raise ValueError("unsupported checkpoint version {}".format(data.get("version")))
+    table = Table(players_limit=data["players_limit"], table_id=data["table_id"])
+    table.stakes = data["stakes"]
+    table.status = data["status"]
+    table.button_player = data["button_player"]
+    table.current_player = data["current_player"]
+    table.current_betting_amount = data["current_betting_amount"]
+    table.current_pot_size = data["current_pot_size"]
+    table.board = _cards(data["board"])
+    cards, cursor, seed = data["deck"]
+    table.deck.cards = _cards(cards)
+    table.deck.cursor = cursor
+    table.deck.seed = seed
+    table.rng.setstate(data["rng"])
+    if data["equity"] is not None:
+        table.equity = [None if e is None else Equity(*e) for e in data["equity"]]
+    for i, seat in enumerate(data["seats"]):
+        if seat is None:
+            continue
+        player_id, name, bankroll, hand, strength, betting, ongoing, played, is_showdown = seat
+        # バンクロールはポットと同じ時点 (チェックポイント) の値に戻す
+        # ストアの方が新しければ差分で書き戻すので、ストアもその時点に揃う
+        player = Player.get_player_by_id(player_id, name, bankroll)
+        if player.bankroll != bankroll:
+            player.bankroll = bankroll
+            player.changed()
+        p = GamingPlayer(player)
+        p.hand = _cards(hand)
+        p.hand_rank = HandRank.from_strength(strength) if strength is not None else None
+        p.betting = betting
+        p.ongoing = ongoing
+        p.played = played
+        p.is_showdown = is_showdown
+        table.player_seating_chart[i] = p
+        table.player_num += 1
+    if data["recorder"] is not None and get_writer() is not None:
+        table.recorder = HandRecorder.restore(table.id, *data["recorder"])
+    table_context = TableContext(getattr(street_state, data["state"])(), table)
+    table_context.seq = data["seq"]
+    return table_context
+
+
+class TableCheckpointer:
+    # interval 秒ごとに全テーブルのチェックポイントを取り、変わったものだけ書く
+    # owns: このプロセスが持つテーブルか (シャード構成ではディレクトリを共有する)
+    def __init__(
+        self,
+        directory: str,
+        interval: float = DEFAULT_INTERVAL,
+        owns: Callable[[str], bool] = None,
+    ):
+        self.directory = directory
+        self.interval = interval
+        self.owns = owns if owns is not None else (lambda table_id: True)
+        os.makedirs(directory, exist_ok=True)
+        # 最後に書いた内容 (変わっていないテーブルは書かない)
+        self.last = {}  # type: Dict[str, bytes]
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.saved = 0
+
+    def stored(self) -> List[str]:
+        table_ids = []
+        for name in os.listdir(self.directory):
+            table_id = table_id_of(name)
+            if table_id is not None and self.owns(table_id):
+                table_ids.append(table_id)
+        return table_ids
+
+    async def capture(self, table_context: TableContext, actor) -> Optional[bytes]:
+        if not table_context.handling:
+            return dump_table(table_context)
+        # 状態遷移の途中 (await 中) なので、受信箱の順番で処理の合間に取る
+        future = asyncio.get_event_loop().create_future()
+
+        async def take():
+            if not future.done():
+                future.set_result(dump_table(table_context))
+
+        if actor is None or not actor.submit_call(take):
+            return None
+        try:
+            return await asyncio.wait_for(future, CAPTURE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.debug("TableCheckpointer: table {} is busy".format(table_context.table.id))
+            return None
+
+    def write(self, changed: Dict[str, bytes], stale: List[str]):
+        for table_id, data in changed.items():
+            write_atomic(table_file(self.directory, table_id), data)
+        for table_id in stale:
+            try:
+                os.remove(table_file(self.directory, table_id))
+            except FileNotFoundError:
+                pass
+        self.saved += len(changed)
+
+    async def checkpoint_all(self, table_manager) -> int:
+        table_ids = list(table_manager.tables)
+        captured = await asyncio.gather(
+            *[
+                self.capture(table_manager.get(table_id), table_manager.get_actor(table_id))
+                for table_id in table_ids
+            ]
+        )
+        changed = {
+            table_id: data
+            for table_id, data in zip(table_ids, captured)
+            if data is not None and self.last.get(table_id) != data
+        }
+        # 取った時点までのバンクロールをストアにも書いておく
+        await get_repository().flush()
+        # 捨てられたテーブルのファイルは消す
+        stale = [table_id for table_id in self.last if table_id not in table_manager]
+        if changed or stale:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(self.executor, self.write, changed, stale)
+        self.last.update(changed)
+        for table_id in stale:
+            self.last.pop(table_id, None)
+        return len(changed)
+
+    async def run(self, table_manager):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.checkpoint_all(table_manager)
+            except Exception:
+                logger.exception("TableCheckpointer: checkpoint failed")
+
+    def read(self, table_id: str) -> Optional[dict]:
+        try:
+            with open(table_file(self.directory, table_id), "rb") as f:
+                return pickle.loads(f.read())
+        except Exception:
+            logger.exception("TableCheckpointer: failed to read table {}".format(table_id))
+            return None
+
+    async def restore_all(self, table_manager) -> List[str]:
+        # 読み込みと unpickle はスレッドでまとめて、テーブルの組み立てはループのスレッドで
+        table_ids = [table_id for table_id in self.stored() if table_id not in table_manager]
+        loop = asyncio.get_event_loop()
+        with ThreadPoolExecutor(max_workers=RESTORE_THREADS) as readers:
+            loaded = await asyncio.gather(
+                *[loop.run_in_executor(readers, self.read, table_id) for table_id in table_ids]
+            )
+        restored = []
+        for table_id, data in zip(table_ids, loaded):
+            if data is None:
+                continue
+            try:
+                table_manager.add(load_table(data))
+            except Exception:
+                logger.exception("TableCheckpointer: failed to restore table {}".format(table_id))
+                continue
+            restored.append(table_id)
+        logger.debug("TableCheckpointer: restored {} tables".format(len(restored)))
+        return restored
+
+    def close(self):
+        self.executor.shutdown(wait=True)
@@ -1,8 +1,10 @@
+import asyncio
 import logging
-import random
 from texasholdem.states import TableContext, ConcreteState
-from texasholdem import Player, Table, Deck
-from websock import notify
+from texasholdem import Player, Table
+from texasholdem.hand_history import HandRecorder, get_writer
+from websock import notify, encode, join_fields, join_list
+from websock.serializer import encode_private
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -20,6 +22,11 @@ class GameState(ConcreteState):
             # 目的のアクションがない場合
             pass
 
+    def record_action(self, table: Table, seat: int, action: str):
+        # 手番が進んだ (アクションが通った) ときだけハンド履歴に残す
+        if table.recorder is not None and table.current_player != seat:
+            table.recorder.action(seat, action, table.player_seating_chart[seat].betting)
+
     def get_action_player(self, msg: dict):
         logger.debug("get_action_player called")
         player_id = msg["client_id"]
@@ -27,33 +34,118 @@ class GameState(ConcreteState):
         return Player.get_player_by_id(player_id, player_name)
 
     async def notify_current_status(self, table_context: TableContext):
+        # 新しいクライアントにはスナップショット、それ以外には前回からの差分を送る
         logger.debug("lets notify!")
         table = table_context.get_table()
-        unicast_msg = {}
+        fields = {
+            "state": encode(table.status),
+            "button_player": encode(table.button_player),
+            "current_player": encode(table.current_player),
+            "board": encode(table.board),
+            "pot_size": encode(table.current_pot_size),
+            "equity": encode(table.equity),
+            "table_id": encode(table.id),
+        }
+        seats = [encode(p) for p in table.player_seating_chart]
+        private = {}
         for p in table.player_seating_chart:
             if p is not None:
-                unicast_msg[p.player.id] = {
-                    "state": table.status,
-                    "hand": p.hand,
-                    "hand_rank": p.hand_rank,
-                    "seating_chart": table.player_seating_chart,
-                    "button_player": table.button_player,
-                    "current_player": table.current_player,
-                    "board": table.board,
-                    "pot_size": table.current_pot_size,
-                }
-        broadcast_msg = {
-            "state": table.status,
-            "seating_chart": table.player_seating_chart,
-            "button_player": table.button_player,
-            "current_player": table.current_player,
-            "board": table.board,
-            "pot_size": table.current_pot_size,
+                private[p.player.id] = encode_private(p)
+
+        # 値はエンコード済みの文字列のまま比べる
+        changed = {k: v for k, v in fields.items() if table_context.sent_fields.get(k) != v}
+        changed_seats = {}
+        if len(seats) == len(table_context.sent_seats):
+            for i, seat in enumerate(seats):
+                if table_context.sent_seats[i] != seat:
+                    changed_seats[str(i)] = seat
+        else:
+            changed["seating_chart"] = join_list(seats)
+        changed_private = {
+            player_id: v
+            for player_id, v in private.items()
+            if table_context.sent_private.get(player_id) != v
+        }
+        delta = None
+        if changed or changed_seats or changed_private:
+            table_context.seq += 1
+            header = {
+                "type": encode("delta"),
+                "table_id": fields["table_id"],
+                "seq": encode(table_context.seq),
+            }
+            header.update(changed)
+            if changed_seats:
+                header["seats"] = join_fields(changed_seats)
+            delta = join_fields(header)
+            # 再接続したクライアントに取りこぼした分だけ送り直せるよう残しておく
+            table_context.history.append((table_context.seq, delta, changed_private))
+        table_context.sent_fields = fields
+        table_context.sent_seats = seats
+        table_context.sent_private = private
+
+        synced = table_context.synced & table_context.clients
+        fresh = table_context.clients - synced - table_context.resuming.keys()
+        table_context.synced = synced
+        if fresh:
+            await self.send_snapshot(table_context, fresh)
+        if synced and delta is not None:
+            unicast_msg = {k: v for k, v in changed_private.items() if k in synced}
+            await notify(unicast_msg, delta, synced)
+
+    async def send_snapshot(self, table_context: TableContext, client_ids: set):
+        # 最後に通知した内容をまるごと送る。受け取ったクライアントは以後差分を受け取る
+        if not table_context.sent_fields:
+            await self.notify_current_status(table_context)
+            return
+        snapshot = {
+            "type": encode("snapshot"),
+            "table_id": table_context.sent_fields["table_id"],
+            "seq": encode(table_context.seq),
         }
-        await notify(unicast_msg, broadcast_msg)
+        snapshot.update(table_context.sent_fields)
+        snapshot["seating_chart"] = join_list(table_context.sent_seats)
+        unicast_msg = {
+            k: v for k, v in table_context.sent_private.items() if k in client_ids
+        }
+        table_context.synced = table_context.synced | client_ids
+        await notify(unicast_msg, join_fields(snapshot), client_ids)
+
+    async def action_resync(self, table_context: TableContext, msg: dict):
+        # 差分を取りこぼした (seq が飛んだ) クライアントが要求する
+        await self.send_snapshot(table_context, {msg["client_id"]})
+
+    async def action_replay(self, table_context: TableContext, msg: dict):
+        # セッションを再開したクライアントに seq より後の差分だけを送る
+        # 履歴に残っていなければスナップショット
+        client_id = msg["client_id"]
+        synced = table_context.release(client_id) or client_id in table_context.synced
+        events = table_context.events_since(msg.get("seq"))
+        if events is None or not synced:
+            await self.send_snapshot(table_context, {client_id})
+            return
+        for seq, delta, changed_private in events:
+            unicast_msg = {}
+            if client_id in changed_private:
+                unicast_msg[client_id] = changed_private[client_id]
+            await notify(unicast_msg, delta, {client_id})
+        table_context.synced = table_context.synced | {client_id}
+
+    def record_board(self, table: Table):
+        if table.recorder is not None:
+            table.recorder.board(table.board)
+
+    async def update_equity(self, table: Table):
+        # オールイン時はランアウトを全列挙して勝率を出す (イベントループを止めない)
+        if table.is_all_in():
+            loop = asyncio.get_event_loop()
+            table.equity = await loop.run_in_executor(None, table.calc_equity)
 
     async def action_reset(self, table_context: TableContext, msg: dict):
-        await table_context.set_table(Table(players_limit=6))
+        table = table_context.get_table()
+        await table_context.set_table(
+            Table(players_limit=table.players_limit, table_id=table.id)
+        )
         await table_context.set_state(BeforeGameState())
 
 
@@ -69,7 +161,9 @@ class StreetState(GameState):
         action_player = self.get_action_player(msg)
         if table.is_current_player(action_player):
             logger.debug("[ACTION] CALL")
+            seat = table.current_player
             table.call()
+            self.record_action(table, seat, msg["action"])
             await table_context.set_table(table)
 
     async def action_raise(self, table_context: TableContext, msg: dict):
@@ -77,7 +171,9 @@ class StreetState(GameState):
         action_player = self.get_action_player(msg)
         if table.is_current_player(action_player):
             logger.debug("[ACTION] RAISE: {}".format(msg["amount"]))
+            seat = table.current_player
             table.action_raise(msg["amount"])
+            self.record_action(table, seat, msg["action"])
             await table_context.set_table(table)
 
     async def action_fold(self, table_context: TableContext, msg: dict):
@@ -85,7 +181,9 @@ class StreetState(GameState):
         action_player = self.get_action_player(msg)
         if table.is_current_player(action_player):
             logger.debug("[ACTION] FOLD")
+            seat = table.current_player
             table.fold()
+            self.record_action(table, seat, "fold")
             await table_context.set_table(table)
 
 
@@ -113,33 +211,41 @@ class BeforeGameState(GameState):
         table = table_context.get_table()
         logger.debug("state: {}".format("Determining next button player..."))
         if table.current_player == -1:
-            table.current_player = random.randint(0, table.players_limit - 1)
+            table.current_player = table.rng.randint(0, table.players_limit - 1)
         else:
             table.current_player = table.button_player
         table.next_player()
         table.button_player = table.current_player
+        table.recorder = HandRecorder(table) if get_writer() is not None else None
         logger.debug("state: {}".format("Betting blinds..."))
         if table.player_num == 2:
-            table.bet(table.stakes["SB"])
+            self.post_blind(table, "SB")
             table.next_player()
-            table.bet(table.stakes["BB"])
+            self.post_blind(table, "BB")
             table.current_player = table.button_player
         else:
             table.next_player()
-            table.bet(table.stakes["SB"])
+            self.post_blind(table, "SB")
             table.next_player()
-            table.bet(table.stakes["BB"])
+            self.post_blind(table, "BB")
             table.next_player()
         logger.debug("state: {}".format("Dealing hands..."))
         table.status = "dealingHands"
-        table.deck = Deck()
+        table.deck.reset()
         table.deck.shuffle()
-        for p in table.player_seating_chart:
+        logger.debug("state: deck shuffled (seed={})".format(table.deck.seed))
+        for i, p in enumerate(table.player_seating_chart):
             if p is not None:
-                p.hand = table.deck.draw(2).cards
+                p.hand = table.deck.draw(2)
+                if table.recorder is not None:
+                    table.recorder.hole(i, p.hand)
         table.status = "preflop"
         await table_context.set_state(PreflopStreetState())
 
+    def post_blind(self, table: Table, blind: str):
+        if table.bet(table.stakes[blind]) and table.recorder is not None:
+            table.recorder.post(table.current_player, table.stakes[blind])
+
     async def next_round(self, table_context: TableContext):
         pass
 
@@ -153,8 +259,10 @@ class PreflopStreetState(StreetState):
         table = table_context.get_table()
         table.next_round_initialize()
         if table.ongoing_players_count() > 1:
-            table.board.extend(table.deck.draw(3).cards)
+            table.board.extend(table.deck.draw(3))
+            self.record_board(table)
             table.update_hand_rank()
+            await self.update_equity(table)
         table.status = "flop"
         await table_context.set_state(FlopStreetState())
 
@@ -168,8 +276,10 @@ class FlopStreetState(StreetState):
         table = table_context.get_table()
         table.next_round_initialize()
         if table.ongoing_players_count() > 1:
-            table.board.extend(table.deck.draw(1).cards)
+            table.board.extend(table.deck.draw(1))
+            self.record_board(table)
             table.update_hand_rank()
+            await self.update_equity(table)
         table.status = "turn"
         await table_context.set_state(TurnStreetState())
 
@@ -183,8 +293,10 @@ class TurnStreetState(StreetState):
         table = table_context.get_table()
         table.next_round_initialize()
         if table.ongoing_players_count() > 1:
-            table.board.extend(table.deck.draw(1).cards)
+            table.board.extend(table.deck.draw(1))
+            self.record_board(table)
             table.update_hand_rank()
+            await self.update_equity(table)
         table.status = "river"
         await table_context.set_state(RiverStreetState())
 
@@ -211,7 +323,9 @@ class ShowdownState(GameState):
         action_player = self.get_action_player(msg)
         if table.is_current_player(action_player):
             logger.debug("[ACTION] SHOWDOWN")
+            seat = table.current_player
             table.showdown()
+            self.record_action(table, seat, "showdown")
             await table_context.set_table(table)
 
     async def action_muck(self, table_context: TableContext, msg: dict):
@@ -219,7 +333,9 @@ class ShowdownState(GameState):
         action_player = self.get_action_player(msg)
         if table.is_current_player(action_player):
             logger.debug("[ACTION] MUCK")
+            seat = table.current_player
             table.fold()
+            self.record_action(table, seat, "muck")
             await table_context.set_table(table)
 
     async def next_round(self, table_context: TableContext):
@@ -245,5 +361,8 @@ class GameEndState(GameState):
     async def next_round(self, table_context: TableContext):
         table = table_context.get_table()
         table.game_end()
+        if table.recorder is not None:
+            get_writer().append(table.recorder)
+            table.recorder = None
         table.status = "beforeGame"
         await table_context.set_state(BeforeGameState())
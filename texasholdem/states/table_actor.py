@@ -0,0 +1,62 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from texasholdem.states import TableContext
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+DEFAULT_INBOX_SIZE = 64
+
+
+class TableActor:
+    # 1テーブル = 1タスク。受信箱のメッセージを順番に処理するので
+    # 状態遷移の途中 (notify の await 中) に別のアクションが割り込まない
+    def __init__(self, table_context: TableContext, inbox_size: int = DEFAULT_INBOX_SIZE):
+        self.table_context = table_context
+        self.inbox = asyncio.Queue(maxsize=inbox_size)
+        self.task = None
+        # 受信箱から取り出して処理中の呼び出しがある (状態遷移の途中)
+        self.busy = False
+
+    def submit(self, msg: dict) -> bool:
+        """Queue an action for the table. Returns False when the inbox is full."""
+        return self.submit_call(lambda: self.table_context.handle(msg))
+
+    def submit_call(self, call: Callable[[], Awaitable]) -> bool:
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.run())
+        try:
+            self.inbox.put_nowait(call)
+        except asyncio.QueueFull:
+            logger.debug(
+                "TableActor: inbox of table {} is full".format(self.table_context.table.id)
+            )
+            return False
+        return True
+
+    def is_idle(self) -> bool:
+        return not self.busy and self.inbox.empty()
+
+    async def run(self):
+        while True:
+            call = await self.inbox.get()
+            self.busy = True
+            try:
+                await call()
+            except Exception:
+                logger.exception(
+                    "TableActor: error on table {}".format(self.table_context.table.id)
+                )
+            finally:
+                self.busy = False
+                self.inbox.task_done()
+
+    async def join(self):
+        await self.inbox.join()
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
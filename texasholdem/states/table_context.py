@@ -1,15 +1,47 @@
+import asyncio
+from collections import deque
+from typing import List, Optional
+
 from texasholdem import Table
 from texasholdem.states import Context, ConcreteState
 
+DEFAULT_HISTORY_SIZE = 256
+
 
 class TableContext(Context):
-    def __init__(self, state_obj: ConcreteState, table: Table):
+    def __init__(
+        self,
+        state_obj: ConcreteState,
+        table: Table,
+        notify_interval: float = 0.0,
+        history_size: int = DEFAULT_HISTORY_SIZE,
+    ):
         super().__init__(state_obj)
         self.table = table
+        # このテーブルを見ているクライアント
+        self.clients = set()
+        # 差分通知用: 最後に送った内容 (エンコード済み) と通番
+        self.seq = 0
+        self.sent_fields = {}
+        self.sent_seats = []
+        self.sent_private = {}
+        # スナップショットを受け取り済みで差分を適用できるクライアント
+        self.synced = set()
+        # セッションを再開して replay を待っているクライアント -> それまで synced だったか
+        # (replay より先にライブの差分が届かないよう、その間は何も送らない)
+        self.resuming = {}
+        # 直近の差分 (seq, エンコード済みの差分, player_id -> 個別のフィールド)
+        self.history = deque(maxlen=history_size)
+        # 状態が変わったら dirty にするだけで、通知はメッセージの処理後にまとめて1回送る
+        # notify_interval > 0 ならその間隔 (秒) でまとめる
+        self.notify_interval = notify_interval
+        self.dirty = False
+        self.handling = 0
+        self._flush_task = None
 
     async def set_state(self, state_obj: ConcreteState):
         self.state = state_obj
-        await self.state.notify_current_status(self)
+        self.dirty = True
         if self.table.is_round_over():
             await self.state.next_round(self)
 
@@ -18,15 +50,60 @@ class TableContext(Context):
 
     async def set_table(self, table: Table):
         self.table = table
-        await self.state.notify_current_status(self)
+        self.dirty = True
         if self.table.is_round_over():
             await self.state.next_round(self)
 
     def get_table(self):
         return self.table
 
+    def hold(self, client_id):
+        self.resuming[client_id] = client_id in self.synced
+        self.synced.discard(client_id)
+
+    def release(self, client_id) -> bool:
+        # hold を解く。hold の前に synced だったかを返す
+        return self.resuming.pop(client_id, False)
+
+    def events_since(self, seq: Optional[int]) -> Optional[List[tuple]]:
+        # seq より後の差分。履歴から消えていて足りなければ None
+        if seq is None or seq > self.seq:
+            return None
+        if seq == self.seq:
+            return []
+        if not self.history or self.history[0][0] > seq + 1:
+            return None
+        return [e for e in self.history if e[0] > seq]
+
     async def handle(self, msg):
-        await self.state.handle(self, msg)
+        self.handling += 1
+        try:
+            await self.state.handle(self, msg)
+        finally:
+            self.handling -= 1
+            await self.schedule_flush()
+
+    async def schedule_flush(self):
+        if not self.dirty:
+            return
+        if self.notify_interval <= 0:
+            await self.flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.notify_interval)
+        self._flush_task = None
+        # 処理中の状態遷移は送らない (handle の最後にもう一度予約される)
+        if not self.handling:
+            await self.flush()
+
+    async def flush(self):
+        if self.dirty:
+            self.dirty = False
+            await self.state.notify_current_status(self)
 
     async def notify_current_status(self):
+        # 参加時などの明示的な通知。溜まっていた変更もここでまとめて送る
+        self.dirty = False
         await self.state.notify_current_status(self)
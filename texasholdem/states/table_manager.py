@@ -0,0 +1,151 @@
+import asyncio
+import itertools
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from texasholdem import Table
+from texasholdem.states import TableContext, TableActor
+from texasholdem.states.table_actor import DEFAULT_INBOX_SIZE
+from websock import REGISTRY, table_topic
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+DEFAULT_TABLE_ID = "default"
+
+
+class TableManager:
+    # テーブル ID -> TableContext の登録簿 (ロビー)
+    def __init__(
+        self,
+        players_limit: int = 6,
+        max_idle: float = 600.0,
+        inbox_size: int = DEFAULT_INBOX_SIZE,
+        notify_interval: float = 0.0,
+    ):
+        self.players_limit = players_limit
+        self.max_idle = max_idle
+        self.inbox_size = inbox_size
+        self.notify_interval = notify_interval
+        self.tables = {}  # type: Dict[str, TableContext]
+        self.actors = {}  # type: Dict[str, TableActor]
+        self.last_active = {}  # type: Dict[str, float]
+        self._ids = itertools.count(1)
+
+    def __len__(self):
+        return len(self.tables)
+
+    def __contains__(self, table_id):
+        return table_id in self.tables
+
+    def create(self, table_id: str = None, players_limit: int = None) -> TableContext:
+        from texasholdem.states.street_state import BeforeGameState
+
+        if table_id is None:
+            table_id = str(next(self._ids))
+            while table_id in self.tables:
+                table_id = str(next(self._ids))
+        elif table_id in self.tables:
+            raise KeyError("table {} already exists".format(table_id))
+        table = Table(players_limit=players_limit or self.players_limit, table_id=table_id)
+        table_context = self.add(TableContext(BeforeGameState(), table))
+        logger.debug("TableManager: created table {}".format(table_id))
+        return table_context
+
+    def add(self, table_context: TableContext) -> TableContext:
+        # 作ったテーブルやチェックポイントから戻したテーブルを登録する
+        table_id = table_context.table.id
+        table_context.notify_interval = self.notify_interval
+        # テーブルを見ているクライアント = テーブルのトピックの購読者
+        table_context.clients = REGISTRY.topic(table_topic(table_id))
+        self.tables[table_id] = table_context
+        self.actors[table_id] = TableActor(table_context, self.inbox_size)
+        self.touch(table_id)
+        return table_context
+
+    def get(self, table_id: str) -> Optional[TableContext]:
+        return self.tables.get(table_id)
+
+    def get_actor(self, table_id: str) -> Optional[TableActor]:
+        return self.actors.get(table_id)
+
+    def get_or_create(self, table_id: str) -> TableContext:
+        table_context = self.get(table_id)
+        if table_context is None:
+            table_context = self.create(table_id)
+        return table_context
+
+    def retire(self, table_id: str) -> Optional[TableContext]:
+        self.last_active.pop(table_id, None)
+        table_context = self.tables.pop(table_id, None)
+        actor = self.actors.pop(table_id, None)
+        if actor is not None:
+            actor.stop()
+        if table_context is not None:
+            REGISTRY.drop_topic(table_topic(table_id))
+            logger.debug("TableManager: retired table {}".format(table_id))
+        return table_context
+
+    def touch(self, table_id: str):
+        self.last_active[table_id] = time.monotonic()
+
+    def join(self, table_id: str, client_id) -> TableContext:
+        table_context = self.tables[table_id]
+        REGISTRY.subscribe(client_id, table_topic(table_id))
+        self.touch(table_id)
+        return table_context
+
+    def leave(self, table_id: str, client_id):
+        REGISTRY.unsubscribe(client_id, table_topic(table_id))
+
+    def tables_of(self, client_id) -> List[str]:
+        return [t for t in REGISTRY.tables_of(client_id) if t in self.tables]
+
+    def is_idle(self, table_id: str, now: float = None) -> bool:
+        # ハンドの途中のテーブルは捨てない
+        from texasholdem.states.street_state import BeforeGameState
+
+        now = time.monotonic() if now is None else now
+        table_context = self.tables[table_id]
+        return (
+            now - self.last_active.get(table_id, now) >= self.max_idle
+            and isinstance(table_context.state, BeforeGameState)
+            and not table_context.clients
+            and self.actors[table_id].is_idle()
+        )
+
+    def evict_idle(self, now: float = None) -> List[str]:
+        evicted = [
+            table_id
+            for table_id in self.tables
+            if table_id != DEFAULT_TABLE_ID and self.is_idle(table_id, now)
+        ]
+        for table_id in evicted:
+            self.retire(table_id)
+        return evicted
+
+    async def run_eviction(
+        self,
+        interval: float = 60.0,
+        on_evict: Callable[[List[str]], Awaitable] = None,
+    ):
+        while True:
+            await asyncio.sleep(interval)
+            evicted = self.evict_idle()
+            if evicted:
+                logger.debug("TableManager: evicted idle tables {}".format(evicted))
+                if on_evict is not None:
+                    await on_evict(evicted)
+
+    def lobby(self) -> List[dict]:
+        return [
+            {
+                "table_id": table_id,
+                "player_num": table_context.table.player_num,
+                "players_limit": table_context.table.players_limit,
+                "state": table_context.table.status,
+                "clients": len(table_context.clients),
+            }
+            for table_id, table_context in self.tables.items()
+        ]
@@ -1,7 +1,14 @@
 from functools import reduce
+import random
 
 from texasholdem import Player, Deck, Card, HandRank
-from typing import List
+from texasholdem.card import HIDDEN_CARD
+from texasholdem.evaluator import HandState
+from typing import List, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from texasholdem.equity import Equity
+    from texasholdem.hand_history import HandRecorder
 
 import logging
 
@@ -14,23 +21,35 @@ class GamingPlayer:
         self.player = player
         self.hand = []  # type: List[Card]
         self.hand_rank: HandRank = None
+        self.hand_state: HandState = None
+        self.evaluated_board_count = 0
         self.betting = 0
         self.ongoing = True
         self.played = False
         self.is_showdown = False
 
+    def update_hand_rank(self, board: List[Card]):
+        # ホールカードで初期化し、以降は増えたボードのカードだけ足していく
+        if self.hand_state is None:
+            self.hand_state = HandState([c.code for c in self.hand])
+            self.evaluated_board_count = 0
+        for i in range(self.evaluated_board_count, len(board)):
+            self.hand_state.add(board[i].code)
+        self.evaluated_board_count = len(board)
+        self.hand_rank = HandRank.from_strength(self.hand_state.strength())
+
     def toJSON(self):
         return {
             "player": self.player,
-            "hand": self.hand if self.is_showdown else [Card(0, "B"), Card(0, "B")],
+            "hand": self.hand if self.is_showdown else [HIDDEN_CARD, HIDDEN_CARD],
             "betting": self.betting,
             "ongoing": self.ongoing,
         }
 
 
 class Table:
-    def __init__(self, players_limit: int):
-        self.id = id(self)  # 仮
+    def __init__(self, players_limit: int, seed=None, table_id=None):
+        self.id = table_id if table_id is not None else id(self)
         self.isInitialized = False
         self.stakes = {
             "SB": 1,
@@ -48,7 +67,12 @@ class Table:
         self.status = "beforeGame"
         self.button_player = 0
         self.current_player = -1  # 0 = button
-        self.deck = Deck()
+        # テーブルごとに独立した乱数 (seed を渡せば再現可能)
+        self.rng = random.Random(seed)
+        self.deck = Deck(rng=self.rng)
+        self.equity = None  # type: List[Equity]
+        # 進行中のハンドの履歴 (ハンド履歴を記録しないときは None)
+        self.recorder = None  # type: HandRecorder
 
     def __eq__(self, other):
         if not isinstance(other, Table):
@@ -211,11 +235,38 @@ class Table:
         self.current_player = self.button_player
         self.next_player()
 
+    def is_all_in(self):
+        # 2人以上残っていて、これ以上ベットできるプレイヤーが1人以下
+        ongoing_players = [
+            p for p in self.player_seating_chart if p is not None and p.ongoing
+        ]
+        return (
+            len(ongoing_players) > 1
+            and sum(1 for p in ongoing_players if p.player.bankroll > 0) <= 1
+        )
+
+    def calc_equity(self):
+        from texasholdem.equity import exact_equity
+
+        seats = [
+            i
+            for i in range(self.players_limit)
+            if self.player_seating_chart[i] is not None
+            and self.player_seating_chart[i].ongoing
+        ]
+        equity = [None for _ in range(self.players_limit)]
+        results = exact_equity(
+            [self.player_seating_chart[i].hand for i in seats], self.board
+        )
+        for i, e in zip(seats, results):
+            equity[i] = e
+        return equity
+
     def update_hand_rank(self):
         logger.debug("update_hand_rank called")
         for p in self.player_seating_chart:
-            if p is not None:
-                p.hand_rank = HandRank(p.hand + self.board)
+            if p is not None and p.ongoing:
+                p.update_hand_rank(self.board)
 
     def game_end(self):
         logger.debug("game_end called")
@@ -228,7 +279,11 @@ class Table:
 
         if ongoing_players_count == 1:
             logger.debug("only one player is ongoing")
-            ongoing_player.player.bankroll += self.current_pot_size
+            ongoing_player.player.receive(self.current_pot_size)
+            if self.recorder is not None:
+                self.recorder.award(
+                    self.player_seating_chart.index(ongoing_player), self.current_pot_size
+                )
         else:
             logger.debug("there are multiple players ongoing")
             winner_index = None
@@ -245,19 +300,21 @@ class Table:
                                 winner_index = i
                                 winner_rank = self.player_seating_chart[i].hand_rank
             logger.debug("winner is {}".format(i))
-            self.player_seating_chart[
-                winner_index
-            ].player.bankroll += self.current_pot_size
+            self.player_seating_chart[winner_index].player.receive(self.current_pot_size)
+            if self.recorder is not None:
+                self.recorder.award(winner_index, self.current_pot_size)
 
         logger.debug("initializing...")
         # 初期化処理
         self.board = []
+        self.equity = None
         self.current_betting_amount = 0
         self.current_pot_size = 0
         for p in self.player_seating_chart:
             if p is not None:
                 p.hand = []
                 p.hand_rank = None
+                p.hand_state = None
                 p.played = False
                 p.ongoing = True
                 p.is_showdown = False
@@ -1,6 +1,8 @@
 from websockets import client
 
+from websock.registry import Registry, LOBBY, table_topic
 
-CLIENTS = {}
-client_id_count = 0
-from websock.websock import broadcast, unicast, notify
+# 接続とトピックの購読 (CLIENTS / client_id_count の代わり)
+REGISTRY = Registry()
+
+from websock.websock import broadcast, unicast, notify, encode, join_fields, join_list
@@ -0,0 +1,378 @@
+import json
+import logging
+import struct
+from functools import lru_cache
+from typing import Dict
+
+from texasholdem.card import CARDS, HIDDEN_CARD, Card
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# websocket のサブプロトコルで選ぶバイナリ形式 (選ばなければ従来どおり JSON)
+#
+#   値:     1byte のタグ + 中身
+#           NULL / FALSE / TRUE
+#           UINT, NINT  varint (NINT は -1 - n)
+#           FLOAT       f32 (little endian)
+#           STR         varint 長 + utf-8
+#           LIST        varint 要素数 + 値...
+#           MAP         varint 要素数 + (キー, 値)...  キーは KEYS の番号 (1byte)
+#                       か 0xff + varint 長 + utf-8
+#           CARD        カードコード 1byte (0xff は伏せたカード)
+#   受信:   アクション番号 1byte (ACTIONS) + 残りのフィールドの MAP
+SUBPROTOCOL = "holdem.binary.v1"
+
+NULL, FALSE, TRUE, UINT, NINT, FLOAT, STR, LIST, MAP, CARD = range(10)
+RAW_KEY = 0xFF
+HIDDEN_CODE = 0xFF
+F32 = struct.Struct("<f")
+
+KEYS = [
+    "type",
+    "seq",
+    "state",
+    "seating_chart",
+    "seats",
+    "button_player",
+    "current_player",
+    "board",
+    "pot_size",
+    "equity",
+    "table_id",
+    "hand",
+    "hand_rank",
+    "player",
+    "betting",
+    "ongoing",
+    "id",
+    "name",
+    "bankroll",
+    "win",
+    "tie",
+    "error",
+    "lobby",
+    "player_num",
+    "players_limit",
+    "clients",
+    "amount",
+    "action",
+]
+KEY_INDEX = {k: i for i, k in enumerate(KEYS)}
+
+ACTIONS = [
+    "seat",
+    "leave",
+    "start",
+    "check",
+    "call",
+    "bet",
+    "raise",
+    "fold",
+    "showdown",
+    "muck",
+    "reset",
+    "resync",
+    "lobby",
+    "create_table",
+    "join_table",
+    "leave_table",
+    # 以下は後から足したもの (番号を変えないよう末尾に足す)
+    "leave_lobby",
+    "stats",
+    "resume",
+    "replay",
+]
+ACTION_INDEX = {a: i for i, a in enumerate(ACTIONS)}
+
+CARD_CODES = {(c.number, c.suit): c.code for c in CARDS}
+CARD_CODES[(HIDDEN_CARD.number, HIDDEN_CARD.suit)] = HIDDEN_CODE
+
+
+class BinaryProtocolError(ValueError):
+    pass
+
+
+def write_varint(out: bytearray, n: int):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def read_varint(data: bytes, pos: int):
+    n = shift = 0
+    while True:
+        if pos >= len(data):
+            raise BinaryProtocolError("truncated varint")
+        b = data[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+def _write_str(out: bytearray, s: str):
+    raw = s.encode()
+    write_varint(out, len(raw))
+    out += raw
+
+
+def _card_code(obj: dict):
+    # {"number": .., "suit": ..} だけを持つ dict はカードとして 1byte にする
+    if len(obj) != 2:
+        return None
+    try:
+        return CARD_CODES.get((obj["number"], obj["suit"]))
+    except (KeyError, TypeError):
+        return None
+
+
+def write_key(out: bytearray, key):
+    index = KEY_INDEX.get(key)
+    if index is None:
+        out.append(RAW_KEY)
+        _write_str(out, str(key))
+    else:
+        out.append(index)
+
+
+def write_value(out: bytearray, obj):
+    if obj is None:
+        out.append(NULL)
+    elif obj is True:
+        out.append(TRUE)
+    elif obj is False:
+        out.append(FALSE)
+    elif isinstance(obj, int):
+        if obj >= 0:
+            out.append(UINT)
+            write_varint(out, obj)
+        else:
+            out.append(NINT)
+            write_varint(out, -1 - obj)
+    elif isinstance(obj, float):
+        out.append(FLOAT)
+        out += F32.pack(obj)
+    elif isinstance(obj, str):
+        out.append(STR)
+        _write_str(out, obj)
+    elif isinstance(obj, (list, tuple)):
+        out.append(LIST)
+        write_varint(out, len(obj))
+        for item in obj:
+            write_value(out, item)
+    elif isinstance(obj, dict):
+        code = _card_code(obj)
+        if code is not None:
+            out.append(CARD)
+            out.append(code)
+            return
+        out.append(MAP)
+        write_varint(out, len(obj))
+        for key, value in obj.items():
+            write_key(out, key)
+            write_value(out, value)
+    elif isinstance(obj, Card):
+        out.append(CARD)
+        out.append(HIDDEN_CODE if obj.code < 0 else obj.code)
+    elif callable(getattr(obj, "toJSON", None)):
+        # SasakiJSONEncoder と同じく toJSON の値を書く
+        write_value(out, obj.toJSON())
+    else:
+        raise BinaryProtocolError("cannot encode {!r}".format(type(obj)))
+
+
+def _read_str(data: bytes, pos: int):
+    size, pos = read_varint(data, pos)
+    if pos + size > len(data):
+        raise BinaryProtocolError("truncated string")
+    return data[pos:pos + size].decode(), pos + size
+
+
+def read_value(data: bytes, pos: int = 0):
+    if pos >= len(data):
+        raise BinaryProtocolError("truncated value")
+    tag = data[pos]
+    pos += 1
+    if tag == NULL:
+        return None, pos
+    if tag == FALSE:
+        return False, pos
+    if tag == TRUE:
+        return True, pos
+    if tag == UINT:
+        return read_varint(data, pos)
+    if tag == NINT:
+        n, pos = read_varint(data, pos)
+        return -1 - n, pos
+    if tag == FLOAT:
+        if pos + F32.size > len(data):
+            raise BinaryProtocolError("truncated float")
+        return F32.unpack_from(data, pos)[0], pos + F32.size
+    if tag == STR:
+        return _read_str(data, pos)
+    if tag == LIST:
+        size, pos = read_varint(data, pos)
+        items = []
+        for _ in range(size):
+            item, pos = read_value(data, pos)
+            items.append(item)
+        return items, pos
+    if tag == MAP:
+        size, pos = read_varint(data, pos)
+        obj = {}
+        for _ in range(size):
+            if pos >= len(data):
+                raise BinaryProtocolError("truncated map")
+            index = data[pos]
+            pos += 1
+            if index == RAW_KEY:
+                key, pos = _read_str(data, pos)
+            elif index < len(KEYS):
+                key = KEYS[index]
+            else:
+                raise BinaryProtocolError("unknown key index {}".format(index))
+            obj[key], pos = read_value(data, pos)
+        return obj, pos
+    if tag == CARD:
+        if pos >= len(data):
+            raise BinaryProtocolError("truncated card")
+        code = data[pos]
+        if code == HIDDEN_CODE:
+            return HIDDEN_CARD.toJSON(), pos + 1
+        if code >= len(CARDS):
+            raise BinaryProtocolError("unknown card code {}".format(code))
+        return CARDS[code].toJSON(), pos + 1
+    raise BinaryProtocolError("unknown tag {}".format(tag))
+
+
+def encode_value(obj) -> bytes:
+    out = bytearray()
+    write_value(out, obj)
+    return bytes(out)
+
+
+def decode_value(data: bytes):
+    obj, pos = read_value(data)
+    if pos != len(data):
+        raise BinaryProtocolError("trailing bytes")
+    return obj
+
+
+class Encoded(str):
+    # エンコード済みの値。JSON の文字列そのもので、同じ値のバイナリ形式も持つ
+    # (通知ごとに両方を1回だけ作る。JSON のクライアントには文字列として送られる)
+    def __new__(cls, text: str, binary: bytes):
+        obj = str.__new__(cls, text)
+        obj.binary = binary
+        return obj
+
+    def __reduce__(self):
+        return type(self), (str(self), self.binary)
+
+
+class Frame(Encoded):
+    # エンコード済みの JSON object。バイナリは MAP の要素数と中身を分けて持ち、
+    # 個別のフィールドを差し込むときは連結するだけにする
+    def __new__(cls, text: str, count: int, body: bytes):
+        head = bytearray([MAP])
+        write_varint(head, count)
+        obj = Encoded.__new__(cls, text, bytes(head) + body)
+        obj.count = count
+        obj.body = body
+        return obj
+
+    def __reduce__(self):
+        return type(self), (str(self), self.count, self.body)
+
+
+_keys = {}  # type: Dict[object, bytes]
+
+
+def encode_key(key) -> bytes:
+    b = _keys.get(key)
+    if b is None:
+        out = bytearray()
+        write_key(out, key)
+        b = _keys[key] = bytes(out)
+    return b
+
+
+def join_frame(text: str, fields: dict) -> Frame:
+    # fields: キー -> Encoded (text は同じ fields から組み立てた JSON object)
+    return Frame(
+        text, len(fields), b"".join([encode_key(k) + v.binary for k, v in fields.items()])
+    )
+
+
+def splice_frame(text: str, private: Frame, shared: Frame) -> Frame:
+    # 共通部分の末尾に個別のフィールドを足したもの (JSON の splice と同じ順)
+    return Frame(text, shared.count + private.count, shared.body + private.body)
+
+
+def join_list(items) -> Encoded:
+    # Encoded の列から JSON の配列と LIST を組み立てる
+    head = bytearray([LIST])
+    write_varint(head, len(items))
+    return Encoded(
+        "[" + ", ".join(items) + "]", bytes(head) + b"".join([v.binary for v in items])
+    )
+
+
+@lru_cache(maxsize=256)
+def from_json(text: str) -> bytes:
+    # Frame になっていない文字列 (エラーなどの単発のメッセージ) だけを変換する
+    return encode_value(json.loads(text))
+
+
+def encode_action(msg: dict) -> bytes:
+    # クライアント (ボット等) 側の送信用
+    rest = {k: v for k, v in msg.items() if k != "action"}
+    return bytes([ACTION_INDEX[msg["action"]]]) + encode_value(rest)
+
+
+def decode_action(data: bytes) -> dict:
+    if not data:
+        raise BinaryProtocolError("empty message")
+    if data[0] >= len(ACTIONS):
+        raise BinaryProtocolError("unknown action code {}".format(data[0]))
+    msg = decode_value(data[1:]) if len(data) > 1 else {}
+    if not isinstance(msg, dict):
+        raise BinaryProtocolError("action fields must be a map")
+    msg["action"] = ACTIONS[data[0]]
+    return msg
+
+
+def decode_message(message) -> dict:
+    # テキストフレームは JSON、バイナリフレームはこの形式
+    if isinstance(message, (bytes, bytearray)):
+        return decode_action(bytes(message))
+    return json.loads(message)
+
+
+class BinaryConnection:
+    # バイナリを選んだ websocket を包む。送る側は JSON 文字列のままでよい
+    # (notify が作る Encoded は持っているバイナリ形式をそのまま送る)
+    def __init__(self, websocket):
+        self.websocket = websocket
+
+    async def send(self, msg):
+        if isinstance(msg, Encoded):
+            msg = msg.binary
+        elif isinstance(msg, str):
+            msg = from_json(msg)
+        await self.websocket.send(msg)
+
+    def __aiter__(self):
+        return self.websocket.__aiter__()
+
+    def __getattr__(self, name):
+        return getattr(self.websocket, name)
+
+
+def wrap(websocket):
+    if getattr(websocket, "subprotocol", None) == SUBPROTOCOL:
+        return BinaryConnection(websocket)
+    return websocket
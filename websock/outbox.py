@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import re
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 256
+
+# 送信が追いつかないクライアントの扱い
+#   drop:       古いフレームから捨てる (クライアントは seq の飛びを見て resync する)
+#   resync:     溜まったテーブルの通知を捨て、次のスナップショットまで差分を送らない
+#   disconnect: 切断する
+DROP, RESYNC, DISCONNECT = "drop", "resync", "disconnect"
+POLICIES = (DROP, RESYNC, DISCONNECT)
+
+# テーブルの状態通知は '{"type": "snapshot" | "delta", "table_id": ...' で始まる
+STATE_HEADER = re.compile(r'\{"type": "(snapshot|delta)", "table_id": ("[^"]*"|-?\d+)')
+
+# 全接続の合計
+METRICS = {"sent": 0, "dropped": 0, "superseded": 0, "lagging": 0, "disconnected": 0}
+
+Frame = Tuple[Optional[str], object]
+
+
+def frame_of(msg) -> Tuple[Optional[str], Optional[str]]:
+    # (種類, テーブル) を返す。テーブルの状態通知でなければ (None, None)
+    if isinstance(msg, str):
+        m = STATE_HEADER.match(msg)
+        if m is not None:
+            return m.group(1), m.group(2)
+    return None, None
+
+
+class ClientConnection:
+    # websocket ごとの送信キューと書き込みタスク。send はキューに積むだけで待たない
+    def __init__(
+        self,
+        websocket,
+        client_id=None,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        policy: str = RESYNC,
+        on_lag: Callable[[object], None] = None,
+    ):
+        if policy not in POLICIES:
+            raise ValueError("unknown slow client policy: {}".format(policy))
+        self.websocket = websocket
+        self.client_id = client_id
+        self.queue_size = queue_size
+        self.policy = policy
+        self.on_lag = on_lag
+        self.queue = deque()  # type: Deque[Frame]
+        self.awaiting_snapshot = set()  # スナップショット待ちのテーブル
+        self.ready = asyncio.Event()
+        self.task = None
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.superseded = 0
+        self.max_depth = 0
+
+    def __getattr__(self, name):
+        return getattr(self.websocket, name)
+
+    def __aiter__(self):
+        return self.websocket.__aiter__()
+
+    @property
+    def depth(self) -> int:
+        return len(self.queue)
+
+    async def send(self, msg):
+        self.put(msg)
+
+    def put(self, msg):
+        if self.closed:
+            return
+        kind, table = frame_of(msg)
+        if kind == "snapshot":
+            # 同じテーブルの古いフレームはもう要らない
+            self.awaiting_snapshot.discard(table)
+            before = len(self.queue)
+            self.queue = deque(f for f in self.queue if f[0] != table)
+            self._count("superseded", before - len(self.queue))
+        elif kind == "delta" and table in self.awaiting_snapshot:
+            self._count("dropped", 1)
+            return
+        if len(self.queue) >= self.queue_size:
+            self._lagging()
+            if self.closed:
+                return
+            if kind == "delta" and table in self.awaiting_snapshot:
+                self._count("dropped", 1)
+                return
+        self.queue.append((table, msg))
+        self.max_depth = max(self.max_depth, len(self.queue))
+        self.ready.set()
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.run())
+
+    def _count(self, name: str, n: int):
+        if n:
+            setattr(self, name, getattr(self, name) + n)
+            METRICS[name] += n
+
+    def _lagging(self):
+        METRICS["lagging"] += 1
+        logger.debug(
+            "ClientConnection: client {} is lagging ({})".format(self.client_id, self.policy)
+        )
+        if self.policy == DROP:
+            self.queue.popleft()
+            self._count("dropped", 1)
+        elif self.policy == RESYNC:
+            # 捨てるのはテーブルの状態通知だけ (セッションの応答やエラー、ロビーは残す)
+            tables = {t for t, _ in self.queue if t is not None}
+            if not tables:
+                # 捨てられるものがない
+                self._disconnect()
+                return
+            self.awaiting_snapshot.update(tables)
+            before = len(self.queue)
+            self.queue = deque(f for f in self.queue if f[0] is None)
+            self._count("dropped", before - len(self.queue))
+            if self.on_lag is not None:
+                self.on_lag(self.client_id)
+        else:
+            self._disconnect()
+
+    def _disconnect(self):
+        METRICS["disconnected"] += 1
+        self._count("dropped", len(self.queue))
+        self.disconnect(1008, "too slow")
+
+    async def run(self):
+        while not self.closed:
+            if not self.queue:
+                self.ready.clear()
+                await self.ready.wait()
+                continue
+            _, msg = self.queue.popleft()
+            try:
+                await self.websocket.send(msg)
+            except Exception as e:
+                logger.debug(
+                    "ClientConnection: failed to send to {} ({!r})".format(self.client_id, e)
+                )
+                self.closed = True
+                self.queue.clear()
+                break
+            self.sent += 1
+            METRICS["sent"] += 1
+
+    def close(self):
+        self.closed = True
+        self.queue.clear()
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def disconnect(self, code: int = 1000, reason: str = ""):
+        self.close()
+        asyncio.ensure_future(self.websocket.close(code, reason))
+
+    def stats(self) -> dict:
+        return {
+            "client_id": self.client_id,
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "superseded": self.superseded,
+        }
+
+
+def stats(clients: Dict[object, object]) -> dict:
+    connections = [c for c in clients.values() if isinstance(c, ClientConnection)]
+    return {
+        "totals": dict(METRICS),
+        "queued": sum(c.depth for c in connections),
+        "max_depth": max((c.depth for c in connections), default=0),
+        "clients": [c.stats() for c in connections],
+    }
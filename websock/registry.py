@@ -0,0 +1,92 @@
+import logging
+from typing import Dict, Hashable, Iterator, List, Optional, Set
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# トピック: テーブルは ("table", table_id)、ロビーの更新は LOBBY
+TABLE = "table"
+LOBBY = "lobby"
+
+
+def table_topic(table_id) -> tuple:
+    return (TABLE, table_id)
+
+
+class Registry:
+    # client_id -> 接続 と、トピック -> 購読しているクライアントの集合
+    # 通知は購読者だけに送るので、接続数全体ではなく購読者数に比例する
+    def __init__(self):
+        self.connections = {}  # type: Dict[object, object]
+        self.topics = {}  # type: Dict[Hashable, Set[object]]
+        self.subscriptions = {}  # type: Dict[object, Set[Hashable]]
+        self.next_id = 0
+
+    def __len__(self):
+        return len(self.connections)
+
+    def __contains__(self, client_id):
+        return client_id in self.connections
+
+    def __iter__(self) -> Iterator:
+        return iter(self.connections)
+
+    def new_client_id(self) -> int:
+        client_id = self.next_id
+        self.next_id += 1
+        return client_id
+
+    def reserve_ids(self, first: int):
+        # 再起動前に払い出した id と重ならないよう、first 以降から払い出す
+        self.next_id = max(self.next_id, first)
+
+    def register(self, client_id, connection):
+        self.connections[client_id] = connection
+
+    def detach(self, client_id) -> Optional[object]:
+        # 接続だけ外して購読は残す (セッションの再開を待つ間)
+        return self.connections.pop(client_id, None)
+
+    def unregister(self, client_id) -> Optional[object]:
+        self.unsubscribe_all(client_id)
+        return self.connections.pop(client_id, None)
+
+    def get(self, client_id) -> Optional[object]:
+        return self.connections.get(client_id)
+
+    def topic(self, topic: Hashable) -> Set[object]:
+        # 購読者の集合そのもの (TableContext.clients などが参照し続ける)
+        return self.topics.setdefault(topic, set())
+
+    def subscribers(self, topic: Hashable) -> Set[object]:
+        return self.topics.get(topic, set())
+
+    def subscribe(self, client_id, topic: Hashable):
+        self.topic(topic).add(client_id)
+        self.subscriptions.setdefault(client_id, set()).add(topic)
+
+    def unsubscribe(self, client_id, topic: Hashable):
+        subscribers = self.topics.get(topic)
+        if subscribers is not None:
+            subscribers.discard(client_id)
+        topics = self.subscriptions.get(client_id)
+        if topics is not None:
+            topics.discard(topic)
+
+    def unsubscribe_all(self, client_id):
+        for topic in self.subscriptions.pop(client_id, set()):
+            subscribers = self.topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(client_id)
+
+    def topics_of(self, client_id) -> Set[Hashable]:
+        return self.subscriptions.get(client_id, set())
+
+    def tables_of(self, client_id) -> List:
+        return [t[1] for t in self.topics_of(client_id) if isinstance(t, tuple) and t[0] == TABLE]
+
+    def drop_topic(self, topic: Hashable):
+        for client_id in self.topics.pop(topic, set()):
+            topics = self.subscriptions.get(client_id)
+            if topics is not None:
+                topics.discard(topic)
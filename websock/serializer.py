@@ -0,0 +1,134 @@
+import json
+import logging
+from typing import Dict
+
+from texasholdem import Card, HandRank, Player, SasakiJSONEncoder
+from texasholdem.card import CARDS, HIDDEN_CARD
+from texasholdem.table import GamingPlayer
+from websock.binary import Encoded, Frame, encode_value, join_frame, join_list, write_key, write_value
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# json.dumps(obj, cls=SasakiJSONEncoder) と同じ文字列を、toJSON の dict を作らずに組み立てる
+# カードはコードで引ける文字列、プレイヤーと席は変わりうるフィールドをキーにキャッシュする
+# 返すのは Encoded (同じ値のバイナリ形式も一緒に作る)
+CARD_JSON = [Encoded(json.dumps(c.toJSON()), encode_value(c)) for c in CARDS]
+HIDDEN_JSON = Encoded(json.dumps(HIDDEN_CARD.toJSON()), encode_value(HIDDEN_CARD))
+HIDDEN_HAND_JSON = join_list([HIDDEN_JSON, HIDDEN_JSON])
+NULL_JSON = Encoded("null", encode_value(None))
+
+CACHE_SIZE = 4096
+
+_players = {}  # type: Dict[tuple, Encoded]
+_seats = {}  # type: Dict[tuple, Encoded]
+_hand_ranks = {}  # type: Dict[int, Encoded]
+_privates = {}  # type: Dict[tuple, Frame]
+_strings = {}  # type: Dict[str, Encoded]
+
+
+def encode_card(card: Card) -> Encoded:
+    return HIDDEN_JSON if card.code < 0 else CARD_JSON[card.code]
+
+
+def encode_cards(cards) -> Encoded:
+    return join_list([encode_card(c) for c in cards])
+
+
+def _cached(cache: dict, key, build) -> Encoded:
+    s = cache.get(key)
+    if s is None:
+        if len(cache) >= CACHE_SIZE:
+            cache.clear()
+        s = cache[key] = build()
+    return s
+
+
+def _encode_value(obj) -> Encoded:
+    return Encoded(json.dumps(obj, cls=SasakiJSONEncoder), encode_value(obj))
+
+
+def encode_frame(obj: dict) -> Frame:
+    # dict を JSON object と MAP に (個別のフィールドを差し込めるよう Frame で返す)
+    body = bytearray()
+    for key, value in obj.items():
+        write_key(body, key)
+        write_value(body, value)
+    return Frame(json.dumps(obj, cls=SasakiJSONEncoder), len(obj), bytes(body))
+
+
+def encode_player(player: Player) -> Encoded:
+    key = (player.id, player.name, player.bankroll)
+    return _cached(
+        _players,
+        key,
+        lambda: Encoded(
+            '{{"id": {}, "name": {}, "bankroll": {}}}'.format(*map(json.dumps, key)),
+            encode_value(dict(zip(("id", "name", "bankroll"), key))),
+        ),
+    )
+
+
+def _build_seat(p: GamingPlayer, player: Encoded, hand) -> Frame:
+    fields = {
+        "player": player,
+        "hand": HIDDEN_HAND_JSON if hand is None else encode_cards(p.hand),
+        "betting": _encode_value(p.betting),
+        "ongoing": _encode_value(p.ongoing),
+    }
+    text = '{{"player": {}, "hand": {}, "betting": {}, "ongoing": {}}}'.format(*fields.values())
+    return join_frame(text, fields)
+
+
+def encode_seat(p: GamingPlayer) -> Encoded:
+    if p is None:
+        return NULL_JSON
+    hand = tuple(c.code for c in p.hand) if p.is_showdown else None
+    player = encode_player(p.player)
+    key = (player, hand, p.betting, p.ongoing)
+    return _cached(_seats, key, lambda: _build_seat(p, player, hand))
+
+
+def encode_hand_rank(hand_rank: HandRank) -> Encoded:
+    return _cached(_hand_ranks, hand_rank.strength, lambda: _encode_value(hand_rank))
+
+
+def _build_private(p: GamingPlayer) -> Frame:
+    fields = {
+        "hand": encode_cards(p.hand),
+        "hand_rank": NULL_JSON if p.hand_rank is None else encode_hand_rank(p.hand_rank),
+    }
+    return join_frame('{{"hand": {}, "hand_rank": {}}}'.format(*fields.values()), fields)
+
+
+def encode_private(p: GamingPlayer) -> Frame:
+    # 本人にだけ送るフィールド ({"hand": .., "hand_rank": ..})
+    key = (
+        tuple(c.code for c in p.hand),
+        None if p.hand_rank is None else p.hand_rank.strength,
+    )
+    return _cached(_privates, key, lambda: _build_private(p))
+
+
+def encode(obj) -> Encoded:
+    # よく出る型だけ専用の経路、それ以外は従来のエンコーダ
+    if obj is None:
+        return NULL_JSON
+    t = type(obj)
+    if t is int:
+        return Encoded(str(obj), encode_value(obj))
+    if t is str:
+        return _cached(_strings, obj, lambda: Encoded(json.dumps(obj), encode_value(obj)))
+    if t is GamingPlayer:
+        return encode_seat(obj)
+    if t is Card:
+        return encode_card(obj)
+    if t is Player:
+        return encode_player(obj)
+    if t is HandRank:
+        return encode_hand_rank(obj)
+    if t is list and obj and all(type(c) is Card for c in obj):
+        return encode_cards(obj)
+    if t is dict:
+        return encode_frame(obj)
+    return _encode_value(obj)
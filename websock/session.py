@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import secrets
+from typing import Callable, Dict, List, Optional, Tuple
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+DEFAULT_GRACE = 60.0
+
+
+class Session:
+    __slots__ = ("token", "client_id", "expiry")
+
+    def __init__(self, token: str, client_id):
+        self.token = token
+        self.client_id = client_id
+        self.expiry = None  # 切断中だけ、期限切れの予約 (TimerHandle)
+
+
+class SessionStore:
+    # セッショントークン -> client_id。切断しても grace 秒は client_id と購読を残しておき、
+    # 同じトークンで再接続すれば同じプレイヤーとして続けられる
+    def __init__(self, grace: float = DEFAULT_GRACE):
+        self.grace = grace
+        self.sessions = {}  # type: Dict[str, Session]
+        self.client_sessions = {}  # type: Dict[object, Session]
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def open(self, client_id) -> str:
+        token = secrets.token_urlsafe(16)
+        session = Session(token, client_id)
+        self.sessions[token] = session
+        self.client_sessions[client_id] = session
+        return token
+
+    def detach(self, client_id, on_expire: Callable[[object], None]):
+        session = self.client_sessions.get(client_id)
+        if session is None:
+            on_expire(client_id)
+            return
+
+        def expire():
+            logger.debug("SessionStore: session of client {} expired".format(client_id))
+            self.close(client_id)
+            on_expire(client_id)
+
+        session.expiry = asyncio.get_event_loop().call_later(self.grace, expire)
+
+    def dump(self) -> List[Tuple[str, object]]:
+        return [(s.token, s.client_id) for s in self.sessions.values()]
+
+    def load(self, sessions: List[Tuple[str, object]], on_expire: Callable[[object], None]):
+        # 再起動前のセッション。再接続を待つ切断中のセッションとして戻す
+        for token, client_id in sessions:
+            session = Session(token, client_id)
+            self.sessions[token] = session
+            self.client_sessions[client_id] = session
+            self.detach(client_id, on_expire)
+
+    def resume(self, token: str) -> Optional[object]:
+        session = self.sessions.get(token)
+        if session is None:
+            return None
+        if session.expiry is not None:
+            session.expiry.cancel()
+            session.expiry = None
+        return session.client_id
+
+    def close(self, client_id):
+        session = self.client_sessions.pop(client_id, None)
+        if session is not None:
+            self.sessions.pop(session.token, None)
+            if session.expiry is not None:
+                session.expiry.cancel()
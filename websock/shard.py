@@ -0,0 +1,218 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import pickle
+import socket
+import struct
+import zlib
+from typing import Awaitable, Callable, Dict, List, Set
+
+from websock import REGISTRY
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# フロントとワーカー間のフレーム: 4byte 長 + pickle
+#   front -> worker: ("connect" | "message" | "disconnect", client_id, payload)
+#                    ("lobby", request_id, None)
+#                    ("resync", client_id, None)  送信が追いつかなかったクライアント
+#                    ("resume", client_id, {table_id: seq})  セッションを再開したクライアント
+#   worker -> front: ("send", client_id, text)
+#                    ("lobby", request_id, tables)
+#                    ("resumed", client_id, None)  以後の通知は replay の後のもの
+#                    ("evicted", None, table_ids)  使われていないテーブルを捨てた
+HEADER = struct.Struct("!I")
+
+
+def shard_of(table_id, shards: int) -> int:
+    return zlib.crc32(str(table_id).encode()) % shards
+
+
+async def send_frame(writer: asyncio.StreamWriter, frame: tuple):
+    data = pickle.dumps(frame, pickle.HIGHEST_PROTOCOL)
+    writer.write(HEADER.pack(len(data)) + data)
+    await writer.drain()
+
+
+async def recv_frame(reader: asyncio.StreamReader) -> tuple:
+    (size,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+    return pickle.loads(await reader.readexactly(size))
+
+
+class RemoteClient:
+    # ワーカー側で websocket の代わりに REGISTRY に入れる。send はフロントへ転送する
+    def __init__(self, client_id, writer: asyncio.StreamWriter):
+        self.client_id = client_id
+        self.writer = writer
+
+    async def send(self, msg):
+        await send_frame(self.writer, ("send", self.client_id, msg))
+
+
+async def serve_worker(
+    sock: socket.socket,
+    handle: Callable[[RemoteClient, dict], Awaitable],
+    connect: Callable[[RemoteClient, object], Awaitable],
+    lobby: Callable[[], List[dict]],
+    resync: Callable[[object], None],
+    resume: Callable[[object, object, dict], Awaitable],
+    run_eviction: Callable[..., Awaitable] = None,
+):
+    reader, writer = await asyncio.open_unix_connection(sock=sock)
+
+    async def evicted(table_ids: List[str]):
+        # ロビーの購読者はフロントにいる
+        await send_frame(writer, ("evicted", None, table_ids))
+
+    if run_eviction is not None:
+        asyncio.ensure_future(run_eviction(on_evict=evicted))
+    while True:
+        try:
+            kind, key, payload = await recv_frame(reader)
+        except asyncio.IncompleteReadError:
+            logger.debug("serve_worker: front closed the connection")
+            break
+        if kind == "lobby":
+            await send_frame(writer, ("lobby", key, lobby()))
+            continue
+        if kind == "disconnect":
+            REGISTRY.unregister(key)
+            continue
+        if kind == "resync":
+            resync(key)
+            continue
+        client = REGISTRY.get(key)
+        if client is None:
+            client = RemoteClient(key, writer)
+            REGISTRY.register(key, client)
+        if kind == "resume":
+            await resume(None, key, payload)
+            await send_frame(writer, ("resumed", key, None))
+        elif kind == "connect":
+            await connect(client, key)
+        elif kind == "message":
+            await handle(client, payload)
+
+
+class ShardRouter:
+    # フロントプロセス側。websocket を終端し、table_id でワーカーへ振り分ける
+    # on_evict: ワーカーがテーブルを捨てたときに呼ぶ (ロビーの購読者に送り直す)
+    def __init__(self, shards: int, on_evict: Callable[[List[str]], Awaitable] = None):
+        self.shards = shards
+        self.on_evict = on_evict
+        self.processes = []  # type: List[multiprocessing.Process]
+        self.sockets = []  # type: List[socket.socket]
+        self.writers = []  # type: List[asyncio.StreamWriter]
+        self.client_shards = {}  # type: Dict[object, Set[int]]
+        self.lobby_requests = {}  # type: Dict[int, tuple]
+        # (シャード, client_id): resumed が届くまで、そのシャードからの通知を捨てる
+        self.resuming = set()  # type: Set[tuple]
+        self._request_ids = itertools.count()
+
+    def start(self, target: Callable[[int, int, socket.socket, object], None], config=None):
+        # イベントループを作る前に呼ぶ (fork したワーカーにループを持ち込まない)
+        # config はワーカーに渡す設定 (spawn でも届くよう pickle できるもの)
+        for index in range(self.shards):
+            front_sock, worker_sock = socket.socketpair()
+            process = multiprocessing.Process(
+                target=target, args=(index, self.shards, worker_sock, config), daemon=True
+            )
+            process.start()
+            worker_sock.close()
+            self.processes.append(process)
+            self.sockets.append(front_sock)
+
+    async def connect(self):
+        for shard, sock in enumerate(self.sockets):
+            reader, writer = await asyncio.open_unix_connection(sock=sock)
+            self.writers.append(writer)
+            asyncio.ensure_future(self._pump(shard, reader))
+
+    async def _pump(self, shard: int, reader: asyncio.StreamReader):
+        while True:
+            try:
+                kind, key, payload = await recv_frame(reader)
+            except asyncio.IncompleteReadError:
+                logger.error("ShardRouter: a worker closed the connection")
+                break
+            if kind == "send":
+                if (shard, key) in self.resuming:
+                    continue
+                ws = REGISTRY.get(key)
+                if ws is not None:
+                    try:
+                        await ws.send(payload)
+                    except Exception:
+                        logger.debug("ShardRouter: failed to send to {}".format(key))
+            elif kind == "evicted":
+                if self.on_evict is not None:
+                    # lobby() の応答もこのループで受けるので、待たずに別のタスクで
+                    asyncio.ensure_future(self.on_evict(payload))
+            elif kind == "resumed":
+                self.resuming.discard((shard, key))
+            elif kind == "lobby":
+                future, tables, pending = self.lobby_requests[key]
+                tables.extend(payload)
+                pending.discard(shard)
+                if not pending:
+                    del self.lobby_requests[key]
+                    future.set_result(tables)
+
+    async def send(self, shard: int, frame: tuple):
+        await send_frame(self.writers[shard], frame)
+
+    async def client_connected(self, client_id, table_id):
+        shard = shard_of(table_id, self.shards)
+        self.client_shards.setdefault(client_id, set()).add(shard)
+        await self.send(shard, ("connect", client_id, None))
+
+    async def client_disconnected(self, client_id):
+        for shard in self.client_shards.pop(client_id, set()):
+            await self.send(shard, ("disconnect", client_id, None))
+
+    async def resync(self, client_id):
+        for shard in self.client_shards.get(client_id, set()):
+            await self.send(shard, ("resync", client_id, None))
+
+    async def resume(self, client_id, seqs: dict):
+        # クライアントが見ていたテーブルのシャードと、送ってきたテーブルのシャード
+        # 最初の await より前に全部止める
+        shards = self.client_shards.setdefault(client_id, set())
+        shards.update(shard_of(table_id, self.shards) for table_id in seqs)
+        self.resuming.update((shard, client_id) for shard in shards)
+        for shard in sorted(shards):
+            await self.send(
+                shard,
+                (
+                    "resume",
+                    client_id,
+                    {t: seq for t, seq in seqs.items() if shard_of(t, self.shards) == shard},
+                ),
+            )
+
+    async def route(self, client_id, table_id, msg: dict):
+        shard = shard_of(table_id, self.shards)
+        self.client_shards.setdefault(client_id, set()).add(shard)
+        await self.send(shard, ("message", client_id, msg))
+
+    async def lobby(self) -> List[dict]:
+        # 全ワーカーのテーブル一覧をまとめる
+        request_id = next(self._request_ids)
+        future = asyncio.get_event_loop().create_future()
+        self.lobby_requests[request_id] = (future, [], set(range(self.shards)))
+        for shard in range(self.shards):
+            await self.send(shard, ("lobby", request_id, None))
+        return await future
+
+    def stop(self):
+        for writer in self.writers:
+            writer.close()
+        # ループが止まっていても、ワーカーに接続の終わりが届くように
+        for sock in self.sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        for process in self.processes:
+            process.join(timeout=5)
@@ -1,9 +1,9 @@
 import asyncio
 import logging
-import json
 
-from texasholdem import SasakiJSONEncoder
-from websock import CLIENTS
+from websock import REGISTRY
+from websock.binary import Frame, join_frame, join_list, splice_frame
+from websock.serializer import encode, encode_frame
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -11,24 +11,54 @@ logger = logging.getLogger(__name__)
 
 async def broadcast(msg):
     await asyncio.gather(
-        *[ws.send(msg) for ws in CLIENTS.values()], return_exceptions=False
+        *[ws.send(msg) for ws in REGISTRY.connections.values()], return_exceptions=True
     )
 
 
 async def unicast(msg, client_id: int):
-    await CLIENTS[client_id].send(msg)
+    await REGISTRY.connections[client_id].send(msg)
 
 
-async def notify(unicast_msg, broadcast_msg):
+def join_fields(fields: dict) -> Frame:
+    # エンコード済みの値 (encode の戻り値) から JSON object と MAP を組み立てる
+    text = "{" + ", ".join('"{}": {}'.format(k, v) for k, v in fields.items()) + "}"
+    return join_frame(text, fields)
+
+
+def splice(private_msg, shared: str) -> str:
+    # エンコード済みの共通部分 (JSON object) の末尾に個別のフィールドを差し込む
+    # (先頭の "type", "table_id", "seq" は outbox がフレームの種類を見分けるのに使う)
+    # private_msg は dict かエンコード済みの文字列。どちらも Frame ならバイナリも連結する
+    tail = private_msg if isinstance(private_msg, str) else encode_frame(private_msg)
+    if not private_msg or tail == "{}":
+        return shared
+    if shared == "{}":
+        return tail
+    text = shared[:-1] + ", " + tail[1:]
+    if isinstance(tail, Frame) and isinstance(shared, Frame):
+        return splice_frame(text, tail, shared)
+    return text
+
+
+async def notify(unicast_msg, broadcast_msg, client_ids=None):
+    # unicast_msg: player_id -> そのプレイヤーだけに送るフィールド (hand など)
+    # broadcast_msg: 全員に共通のフィールド (エンコード済みの文字列も可)。エンコードは1回だけ
+    # (JSON とバイナリの両方をここで作り、クライアントごとには作り直さない)
+    # client_ids: 送信先のクライアント。トピックの購読者を渡す (None なら全クライアント)
     logger.debug("notifying...")
-    for player_id, m in unicast_msg.items():
-        await unicast(
-            json.dumps(
-                m,
-                cls=SasakiJSONEncoder,
-            ),
-            player_id,
-        )
-    for cliend_id in CLIENTS.keys():
-        if cliend_id not in unicast_msg.keys():
-            await unicast(json.dumps(broadcast_msg, cls=SasakiJSONEncoder), cliend_id)
+    if client_ids is None:
+        client_ids = REGISTRY.connections.keys()
+    shared = broadcast_msg if isinstance(broadcast_msg, str) else encode_frame(broadcast_msg)
+    targets = set(client_ids) | set(unicast_msg.keys())
+    sends = []
+    for client_id in targets:
+        ws = REGISTRY.get(client_id)
+        if ws is None:
+            continue
+        private_msg = unicast_msg.get(client_id)
+        sends.append(ws.send(shared if private_msg is None else splice(private_msg, shared)))
+    # 遅いソケットが他のクライアントを待たせないよう並行に送る
+    results = await asyncio.gather(*sends, return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.debug("notify: failed to send ({!r})".format(result))